@@ -1,17 +1,37 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 import json
+import logging
+import time
 from typing import Dict, Set
 import base64
-import io
 import os
+import secrets
 
-# Motor for MongoDB
-import motor.motor_asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
-from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+try:
+    from backend.scheduler import OutboundQueue, frame_class, CONTROL
+    from backend.session import Session, SESSION_TTL
+    from backend.rate_limit import RateLimiter
+    from backend.history import MessageStore, conversation_key
+    from backend.offline import Mailbox
+    from backend.storage import open_storage
+    from backend.reaper import Reaper
+    from backend.integrity import ChunkDigest, checksum_ok
+    from backend.metrics import REGISTRY, FRAMES_IN, BYTES_IN, FRAMES_DROPPED, ASSEMBLY_TIME
+    from backend.logs import setup_logging
+except ImportError:  # started from inside backend/ (uvicorn app:app)
+    from scheduler import OutboundQueue, frame_class, CONTROL
+    from session import Session, SESSION_TTL
+    from rate_limit import RateLimiter
+    from history import MessageStore, conversation_key
+    from offline import Mailbox
+    from storage import open_storage
+    from reaper import Reaper
+    from integrity import ChunkDigest, checksum_ok
+    from metrics import REGISTRY, FRAMES_IN, BYTES_IN, FRAMES_DROPPED, ASSEMBLY_TIME
+    from logs import setup_logging
 
 app = FastAPI()
 
@@ -29,30 +49,253 @@ app.add_middleware(
 )
 
 # Simple in-memory structures for demo. Replace with persistent storage (MongoDB) for production.
-clients: Dict[str, WebSocket] = {}       # name -> websocket
+clients: Dict[str, WebSocket] = {}       # name -> websocket (kept while a dropped session can resume)
+sessions: Dict[str, Session] = {}        # name -> resumable session (seq stamping + replay buffer)
 rooms: Dict[str, Set[str]] = {}          # room -> set(names)
+outboxes: Dict[str, OutboundQueue] = {}  # name -> prioritized per-recipient writer
+limiter = RateLimiter()                  # per user/room/transfer token buckets
 lock = asyncio.Lock()
 
-# MongoDB client (will be initialized in startup event)
-mongo_client: AsyncIOMotorClient = None
-db = None
-gridfs_bucket: AsyncIOMotorGridFSBucket = None
+# FILE_CHUNK handling, CHATCHAT_RELAY_MODE:
+#   store       persist each chunk, then forward it
+#   background  forward first; persistence runs behind it (at most MAX_BACKGROUND_PERSISTS
+#               writes in flight, past that a chunk is stored inline again as back-pressure)
+#   relay       forward only. Chunks are still persisted, in the background, for transfers
+#               whose FILE_META asks for it ("store": true in meta) or whose recipient is
+#               offline; everything else never touches storage
+RELAY_MODE = os.environ.get('CHATCHAT_RELAY_MODE', 'store')
+MAX_BACKGROUND_PERSISTS = 256
+persist_tasks: Set[asyncio.Task] = set()
+assembling: Set[str] = set()             # transfer ids being assembled
+ephemeral: Dict[str, dict] = {}          # relay-only transfer id -> {sender, total, seen chunk indices, at}
+PROGRESS_INTERVAL = 30.0                 # how often a chunk refreshes its transfer's `updated` (for the reaper)
+chunk_digests: Dict[str, ChunkDigest] = {}  # stored transfer id -> leaves of the chunks we verified, until
+                                         # compared with the sender's FILE_DIGEST (backend/integrity.py)
+
+# per-frame detail is DEBUG; connection lifecycle INFO; storage trouble WARNING.
+# Records are written by a background thread (backend/logs.py), never on the event loop.
+log, log_listener = setup_logging()
+
+# frame types clients send; anything else is counted as 'other' so a client can't mint metric labels
+INBOUND_TYPES = {'MSG', 'FILE_META', 'FILE_CHUNK', 'FILE_DIGEST', 'FEC', 'ACK', 'JOIN', 'LEAVE', 'MAILBOX_ACK'}
+
+# gauges read live state at scrape time instead of being updated per frame
+REGISTRY.gauge('chatchat_connections', 'Attached WebSocket sessions', fn=lambda: len(outboxes))
+REGISTRY.gauge('chatchat_sessions', 'Sessions, including dropped ones awaiting resume', fn=lambda: len(sessions))
+REGISTRY.gauge('chatchat_queue_depth', 'Frames waiting in a recipient outbound queue', ('recipient',),
+               fn=lambda: {(n,): q.depth() for n, q in outboxes.items()})
+REGISTRY.gauge('chatchat_queue_bytes', 'Bytes waiting in a recipient outbound queue', ('recipient',),
+               fn=lambda: {(n,): q.bytes for n, q in outboxes.items()})
+REGISTRY.gauge('chatchat_active_transfers', 'File uploads in progress', fn=lambda: sum(len(t) for t in limiter.active.values()))
+
+# transfers, chunks, files, messages and mailboxes (backend/storage.py; set up in startup)
+storage = None
+message_store: MessageStore = None       # batched MSG persistence + per-conversation tail cache
+mailbox: Mailbox = None                  # per-recipient backlog for users who are offline
+reaper: Reaper = None                    # removes chunks of uploads that stopped making progress
 
 
 @app.on_event("startup")
 async def startup_event():
-    global mongo_client, db, gridfs_bucket
-    mongo_url = os.environ.get('MONGODB_URI', 'mongodb://localhost:27017')
-    mongo_client = motor.motor_asyncio.AsyncIOMotorClient(mongo_url)
-    db = mongo_client['chatchat']
-    gridfs_bucket = AsyncIOMotorGridFSBucket(db)
+    global storage, message_store, mailbox, reaper
+    # MONGODB_URI=memory:// runs with no outside services (tests, tools/loadgen.py);
+    # CHATCHAT_FILES_DIR keeps file chunks and finished files on local disk
+    storage = open_storage(os.environ.get('MONGODB_URI', 'mongodb://localhost:27017'),
+                           os.environ.get('CHATCHAT_FILES_DIR'))
+    message_store = MessageStore(storage)
+    mailbox = Mailbox(storage)
+    try:
+        await storage.ensure_indexes()
+    except Exception as e:
+        log.warning('index_create_failed %s', e)
+    message_store.start()
+    reaper = Reaper(storage, on_abandoned=abandon_transfer, prune=prune_transfer_state)
+    reaper.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    global mongo_client
-    if mongo_client:
-        mongo_client.close()
+    if reaper is not None:
+        await reaper.close()
+    if message_store is not None:
+        await message_store.close()
+    if storage is not None:
+        await storage.close()
+    log_listener.stop()
+
+def enqueue(dest, obj, sender=None, text=None):
+    # hand a frame to the recipient's session: it is kept for replay and passed to the
+    # scheduler, whose writer task stamps it with the session seq and does the actual send
+    sess = sessions.get(dest)
+    if sess is None:
+        return False
+    return sess.send(text if text is not None else json.dumps(obj), frame_class(obj.get('type')), sender)
+
+
+async def deliver(dest, obj, sender=None, text=None, coalesce=None):
+    # enqueue for a connected user, otherwise park the frame in their mailbox; returns 'sent',
+    # 'queued', 'unknown' (never had a session), 'error' (storage failed) or None (full / no mailbox)
+    if enqueue(dest, obj, sender=sender, text=text):
+        return 'sent'
+    if dest in sessions:
+        return 'sent'   # connected, frame shed by the scheduler; the sender retransmits
+    if mailbox is None:
+        return None
+    try:
+        if not await mailbox.known(dest):
+            return 'unknown'
+        if await mailbox.put(dest, obj, text=text, coalesce=coalesce):
+            return 'queued'
+    except Exception as e:
+        log.warning('persist_failed what=MAILBOX to=%s %s', dest, e)
+        return 'error'
+    return None
+
+
+async def persist_chunk(name, msg, transfer_id):
+    # store one FILE_CHUNK; the one that completes the transfer assembles it and announces FILE_READY.
+    # Returns False for a chunk that fails its checksum (nothing stored, the sender is asked again)
+    try:
+        chunk_b64 = msg.get('payload') or ''
+        chunk_bytes = base64.b64decode(chunk_b64)
+        chunk_index = int(msg.get('chunk_index', 0))
+        now = time.time()
+        verified = checksum_ok(chunk_bytes, msg.get('crc'), msg.get('crc_alg'))
+        if verified is False:
+            FRAMES_DROPPED.inc('corrupt')
+            log.warning('chunk_corrupt transfer_id=%s chunk_index=%s from=%s', transfer_id, chunk_index, name)
+            enqueue(name, {'type':'CHUNK_BAD','transfer_id': transfer_id, 'chunk_index': chunk_index})
+            return False
+        if verified:
+            chunk_digests.setdefault(transfer_id, ChunkDigest()).add(chunk_index, len(chunk_bytes), int(msg['crc']), now)
+        meta_doc = await storage.get_transfer(transfer_id)
+        if meta_doc is None:
+            # chunks without FILE_META still get a record, so the reaper can find them
+            await storage.put_transfer(transfer_id, {'sender': name, 'to': msg.get('to'), 'status': 'in_progress',
+                                                     'total_chunks': msg.get('total_chunks'), 'updated': now})
+        elif meta_doc.get('status') == 'abandoned':
+            enqueue(name, {'type':'ERROR','why':'transfer abandoned','transfer_id': transfer_id})
+            return
+        elif meta_doc.get('status') == 'complete' or transfer_id in assembling:
+            # a late retransmission: the file is (being) assembled and nothing would ever reap this chunk
+            enqueue(name, {'type':'SERVER_RECV_CHUNK','transfer_id': transfer_id, 'chunk_index': chunk_index})
+            return
+        elif now - meta_doc.get('updated', 0) > PROGRESS_INTERVAL:
+            await storage.update_transfer(transfer_id, {'updated': now})
+        # the byte offset, when the sender gives one, lets a disk store write in place
+        offset = msg.get('offset', (msg.get('meta') or {}).get('offset'))
+        cnt = await storage.put_chunk(transfer_id, chunk_index, chunk_bytes, offset=offset,
+                                      size=meta_doc.get('size') if meta_doc else None,
+                                      total=meta_doc.get('total_chunks') if meta_doc else msg.get('total_chunks'),
+                                      chunk_size=meta_doc.get('chunk_size') if meta_doc else None)
+        # Inform sender that server received the chunk (debug helper)
+        enqueue(name, {'type':'SERVER_RECV_CHUNK','transfer_id': transfer_id, 'chunk_index': chunk_index})
+        # check if assembly is complete; background writes can finish out of order, so
+        # two of them may both see the full count
+        total = meta_doc.get('total_chunks') if meta_doc else msg.get('total_chunks')
+        if not total or cnt < int(total) or transfer_id in assembling:
+            return
+        assembling.add(transfer_id)
+        try:
+            # assemble into a blob (GridFS file, memory, or a rename on disk)
+            assembly_start = time.perf_counter()
+            fname = meta_doc.get('fname') if meta_doc else f'file_{transfer_id}'
+            blob_id = await storage.assemble(transfer_id, fname)
+            done = {'status':'complete'}
+            if blob_id is not None:
+                done['blob_id'] = blob_id
+            await storage.update_transfer(transfer_id, done)
+            ASSEMBLY_TIME.observe(time.perf_counter() - assembly_start)
+        finally:
+            assembling.discard(transfer_id)
+        await verify_transfer(transfer_id)
+        limiter.transfer_finished(name, transfer_id)
+        # notify connected clients that file is ready
+        try:
+            notify = {'type':'FILE_READY','transfer_id': transfer_id, 'fname': fname, 'sender': msg.get('from')}
+            text = json.dumps(notify)
+            async with lock:
+                for n in clients:
+                    enqueue(n, notify, text=text)
+            # an offline recipient finds the notice in their mailbox
+            recipient = meta_doc.get('to') if meta_doc else None
+            if recipient and recipient not in clients:
+                await deliver(recipient, notify, text=text)
+        except Exception:
+            pass
+    except Exception as e:
+        log.warning('persist_failed what=FILE_CHUNK transfer_id=%s %s', transfer_id, e)
+
+
+async def verify_transfer(transfer_id):
+    # compare the root over the chunks we stored with the sender's FILE_DIGEST, once the
+    # transfer is assembled and the digest has arrived (either can come last)
+    doc = await storage.get_transfer(transfer_id)
+    digest = (doc or {}).get('digest') or {}
+    if not doc or doc.get('status') != 'complete' or not digest.get('root'):
+        return None
+    tree = chunk_digests.pop(transfer_id, None)
+    root = tree.root(int(digest.get('chunks') or 0)) if tree is not None else None
+    if root is None:
+        return None   # chunks without checksums, or the leaves were lost to a restart
+    ok = root == digest['root']
+    await storage.update_transfer(transfer_id, {'verified': ok})
+    if not ok:
+        log.warning('digest_mismatch transfer_id=%s sender=%s', transfer_id, doc.get('sender'))
+    return ok
+
+
+def relay_progress(transfer_id, msg):
+    # relay-only transfers are never assembled, so count chunks to know when one is over
+    t = ephemeral[transfer_id]
+    t['seen'].add(int(msg.get('chunk_index', 0)))
+    t['at'] = time.time()
+    if t['total'] and len(t['seen']) >= int(t['total']):
+        del ephemeral[transfer_id]
+        limiter.transfer_finished(t['sender'], transfer_id)
+
+
+def prune_transfer_state(cutoff):
+    # relay-only transfers leave nothing in storage; the reaper only needs to free their slots
+    for tid, t in list(ephemeral.items()):
+        if t['at'] < cutoff:
+            del ephemeral[tid]
+            limiter.transfer_finished(t['sender'], tid)
+    # leaves of transfers whose digest never came
+    for tid, tree in list(chunk_digests.items()):
+        if tree.updated < cutoff:
+            del chunk_digests[tid]
+
+
+def abandon_transfer(doc):
+    limiter.transfer_finished(doc.get('sender'), doc['transfer_id'])
+    chunk_digests.pop(doc['transfer_id'], None)
+
+
+async def expire_session(name, sess):
+    # a dropped session that was not resumed in time: forget the user for good
+    async with lock:
+        if sessions.get(name) is not sess or not sess.expired():
+            return
+        del sessions[name]
+        clients.pop(name, None)
+        for r in list(rooms.keys()):
+            rooms[r].discard(name)
+            if len(rooms[r]) == 0:
+                del rooms[r]
+        broadcast_clients()
+    limiter.forget_user(name)
+    for tid in [t for t, e in ephemeral.items() if e['sender'] == name]:
+        del ephemeral[tid]
+    log.info('session_expired user=%s', name)
+
+
+def broadcast_clients():
+    cl = list(clients.keys())
+    text = json.dumps({'type':'CLIENTS','clients': cl})
+    for n in cl:
+        enqueue(n, {'type':'CLIENTS'}, text=text)
+
 
 @app.get("/")
 async def index():
@@ -60,27 +303,62 @@ async def index():
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    # client must connect with ?name=...
+    # client must connect with ?name=...; a reconnecting client adds &session=<token>&last_seq=<n>
     await websocket.accept()
     params = websocket.query_params
     name = params.get('name') or f'anon-{id(websocket)}'
-    # register
+    token = params.get('session') or ''
+    try:
+        last_seq = int(params.get('last_seq') or 0)
+    except ValueError:
+        last_seq = 0
+    stale = None
+    # register (or take over our own session, even if its old socket hasn't noticed the drop yet)
     async with lock:
-        if name in clients:
-            await websocket.send_text(json.dumps({'type':'ERROR','why':'name taken'}))
-            await websocket.close()
-            return
+        sess = sessions.get(name)
+        resumed = sess is not None and bool(token) and secrets.compare_digest(token, sess.token)
+        if not resumed:
+            if sess is not None and sess.attached:
+                await websocket.send_text(json.dumps({'type':'ERROR','why':'name taken'}))
+                await websocket.close()
+                return
+            # fresh login; a detached session without its token is abandoned
+            sess = sessions[name] = Session(name)
+        elif sess.attached:
+            stale = (sess.websocket, sess.outbox)
         clients[name] = websocket
-    # broadcast updated clients list to all connected
-    async with lock:
-        cl = list(clients.keys())
-        for w in clients.values():
-            try:
-                await w.send_text(json.dumps({'type':'CLIENTS','clients': cl}))
-            except Exception:
-                pass
-    print(f"[SERVER] {name} connected")
-    await websocket.send_text(json.dumps({'type':'CONNECTED','you':name}))
+        outbox = outboxes[name] = OutboundQueue(websocket)
+        sess.attach(websocket, outbox)
+        outbox.start()
+        # the handshake itself is not replayable, so it bypasses the session's seq
+        gap = resumed and sess.gap(last_seq)
+        outbox.put(json.dumps({'type':'CONNECTED','you':name,'session':sess.token,'resumed':resumed,'gap':gap}), CONTROL)
+        if resumed:
+            replayed, _ = sess.resume(last_seq)
+        broadcast_clients()
+    if stale is not None:
+        old_ws, old_outbox = stale
+        await old_outbox.close()
+        try:
+            await old_ws.close()
+        except Exception:
+            pass
+    if resumed:
+        log.info('session_resumed user=%s last_seq=%d replayed=%d gap=%s', name, last_seq, replayed, gap)
+    else:
+        log.info('connected user=%s', name)
+
+    def reply(obj):
+        return enqueue(name, obj)
+
+    replay_task = None
+    if mailbox is not None:
+        try:
+            await mailbox.register(name)
+        except Exception as e:
+            log.warning('persist_failed what=MAILBOX_USER user=%s %s', name, e)
+        # drain whatever arrived while we were away, one acknowledged batch at a time
+        replay_task = asyncio.ensure_future(mailbox.replay(name, lambda text: enqueue(name, {'type':'MAILBOX'}, text=text)))
 
     try:
         while True:
@@ -88,27 +366,35 @@ async def websocket_endpoint(websocket: WebSocket):
             try:
                 msg = json.loads(text)
             except Exception:
-                await websocket.send_text(json.dumps({'type':'ERROR','why':'invalid json'}))
+                FRAMES_IN.inc('invalid')
+                reply({'type':'ERROR','why':'invalid json'})
                 continue
-            # Log incoming frame for debugging (concise)
-            try:
-                mlog = {'from': msg.get('from'), 'type': msg.get('type'), 'to': msg.get('to'), 'room': msg.get('room')}
-                if msg.get('type') in ('FILE_META','FILE_CHUNK'):
-                    meta = msg.get('meta') or {}
-                    mlog['transfer_id'] = meta.get('transfer_id') or msg.get('transfer_id')
-                    if msg.get('type') == 'FILE_CHUNK':
-                        mlog['chunk_index'] = msg.get('chunk_index')
-                print('[SERVER LOG] recv', mlog)
-            except Exception:
-                print('[SERVER LOG] recv (failed to build log)')
+            mtype = msg.get('type') if isinstance(msg, dict) else None
+            label = mtype if isinstance(mtype, str) and mtype in INBOUND_TYPES else 'other'
+            FRAMES_IN.inc(label)
+            BYTES_IN.inc(label, n=len(text))
+            if not isinstance(msg, dict):
+                reply({'type':'ERROR','why':'invalid json'})
+                continue
+            # concise per-frame record, only built when DEBUG is on
+            if log.isEnabledFor(logging.DEBUG):
+                meta = msg.get('meta') or {}
+                log.debug('recv type=%s from=%s to=%s room=%s transfer_id=%s chunk_index=%s', mtype, name,
+                          msg.get('to'), msg.get('room'), meta.get('transfer_id') or msg.get('transfer_id'), msg.get('chunk_index'))
             # basic routing
-            mtype = msg.get('type')
+            if mtype in ('MSG','FILE_META','FILE_CHUNK','FEC'):
+                throttle = limiter.check(name, msg, len(text))
+                if throttle:
+                    # drop the frame; the retry hint feeds the client's congestion control
+                    FRAMES_DROPPED.inc('throttled')
+                    reply(throttle)
+                    continue
             if mtype == 'JOIN':
                 room = msg.get('room')
                 if not room: continue
                 async with lock:
                     rooms.setdefault(room, set()).add(name)
-                await websocket.send_text(json.dumps({'type':'JOINED','room':room}))
+                reply({'type':'JOINED','room':room})
             elif mtype == 'LEAVE':
                 room = None
                 async with lock:
@@ -117,98 +403,89 @@ async def websocket_endpoint(websocket: WebSocket):
                             members.discard(name)
                             room = r
                             break
-                await websocket.send_text(json.dumps({'type':'LEFT','room':room}))
-            elif mtype in ('MSG','FILE_META','FILE_CHUNK'):
+                reply({'type':'LEFT','room':room})
+            elif mtype in ('MSG','FILE_META','FILE_CHUNK','FILE_DIGEST','FEC'):
                 # either to a specific user or broadcast to a room
+                # (FEC parity frames are only relayed: the receiver rebuilds from them, storage never sees them)
                 # For file transfers we expect a transfer identifier to be present in FILE_META and FILE_CHUNK
                 if mtype == 'FILE_META':
                     # persist transfer metadata
                     meta = msg.get('meta') or {}
                     transfer_id = meta.get('transfer_id') or msg.get('transfer_id')
-                    if transfer_id and db is not None:
+                    dest = msg.get('to')
+                    if transfer_id and RELAY_MODE == 'relay' and not meta.get('store') and (not dest or dest in clients):
+                        # nobody needs a stored copy: relay the chunks and never touch storage
+                        ephemeral[transfer_id] = {'sender': name, 'total': meta.get('total_chunks'), 'seen': set(),
+                                                  'at': time.time()}
+                    elif transfer_id and storage is not None:
                         try:
-                            await db.file_transfers.update_one(
-                                {'transfer_id': transfer_id},
-                                {'$set': {
-                                    'transfer_id': transfer_id,
-                                    'sender': msg.get('from'),
-                                    'fname': meta.get('fname'),
-                                    'size': meta.get('size'),
-                                    'total_chunks': meta.get('total_chunks'),
-                                    'status': 'in_progress'
-                                }}, upsert=True)
+                            await storage.put_transfer(transfer_id, {
+                                'sender': msg.get('from'),
+                                'to': msg.get('to'),
+                                'fname': meta.get('fname'),
+                                'size': meta.get('size'),
+                                'chunk_size': meta.get('chunk_size'),
+                                'total_chunks': meta.get('total_chunks'),
+                                'status': 'in_progress',
+                                'updated': time.time()
+                            })
                         except Exception as e:
                             # Log DB error but don't crash the websocket handler
-                            print(f"[SERVER LOG] error persisting FILE_META for {transfer_id}: {e}")
+                            log.warning('persist_failed what=FILE_META transfer_id=%s %s', transfer_id, e)
+                if mtype == 'FILE_DIGEST':
+                    # the sender's Merkle root over its chunk checksums, sent after the last chunk
+                    transfer_id = msg.get('transfer_id')
+                    if transfer_id and transfer_id not in ephemeral and storage is not None:
+                        try:
+                            await storage.update_transfer(transfer_id, {'digest': msg.get('digest') or {}})
+                            await verify_transfer(transfer_id)
+                        except Exception as e:
+                            log.warning('persist_failed what=FILE_DIGEST transfer_id=%s %s', transfer_id, e)
                 if mtype == 'FILE_CHUNK':
                     # allow transfer_id either at top-level or inside meta
                     transfer_id = msg.get('transfer_id') or (msg.get('meta') or {}).get('transfer_id')
                     if not transfer_id:
-                        await websocket.send_text(json.dumps({'type':'ERROR','why':'missing transfer_id in FILE_CHUNK'}))
+                        reply({'type':'ERROR','why':'missing transfer_id in FILE_CHUNK'})
                         continue
-                    # store chunk in DB for persistence
-                    if db is not None:
-                        try:
-                            chunk_b64 = msg.get('payload') or ''
-                            chunk_bytes = base64.b64decode(chunk_b64)
-                            await db.file_chunks.insert_one({
-                                'transfer_id': transfer_id,
-                                'chunk_index': int(msg.get('chunk_index', 0)),
-                                'data': chunk_bytes
-                            })
-                            # Inform sender that server received the chunk (debug helper)
-                            try:
-                                await websocket.send_text(json.dumps({'type':'SERVER_RECV_CHUNK','transfer_id': transfer_id, 'chunk_index': int(msg.get('chunk_index', 0))}))
-                            except Exception:
-                                pass
-                            # check if assembly is complete
-                            meta_doc = await db.file_transfers.find_one({'transfer_id': transfer_id})
-                            total = meta_doc.get('total_chunks') if meta_doc else msg.get('total_chunks')
-                            cnt = await db.file_chunks.count_documents({'transfer_id': transfer_id})
-                            if total and cnt >= int(total):
-                                # assemble
-                                chunks_cursor = db.file_chunks.find({'transfer_id': transfer_id}).sort('chunk_index', 1)
-                                assembled = bytearray()
-                                async for ch in chunks_cursor:
-                                    assembled.extend(ch['data'])
-                                # store in GridFS
-                                if gridfs_bucket is not None:
-                                    stream = io.BytesIO(assembled)
-                                    file_id = await gridfs_bucket.upload_from_stream(meta_doc.get('fname') if meta_doc else f'file_{transfer_id}', stream)
-                                    # store gridfs id on transfer doc
-                                    await db.file_transfers.update_one({'transfer_id': transfer_id}, {'$set': {'status':'complete', 'gridfs_id': file_id}})
-                                else:
-                                    # mark transfer complete even if GridFS unavailable
-                                    await db.file_transfers.update_one({'transfer_id': transfer_id}, {'$set': {'status':'complete'}})
-                                # remove chunk documents now that file is assembled
-                                try:
-                                    await db.file_chunks.delete_many({'transfer_id': transfer_id})
-                                except Exception:
-                                    pass
-                                # notify connected clients that file is ready
-                                try:
-                                    notify = {'type':'FILE_READY','transfer_id': transfer_id, 'fname': meta_doc.get('fname') if meta_doc else f'file_{transfer_id}', 'sender': msg.get('from')}
-                                    async with lock:
-                                        for w in clients.values():
-                                            try:
-                                                await w.send_text(json.dumps(notify))
-                                            except Exception:
-                                                pass
-                                except Exception:
-                                    pass
-                        except Exception as e:
-                            print('[SERVER] error persisting chunk:', e)
+                    if transfer_id in ephemeral:
+                        relay_progress(transfer_id, msg)
+                    elif storage is not None:
+                        if RELAY_MODE == 'store' or len(persist_tasks) >= MAX_BACKGROUND_PERSISTS:
+                            if await persist_chunk(name, msg, transfer_id) is False:
+                                continue   # corrupt: not forwarded either, the sender resends it
+                        else:
+                            # cut-through: the task runs at our next suspension, after the chunk
+                            # below is already in the recipient's queue
+                            task = asyncio.ensure_future(persist_chunk(name, msg, transfer_id))
+                            persist_tasks.add(task)
+                            task.add_done_callback(persist_tasks.discard)
 
                 dest = msg.get('to')
+                if dest and mtype == 'MSG' and message_store is not None:
+                    # batched write behind the routing path
+                    message_store.record(name, msg)
+                # file data goes out as received, not re-encoded (stamp() needs the closing brace last)
+                raw = text if mtype in ('FILE_CHUNK','FEC') and text.endswith('}') else None
                 if dest:
                     async with lock:
                         target = clients.get(dest)
                     if target:
-                        print(f"[SERVER LOG] forward to user {dest} (from {name}) type={mtype}")
-                        await target.send_text(json.dumps(msg))
+                        log.debug('forward type=%s from=%s to=%s', mtype, name, dest)
+                        enqueue(dest, msg, sender=name, text=raw)
+                    elif mtype == 'MSG':
+                        # recipient offline: hold the DM for replay on reconnect
+                        status = await deliver(dest, msg, sender=name)
+                        if status == 'queued':
+                            reply({'type':'QUEUED','to':dest})
+                        elif status == 'unknown':
+                            reply({'type':'ERROR','why':'no such user'})
+                        elif status == 'error':
+                            reply({'type':'ERROR','why':'recipient mailbox unavailable'})
+                        else:
+                            reply({'type':'ERROR','why':'recipient mailbox full'})
                     else:
-                        print(f"[SERVER LOG] cannot forward to user {dest} (not connected)")
-                        await websocket.send_text(json.dumps({'type':'ERROR','why':'no such user'}))
+                        log.debug('forward_failed type=%s from=%s to=%s reason=not_connected', mtype, name, dest)
+                        reply({'type':'ERROR','why':'no such user'})
                 else:
                     room = msg.get('room')
                     if not room:
@@ -220,17 +497,17 @@ async def websocket_endpoint(websocket: WebSocket):
                                     user_room = r; break
                         room = user_room
                     if not room:
-                        await websocket.send_text(json.dumps({'type':'ERROR','why':'not in room'}))
+                        reply({'type':'ERROR','why':'not in room'})
                         continue
+                    if mtype == 'MSG' and message_store is not None:
+                        message_store.record(name, dict(msg, room=room))
                     async with lock:
                         members = list(rooms.get(room, []))
-                    print(f"[SERVER LOG] broadcast to room {room} members={members} from={name} type={mtype}")
+                    log.debug('broadcast type=%s from=%s room=%s members=%d', mtype, name, room, len(members))
+                    text = raw or json.dumps(msg)
                     for member in members:
                         if member == name: continue
-                        async with lock:
-                            t = clients.get(member)
-                        if t:
-                            await t.send_text(json.dumps(msg))
+                        enqueue(member, msg, sender=name, text=text)
             # ACK handled above
             elif mtype == 'ACK':
                 # ACKs should be routed to a specific recipient ('to')
@@ -239,37 +516,58 @@ async def websocket_endpoint(websocket: WebSocket):
                     async with lock:
                         target = clients.get(dest)
                     if target:
-                        print(f"[SERVER LOG] forward ACK from {name} to {dest} transfer_id={msg.get('transfer_id')} ack={msg.get('ack')}")
-                        await target.send_text(json.dumps(msg))
+                        log.debug('forward type=ACK from=%s to=%s stream=%s ack=%s', name, dest, msg.get('stream') or msg.get('transfer_id'), msg.get('ack'))
+                        enqueue(dest, msg, sender=name)
                     else:
-                        print(f"[SERVER LOG] ACK target {dest} not connected")
-                        await websocket.send_text(json.dumps({'type':'ERROR','why':'no such user for ACK'}))
+                        # ACKs are cumulative: only the newest one per stream is worth keeping
+                        key = f"ACK:{name}:{msg.get('stream') or msg.get('transfer_id')}"
+                        status = await deliver(dest, msg, sender=name, coalesce=key)
+                        if status == 'error':
+                            reply({'type':'ERROR','why':'recipient mailbox unavailable'})
+                        elif status not in ('sent', 'queued'):
+                            log.debug('forward_failed type=ACK from=%s to=%s reason=not_connected', name, dest)
+                            reply({'type':'ERROR','why':'no such user for ACK'})
                 else:
                     # no destination: can't route, inform sender
-                    await websocket.send_text(json.dumps({'type':'ERROR','why':'ACK missing to field'}))
+                    reply({'type':'ERROR','why':'ACK missing to field'})
+            elif mtype == 'MAILBOX_ACK':
+                # client processed our replay up to seq: advance its delivery cursor
+                try:
+                    seq = int(msg.get('seq', 0))
+                except (TypeError, ValueError, OverflowError):
+                    reply({'type':'ERROR','why':'bad MAILBOX_ACK seq'})
+                    continue
+                if mailbox is not None:
+                    try:
+                        await mailbox.ack(name, seq)
+                    except Exception as e:
+                        log.warning('persist_failed what=MAILBOX_ACK user=%s %s', name, e)
+                        reply({'type':'ERROR','why':'mailbox unavailable'})
             else:
                 # unknown type: reply error
-                await websocket.send_text(json.dumps({'type':'ERROR','why':'unknown type'}))
+                reply({'type':'ERROR','why':'unknown type'})
 
     except WebSocketDisconnect:
         pass
     finally:
-        # cleanup
-        async with lock:
-            clients.pop(name, None)
-            for r in list(rooms.keys()):
-                rooms[r].discard(name)
-                if len(rooms[r]) == 0:
-                    del rooms[r]
-        # broadcast updated clients list after disconnect
+        # cleanup: keep the session (name, rooms, replay buffer) around for SESSION_TTL so
+        # the client can resume; a newer socket may already have taken it over
+        if replay_task is not None:
+            replay_task.cancel()
         async with lock:
-            cl = list(clients.keys())
-            for w in clients.values():
-                try:
-                    await w.send_text(json.dumps({'type':'CLIENTS','clients': cl}))
-                except Exception:
-                    pass
-        print(f"[SERVER] {name} disconnected")
+            current = sessions.get(name) is sess and sess.websocket is websocket
+            if current:
+                sess.detach()
+                outboxes.pop(name, None)
+        await outbox.close()
+        if current:
+            asyncio.get_event_loop().call_later(SESSION_TTL, lambda: asyncio.ensure_future(expire_session(name, sess)))
+            log.info('disconnected user=%s resumable_for=%.0fs', name, SESSION_TTL)
+
+
+@app.get('/metrics')
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type='text/plain; version=0.0.4')
 
 
 @app.get('/clients')
@@ -279,28 +577,55 @@ async def list_clients():
     return JSONResponse({'clients': names})
 
 
-from fastapi.responses import StreamingResponse
+def session_user(token):
+    # the name behind a session token (attached or awaiting resume), or None
+    if not token:
+        return None
+    for sess in list(sessions.values()):
+        if secrets.compare_digest(token, sess.token):
+            return sess.name
+    return None
+
+
+@app.get('/history')
+async def get_history(room: str = None, peer: str = None, session: str = None, before: str = None, limit: int = 50):
+    # newest page first; pass the returned 'next' back as ?before= for older messages.
+    # The caller is whoever holds the session token from CONNECTED, never a name it claims
+    if message_store is None:
+        return JSONResponse({'error':'storage not configured'}, status_code=500)
+    me = session_user(session)
+    if me is None:
+        return JSONResponse({'error':'need the session token of a connected user'}, status_code=401)
+    if room:
+        conv = conversation_key(me, room=room)
+    elif peer:
+        conv = conversation_key(me, to=peer)
+    else:
+        return JSONResponse({'error':'need room or peer'}, status_code=400)
+    try:
+        messages, nxt = await message_store.history(conv, before=before, limit=limit)
+    except ValueError:
+        return JSONResponse({'error':'bad cursor'}, status_code=400)
+    return JSONResponse({'messages': messages, 'next': nxt})
 
 
 @app.get('/file/{transfer_id}')
 async def get_file(transfer_id: str):
-    if db is None or gridfs_bucket is None:
+    if storage is None:
         return JSONResponse({'error':'storage not configured'}, status_code=500)
-    doc = await db.file_transfers.find_one({'transfer_id': transfer_id})
+    doc = await storage.get_transfer(transfer_id)
     if not doc:
         return JSONResponse({'error':'not found'}, status_code=404)
-    gridfs_id = doc.get('gridfs_id')
-    if not gridfs_id:
+    blob_id = doc.get('blob_id') or doc.get('gridfs_id')   # gridfs_id: transfers stored before storage.py
+    if not blob_id:
         return JSONResponse({'error':'file not yet assembled'}, status_code=404)
-
-    # stream from GridFS
-    async def iterfile():
-        stream = await gridfs_bucket.open_download_stream(gridfs_id)
-        chunk = await stream.read(8192)
-        while chunk:
-            yield chunk
-            chunk = await stream.read(8192)
-        await stream.close()
+    if doc.get('verified') is False:
+        return JSONResponse({'error':'file does not match the sender digest'}, status_code=409)
 
     filename = doc.get('fname') or f'file_{transfer_id}'
-    return StreamingResponse(iterfile(), media_type='application/octet-stream', headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    path = storage.blob_path(blob_id)
+    if path is not None:
+        # a file on local disk: no copies through Python (sendfile where the server supports it)
+        return FileResponse(path, media_type='application/octet-stream', headers=headers)
+    return StreamingResponse(storage.read_blob(blob_id), media_type='application/octet-stream', headers=headers)
@@ -2,17 +2,32 @@
 Simple application-level flow and congestion control primitives (educational).
 This module provides small classes to track cwnd/ssthresh and a basic retransmit scheduler.
 These are intentionally minimal and documented so you can expand them.
+
+Congestion control is a strategy: every algorithm implements on_ack / on_dup_ack /
+on_loss / on_rtt_sample / pacing_rate and is picked by name with make_congestion_control().
+Windows are in bytes; loss *detection* (dup ACKs, SACK holes, timers) stays in the sender.
 """
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+DUP_ACK_THRESH = 3
+
 
 @dataclass
 class CongestionControl:
-    cwnd: int
-    ssthresh: int
+    cwnd: float
+    ssthresh: float
     mss: int
+    clock: Callable[[], float] = field(default=time.monotonic, repr=False)
+    srtt: Optional[float] = None
+    min_rtt: Optional[float] = None
+    in_recovery: bool = False
+    recover: int = 0          # highest seq outstanding when recovery started
 
-    def on_ack(self, acked_bytes:int):
+    name = 'base'
+
+    def on_ack(self, acked_bytes:int, ack:Optional[int]=None):
         # simple TCP-like slow start + congestion avoidance
         if self.cwnd < self.ssthresh:
             # slow start
@@ -21,18 +36,396 @@ class CongestionControl:
             # additive increase (very small step)
             self.cwnd += max(1, int(self.mss * (self.mss / max(1, self.cwnd))))
 
-    def on_timeout(self):
+    def on_dup_ack(self, count:int, recover:int=0):
+        """Return True when the sender should fast-retransmit (enter recovery)."""
+        if count >= DUP_ACK_THRESH and not self.in_recovery:
+            self.on_loss('fast')
+            self.in_recovery = True
+            self.recover = recover
+            return True
+        return False
+
+    def on_loss(self, kind:str='timeout'):
         # multiplicative decrease
         self.ssthresh = max(self.cwnd // 2, self.mss)
-        self.cwnd = self.mss
+        if kind == 'timeout':
+            self.cwnd = self.mss
+            self.in_recovery = False
+        else:
+            self.cwnd = self.ssthresh
+
+    def on_timeout(self):
+        self.on_loss('timeout')
+
+    def on_rtt_sample(self, rtt:float):
+        if rtt <= 0:
+            return
+        self.srtt = rtt if self.srtt is None else 0.875 * self.srtt + 0.125 * rtt
+        self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+
+    def pacing_rate(self):
+        """Bytes/second to pace at, or None before the first RTT sample."""
+        if not self.srtt:
+            return None
+        # same gains as Linux: faster than cwnd/srtt so pacing never caps the window
+        gain = 2.0 if self.cwnd < self.ssthresh else 1.2
+        return gain * self.cwnd / self.srtt
+
+    def phase(self):
+        """Congestion state for telemetry: slow_start, avoidance or recovery."""
+        if self.in_recovery:
+            return 'recovery'
+        return 'slow_start' if self.cwnd < self.ssthresh else 'avoidance'
+
+    def _exit_recovery(self, ack):
+        if self.in_recovery and ack is not None and ack >= self.recover:
+            self.in_recovery = False
+            self.cwnd = self.ssthresh
+            return True
+        return False
+
+
+@dataclass
+class Reno(CongestionControl):
+    """RFC 5681: slow start, AIMD, fast retransmit and fast recovery with window inflation."""
+    name = 'reno'
+
+    def on_ack(self, acked_bytes:int, ack:Optional[int]=None):
+        if self.in_recovery:
+            # Reno leaves recovery on the first new ACK, partial or not (deflate to ssthresh)
+            self.in_recovery = False
+            self.cwnd = self.ssthresh
+            return
+        if self.cwnd < self.ssthresh:
+            self.cwnd += min(acked_bytes, self.mss)
+        else:
+            self.cwnd += self.mss * self.mss / max(1, self.cwnd)
+
+    def on_dup_ack(self, count:int, recover:int=0):
+        if self.in_recovery:
+            # every further dup ACK means a segment left the network: inflate
+            self.cwnd += self.mss
+            return False
+        if count >= DUP_ACK_THRESH:
+            self.ssthresh = max(self.cwnd / 2, 2 * self.mss)
+            self.cwnd = self.ssthresh + DUP_ACK_THRESH * self.mss
+            self.in_recovery = True
+            self.recover = recover
+            return True
+        return False
+
+    def on_loss(self, kind:str='timeout'):
+        self.ssthresh = max(self.cwnd / 2, 2 * self.mss)
+        if kind == 'timeout':
+            self.cwnd = self.mss
+            self.in_recovery = False
+        else:
+            self.cwnd = self.ssthresh
+
+
+@dataclass
+class NewReno(Reno):
+    """RFC 6582: stays in fast recovery across partial ACKs and deflates by the acked amount."""
+    name = 'newreno'
+
+    def on_ack(self, acked_bytes:int, ack:Optional[int]=None):
+        if self.in_recovery:
+            if ack is None or ack >= self.recover:
+                # full ACK: deflate the inflated window back to ssthresh and leave recovery
+                self.in_recovery = False
+                self.cwnd = self.ssthresh
+            else:
+                # partial ACK: the sender retransmits the next hole; deflate by what was
+                # acked and add back one MSS so a new segment can go out
+                self.cwnd = max(self.cwnd - acked_bytes, self.mss) + self.mss
+            return
+        super().on_ack(acked_bytes, ack)
+
+
+@dataclass
+class Cubic(CongestionControl):
+    """RFC 8312 CUBIC: window grows as a cubic function of time since the last reduction."""
+    c: float = 0.4
+    beta: float = 0.7
+    w_max: float = 0.0        # window (segments) before the last reduction
+    k: float = 0.0
+    epoch_start: Optional[float] = None
+    w_est: float = 0.0        # Reno-friendly estimate (segments)
+
+    name = 'cubic'
+
+    def on_ack(self, acked_bytes:int, ack:Optional[int]=None):
+        if self._exit_recovery(ack) or self.in_recovery:
+            return
+        if self.cwnd < self.ssthresh:
+            self.cwnd += min(acked_bytes, self.mss)
+            return
+        now = self.clock()
+        seg = self.cwnd / self.mss
+        if self.epoch_start is None:
+            self.epoch_start = now
+            if seg < self.w_max:
+                self.k = ((self.w_max - seg) / self.c) ** (1.0 / 3)
+            else:
+                self.k = 0.0
+                self.w_max = seg
+            self.w_est = seg
+        t = now - self.epoch_start + (self.min_rtt or 0.0)
+        target = self.c * (t - self.k) ** 3 + self.w_max
+        # TCP-friendly region: never grow slower than standard AIMD would
+        self.w_est += 3 * (1 - self.beta) / (1 + self.beta) * (acked_bytes / self.mss) / seg
+        target = max(target, self.w_est)
+        if target > seg:
+            self.cwnd += self.mss * (target - seg) / seg
+        else:
+            self.cwnd += self.mss / (100 * seg)
+
+    def on_loss(self, kind:str='timeout'):
+        seg = self.cwnd / self.mss
+        # fast convergence: release bandwidth to newer flows when the window shrinks
+        self.w_max = seg * (1 + self.beta) / 2 if seg < self.w_max else seg
+        self.epoch_start = None
+        self.ssthresh = max(self.cwnd * self.beta, 2 * self.mss)
+        if kind == 'timeout':
+            self.cwnd = self.mss
+            self.in_recovery = False
+        else:
+            self.cwnd = self.ssthresh
+
+
+BBR_HIGH_GAIN = 2.885          # 2/ln(2): doubles delivery rate per round in startup
+BBR_CYCLE = (1.25, 0.75, 1, 1, 1, 1, 1, 1)
+
+
+@dataclass
+class BBRLite(CongestionControl):
+    """Simplified BBR: model bottleneck bandwidth and min RTT, size cwnd to a multiple of the
+    BDP and pace at gain * bandwidth. No PROBE_RTT phase; loss only matters on timeout."""
+    state: str = 'startup'
+    btl_bw: float = 0.0       # bytes/sec, windowed max of delivery-rate samples
+    bw_samples: list = field(default_factory=list)
+    delivered: int = 0
+    round_start: Optional[float] = None
+    round_delivered: int = 0
+    full_bw: float = 0.0
+    full_bw_rounds: int = 0
+    cycle_idx: int = 0
+    cwnd_gain: float = 2.0
+
+    name = 'bbr'
+
+    @property
+    def pacing_gain(self):
+        if self.state == 'startup':
+            return BBR_HIGH_GAIN
+        if self.state == 'drain':
+            return 1 / BBR_HIGH_GAIN
+        return BBR_CYCLE[self.cycle_idx]
+
+    def on_ack(self, acked_bytes:int, ack:Optional[int]=None):
+        self._exit_recovery(ack)
+        now = self.clock()
+        self.delivered += acked_bytes
+        if self.round_start is None:
+            self.round_start, self.round_delivered = now, self.delivered
+        rtt = self.min_rtt or self.srtt
+        if rtt and now - self.round_start >= rtt:
+            # one round trip elapsed: take a delivery-rate sample, keep the max of the last 10
+            sample = (self.delivered - self.round_delivered) / max(now - self.round_start, 1e-6)
+            self.bw_samples = (self.bw_samples + [sample])[-10:]
+            self.btl_bw = max(self.bw_samples)
+            self.round_start, self.round_delivered = now, self.delivered
+            self._advance_state()
+        bdp = self.btl_bw * rtt if (rtt and self.btl_bw) else 0
+        if bdp:
+            gain = BBR_HIGH_GAIN if self.state == 'startup' else self.cwnd_gain
+            self.cwnd = max(gain * bdp, 4 * self.mss)
+        else:
+            self.cwnd += min(acked_bytes, self.mss)
+
+    def phase(self):
+        return 'recovery' if self.in_recovery else self.state
+
+    def _advance_state(self):
+        if self.state == 'startup':
+            # bandwidth stopped growing by 25% for three rounds: pipe is full
+            if self.btl_bw >= self.full_bw * 1.25:
+                self.full_bw, self.full_bw_rounds = self.btl_bw, 0
+            else:
+                self.full_bw_rounds += 1
+                if self.full_bw_rounds >= 3:
+                    self.state = 'drain'
+        elif self.state == 'drain':
+            self.state = 'probe_bw'
+            self.cycle_idx = 0
+        else:
+            self.cycle_idx = (self.cycle_idx + 1) % len(BBR_CYCLE)
+
+    def on_dup_ack(self, count:int, recover:int=0):
+        # retransmit on 3 dup ACKs but keep the model-based window
+        if count >= DUP_ACK_THRESH and not self.in_recovery:
+            self.in_recovery = True
+            self.recover = recover
+            return True
+        return False
+
+    def on_loss(self, kind:str='timeout'):
+        if kind == 'timeout':
+            self.cwnd = 4 * self.mss
+            self.in_recovery = False
+
+    def pacing_rate(self):
+        if not self.btl_bw:
+            return super().pacing_rate()
+        return self.pacing_gain * self.btl_bw
+
+
+ALGORITHMS = {
+    'reno': Reno,
+    'newreno': NewReno,
+    'cubic': Cubic,
+    'bbr': BBRLite,
+}
+
+
+def make_congestion_control(name:str, cwnd:float, ssthresh:float, mss:int, **kw):
+    try:
+        cls = ALGORITHMS[name.lower()]
+    except KeyError:
+        raise ValueError(f"unknown congestion control {name!r} (choose from {', '.join(ALGORITHMS)})")
+    return cls(cwnd=cwnd, ssthresh=ssthresh, mss=mss, **kw)
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens/second accrue up to `burst`."""
+    def __init__(self, rate:float, burst:float, clock:Callable[[], float]=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.stamp = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def set_rate(self, rate:float):
+        self._refill()
+        self.rate = rate
+
+    def consume(self, n:float):
+        self._refill()
+        # an item bigger than the bucket may go once the bucket is full
+        need = min(n, self.burst)
+        if self.tokens >= need:
+            self.tokens -= n
+            return True
+        return False
+
+    def delay_for(self, n:float):
+        """Seconds until `n` tokens are available (0 if they are now)."""
+        self._refill()
+        need = min(n, self.burst)
+        if self.tokens >= need or self.rate <= 0:
+            return 0.0
+        return (need - self.tokens) / self.rate
+
+
+class Pacer:
+    """Spaces segment transmissions at a rate taken from the congestion control
+    (cwnd/srtt based pacing_rate) or an explicit bytes/sec override; at most
+    `max_burst` bytes may leave back to back."""
+    def __init__(self, mss:int, max_burst:int, rate:Optional[float]=None, clock:Callable[[], float]=time.monotonic):
+        self.mss = mss
+        self.max_burst = max(max_burst, mss)
+        self.explicit_rate = rate
+        self.bucket = TokenBucket(rate or 0, self.max_burst, clock)
+        self.enabled = True
+        self.sent_segments = 0
+        self.sent_bytes = 0
+        self.delayed = 0          # times a segment had to wait for tokens
+        self.wait_time = 0.0      # total seconds of imposed delay
+
+    def update(self, cc:Optional[CongestionControl]=None):
+        rate = self.explicit_rate or (cc.pacing_rate() if cc is not None else None)
+        if rate:
+            self.bucket.set_rate(rate)
+        return rate
+
+    def admit(self, nbytes:int):
+        """Return 0 and charge the bucket if `nbytes` may go now, else the seconds to wait."""
+        if not self.enabled or self.bucket.rate <= 0:
+            # no rate known yet (no RTT sample): don't pace, but still count
+            self.sent_segments += 1
+            self.sent_bytes += nbytes
+            return 0.0
+        if self.bucket.consume(nbytes):
+            self.sent_segments += 1
+            self.sent_bytes += nbytes
+            return 0.0
+        wait = self.bucket.delay_for(nbytes)
+        self.delayed += 1
+        self.wait_time += wait
+        return wait
+
+    def stats(self):
+        return {
+            'rate': self.bucket.rate,
+            'max_burst': self.max_burst,
+            'segments': self.sent_segments,
+            'bytes': self.sent_bytes,
+            'delayed': self.delayed,
+            'wait_time': round(self.wait_time, 4),
+        }
 
 
 class FlowControl:
-    def __init__(self, recv_window_bytes:int):
+    """Receive-side window: advertises the free part of a buffer budget.
+
+    hold()/release() track bytes the receiver keeps in memory (out-of-order segments,
+    file reassembly); consumed() counts bytes handed to the application and drives
+    auto-tuning: once per RTT the budget grows to twice what the app drained in that
+    RTT (the measured bandwidth-delay product), bounded by max_window."""
+    def __init__(self, recv_window_bytes:int, max_window:Optional[int]=None, clock:Callable[[], float]=time.monotonic):
         self.rwnd = recv_window_bytes
+        self.max_window = max(max_window or recv_window_bytes, recv_window_bytes)
+        self.clock = clock
+        self.used = 0
+        self.rtt = None
+        self.copied = 0
+        self.measure_start = clock()
+
+    def hold(self, nbytes:int):
+        self.used += nbytes
+
+    def release(self, nbytes:int):
+        self.used = max(0, self.used - nbytes)
+
+    def fits(self, nbytes:int):
+        return self.used + nbytes <= self.rwnd
+
+    def consumed(self, nbytes:int, rtt:Optional[float]=None):
+        if rtt:
+            self.rtt = rtt
+        self.copied += nbytes
+        self.autotune()
+
+    def autotune(self):
+        if not self.rtt:
+            return
+        now = self.clock()
+        if now - self.measure_start < self.rtt:
+            return
+        # the sender needs ~2x the data the app drains per RTT to never stall on rwnd
+        target = min(self.max_window, 2 * self.copied)
+        if target > self.rwnd:
+            self.rwnd = target
+        self.copied = 0
+        self.measure_start = now
 
     def advertise(self):
-        return self.rwnd
+        return max(0, self.rwnd - self.used)
 
 
 # A light-weight retransmit scheduler (blocking sleep-based) is provided for demos.
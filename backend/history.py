@@ -0,0 +1,166 @@
+"""
+Chat message persistence for the WebSocket server.
+MSG frames are recorded off the routing path: record() only appends to an in-memory
+batch that a background task flushes to the storage backend (backend/storage.py) in
+one call. Reads use keyset pagination on
+(conv, ts, _id) - never skip/limit - and the newest messages of each conversation are
+kept in a small tail cache so opening a busy room needs no database round trip.
+"""
+import asyncio
+import base64
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+log = logging.getLogger('chatchat.history')
+
+BATCH_SIZE = 200          # flush as soon as this many messages are pending
+FLUSH_INTERVAL = 0.05     # ...or after this many seconds
+TAIL_SIZE = 50            # newest messages cached per conversation
+MAX_CACHED_CONVS = 1000
+MAX_PAGE = 200
+
+
+def conversation_key(sender, to=None, room=None):
+    # DMs are stored once under the sorted pair so both sides read the same history
+    if to:
+        a, b = sorted([sender, to])
+        return f'dm:{a}|{b}'
+    return f'room:{room}'
+
+
+def _now_ms():
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def encode_cursor(doc):
+    ts = round(doc['ts'].replace(tzinfo=timezone.utc).timestamp() * 1000)
+    return base64.urlsafe_b64encode(f"{ts}:{doc['_id']}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    # cursors come back from clients: anything malformed is a ValueError (a 400, not a 500)
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ts, oid = raw.split(':', 1)
+        return datetime.fromtimestamp(int(ts) / 1000, tz=timezone.utc).replace(tzinfo=None), ObjectId(oid)
+    except (ValueError, TypeError, OverflowError, OSError, InvalidId) as e:
+        raise ValueError(f'bad cursor: {e}') from e
+
+
+def to_public(doc):
+    return {
+        'id': str(doc['_id']),
+        'type': 'MSG',
+        'from': doc.get('from'),
+        'to': doc.get('to'),
+        'room': doc.get('room'),
+        'payload': doc.get('payload'),
+        'ts': doc['ts'].isoformat() + 'Z',
+    }
+
+
+class MessageStore:
+    def __init__(self, store=None, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, tail_size=TAIL_SIZE):
+        self.store = store   # backend/storage.py Storage; None keeps only the tail cache
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.tail_size = tail_size
+        self.pending = []
+        self.tails = OrderedDict()   # conv -> deque of docs, oldest first
+        self.warm = set()            # convs whose tail is known to hold the true newest messages
+        self.wakeup = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.run())
+        return self.task
+
+    def record(self, sender, msg):
+        conv = conversation_key(sender, msg.get('to'), msg.get('room'))
+        doc = {
+            '_id': ObjectId(),
+            'conv': conv,
+            'from': sender,
+            'to': msg.get('to'),
+            'room': msg.get('room'),
+            'payload': msg.get('payload'),
+            # BSON dates hold milliseconds; truncate so cache, db and cursors agree
+            'ts': _now_ms(),
+        }
+        self._tail(conv).append(doc)
+        if self.store is not None:
+            self.pending.append(doc)
+            if len(self.pending) >= self.batch_size:
+                self.wakeup.set()
+        return doc
+
+    def _tail(self, conv):
+        tail = self.tails.get(conv)
+        if tail is None:
+            tail = self.tails[conv] = deque(maxlen=self.tail_size)
+            if self.store is None:
+                self.warm.add(conv)
+            while len(self.tails) > MAX_CACHED_CONVS:
+                old, _ = self.tails.popitem(last=False)
+                self.warm.discard(old)
+        else:
+            self.tails.move_to_end(conv)
+        return tail
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        async with self.flush_lock:
+            if not self.pending or self.store is None:
+                return
+            batch, self.pending = self.pending, []
+            try:
+                await self.store.insert_messages(batch)
+            except Exception as e:
+                log.warning('persist_failed what=messages docs=%d %s', len(batch), e)
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except (asyncio.CancelledError, Exception):
+                pass
+        await self.flush()
+
+    async def history(self, conv, before=None, limit=TAIL_SIZE):
+        """Return (messages oldest-first, cursor for the next older page or None)."""
+        limit = max(1, min(int(limit), MAX_PAGE))
+        tail = self.tails.get(conv)
+        if before is None and tail is not None and conv in self.warm and (limit <= len(tail) or len(tail) < tail.maxlen):
+            docs = list(tail)[-limit:]
+            nxt = encode_cursor(docs[0]) if len(docs) == limit and docs else None
+            return [to_public(d) for d in docs], nxt
+        if self.store is None:
+            return [], None
+        # unflushed messages must be visible to the query
+        await self.flush()
+        docs = await self.store.message_page(conv, decode_cursor(before) if before is not None else None, limit)
+        docs.reverse()
+        if before is None:
+            # warm the tail cache with what we just read
+            tail = self._tail(conv)
+            tail.clear()
+            tail.extend(docs[-self.tail_size:])
+            if len(docs) < limit or len(docs) >= self.tail_size:
+                self.warm.add(conv)
+        nxt = encode_cursor(docs[0]) if len(docs) == limit else None
+        return [to_public(d) for d in docs], nxt
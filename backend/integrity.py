@@ -0,0 +1,157 @@
+"""
+Chunk checksums and per-transfer hash trees.
+Every file chunk carries a checksum of its bytes ('crc', plus 'crc_alg' when it isn't
+crc32). It is checked wherever the chunk is decoded anyway, so a damaged chunk is
+dropped on arrival and only that chunk is sent again.
+
+The whole file is covered by a Merkle tree (RFC 6962 layout: split at the largest power
+of two) whose leaves hash each chunk's (length, checksum) pair. Leaves come from the
+checksums already computed per chunk, so the tree costs one 13-byte sha256 per chunk
+instead of a second pass over the data. The sender publishes the root in a FILE_DIGEST
+frame once it has read the whole file; receivers compare it with the root of what they
+assembled. proof()/verify_proof() check any one chunk against the root on its own, so
+a transfer split across connections or resumed later can verify its ranges independently.
+
+crc32 (zlib) is always there. crc32c is used when the `crc32c` or `google_crc32c`
+package is installed; both use the CPU's CRC instructions and are several times faster.
+"""
+import hashlib
+import struct
+import zlib
+
+MASK = 0xffffffff
+
+CHECKSUMS = {'crc32': zlib.crc32}   # name -> fn(data, value=0), incremental like zlib.crc32
+try:
+    import crc32c as _crc32c
+    CHECKSUMS['crc32c'] = lambda data, value=0: _crc32c.crc32c(data, value)
+except ImportError:
+    try:
+        import google_crc32c as _gcrc32c
+        CHECKSUMS['crc32c'] = lambda data, value=0: _gcrc32c.extend(value, bytes(data))
+    except ImportError:
+        pass
+
+DEFAULT_CHECKSUM = 'crc32c' if 'crc32c' in CHECKSUMS else 'crc32'
+
+
+def checksum(data, alg=DEFAULT_CHECKSUM, value=0):
+    return CHECKSUMS[alg](data, value) & MASK
+
+
+def checksum_ok(data, crc, alg=None):
+    """True or False; None when there is nothing to check (no crc, or an algorithm we lack)."""
+    fn = CHECKSUMS.get(alg or 'crc32')
+    if crc is None or fn is None:
+        return None
+    try:
+        return fn(data) & MASK == int(crc)
+    except (TypeError, ValueError):
+        return False
+
+
+def leaf(length, crc):
+    return hashlib.sha256(b'\x00' + struct.pack('!QI', length, crc & MASK)).digest()
+
+
+def _node(left, right):
+    return hashlib.sha256(b'\x01' + left + right).digest()
+
+
+def merkle_root(leaves):
+    # pairing bottom-up and carrying an odd last node up unchanged builds the same
+    # left-balanced tree as RFC 6962's recursive definition
+    if not leaves:
+        return hashlib.sha256(b'').digest()
+    level = list(leaves)
+    while len(level) > 1:
+        nxt = [_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            nxt.append(level[-1])
+        level = nxt
+    return level[0]
+
+
+def _split(n):
+    return 1 << ((n - 1).bit_length() - 1)
+
+
+def proof(leaves, index):
+    """Audit path for leaf `index`: the sibling subtree roots, bottom up."""
+    if len(leaves) <= 1:
+        return []
+    k = _split(len(leaves))
+    if index < k:
+        return proof(leaves[:k], index) + [merkle_root(leaves[k:])]
+    return proof(leaves[k:], index - k) + [merkle_root(leaves[:k])]
+
+
+def verify_proof(root, n, index, leaf_hash, path):
+    # RFC 9162 section 2.1.3.2
+    if index >= n:
+        return False
+    fn, sn, r = index, n - 1, leaf_hash
+    for p in path:
+        if sn == 0:
+            return False
+        if fn & 1 or fn == sn:
+            r = _node(p, r)
+            while fn and not fn & 1:
+                fn >>= 1
+                sn >>= 1
+        else:
+            r = _node(r, p)
+        fn >>= 1
+        sn >>= 1
+    return sn == 0 and r == root
+
+
+class ChunkDigest:
+    """Leaves by chunk index, added in any order (out-of-order or retransmitted chunks)."""
+    def __init__(self):
+        self.leaves = {}
+        self.updated = 0.0
+
+    def add(self, index, length, crc, now=0.0):
+        self.leaves[index] = leaf(length, crc)
+        self.updated = now
+
+    def root(self, chunks):
+        """Hex root over chunks 0..chunks-1, or None while any of them is missing."""
+        try:
+            return merkle_root([self.leaves[i] for i in range(chunks)]).hex()
+        except KeyError:
+            return None
+
+
+class StreamDigest:
+    """Leaves of a byte stream cut every `chunk_size` bytes, fed in blocks of any size."""
+    def __init__(self, chunk_size, alg=DEFAULT_CHECKSUM):
+        self.chunk_size = chunk_size
+        self.alg = alg
+        self.fn = CHECKSUMS[alg]
+        self.leaves = []
+        self.crc = 0
+        self.fill = 0
+
+    def update(self, data):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), self.chunk_size - self.fill)
+            self.crc = self.fn(view[:take], self.crc)
+            self.fill += take
+            view = view[take:]
+            if self.fill == self.chunk_size:
+                self._close()
+
+    def _close(self):
+        self.leaves.append(leaf(self.fill, self.crc))
+        self.crc = 0
+        self.fill = 0
+
+    def digest(self):
+        """The FILE_DIGEST body: {'alg', 'chunk_size', 'chunks', 'root'}."""
+        if self.fill:
+            self._close()
+        return {'alg': self.alg, 'chunk_size': self.chunk_size, 'chunks': len(self.leaves),
+                'root': merkle_root(self.leaves).hex()}
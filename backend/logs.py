@@ -0,0 +1,208 @@
+"""
+Logging for the WebSocket server that stays off the event loop.
+Log calls only create a LogRecord and drop it into a bounded queue. If the writer falls
+behind, DEBUG/INFO records are discarded rather than blocking a handler; they are counted
+(chatchat_logs_dropped_total) and a 'log_dropped count=N' warning in the log itself marks
+where they went missing. Warnings and errors are always queued. A writer
+thread does the formatting and writes to stdout in batches. Messages follow an
+'event key=value ...' convention; the first word is the event name used for per-event
+sampling, and the JSON formatter turns the key=value pairs into fields.
+
+Configured from the environment:
+  CHATCHAT_LOG_LEVEL   DEBUG | INFO | WARNING ...        (default INFO)
+  CHATCHAT_LOG_FORMAT  text | json                       (default text)
+  CHATCHAT_LOG_SAMPLE  event=rate,...  e.g. recv=0.01,forward=0.1 (default: keep all)
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+QUEUE_SIZE = 10000
+WRITE_BATCH = 512       # records formatted and written per stream write
+
+try:
+    from backend.metrics import REGISTRY
+except ImportError:  # started from inside backend/ (uvicorn app:app)
+    from metrics import REGISTRY
+
+LOGS_DROPPED = REGISTRY.counter('chatchat_logs_dropped_total', 'Log records discarded because the writer fell behind')
+LOGS_SAMPLED_OUT = REGISTRY.counter('chatchat_logs_sampled_out_total', 'Log records skipped by sampling', ('event',))
+
+
+def event_of(record):
+    msg = record.msg if isinstance(record.msg, str) else str(record.msg)
+    return msg.split(' ', 1)[0]
+
+
+class SampleFilter(logging.Filter):
+    """Keep 1 in N records per event (N = 1/rate). Deterministic, so counts stay exact."""
+    def __init__(self, rates):
+        super().__init__()
+        self.every = {ev: max(1, round(1 / rate)) if rate > 0 else 0 for ev, rate in rates.items()}
+        self.seen = {}
+
+    def filter(self, record):
+        ev = event_of(record)
+        every = self.every.get(ev)
+        if every is None or every == 1:
+            return True
+        n = self.seen.get(ev, 0) + 1
+        self.seen[ev] = n
+        if every and n % every == 0:
+            return True
+        LOGS_SAMPLED_OUT.inc(ev)
+        return False
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread (the stock prepare()
+    formats in the caller). Log args must not be mutated after the call - ours are
+    strings and numbers."""
+    def __init__(self, q, maxsize=QUEUE_SIZE):
+        super().__init__(q)
+        self.maxsize = maxsize
+        self.dropped = 0     # since the last log_dropped record
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        # SimpleQueue is C-implemented and lock-light; bound it with an approximate size check
+        # (emit() runs under the handler lock, so the drop count needs no lock of its own)
+        if self.queue.qsize() >= self.maxsize and record.levelno < logging.WARNING:
+            self.dropped += 1
+            LOGS_DROPPED.inc()
+            return
+        self.report_dropped(record.name)
+        self.queue.put_nowait(record)
+
+    def report_dropped(self, name):
+        if self.dropped:
+            n, self.dropped = self.dropped, 0
+            self.queue.put_nowait(logging.makeLogRecord({
+                'name': name, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': 'log_dropped count=%d', 'args': (n,)}))
+
+
+class BackgroundWriter:
+    """Drains the queue on a daemon thread, formatting and writing records in batches
+    (one write + flush per batch rather than per line)."""
+    _sentinel = None
+
+    def __init__(self, q, stream, formatter, batch=WRITE_BATCH, handler=None):
+        self.queue = q
+        self.stream = stream
+        self.formatter = formatter
+        self.batch = batch
+        self.handler = handler   # LazyQueueHandler feeding q: reports its last drops on stop()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        q, fmt = self.queue, self.formatter.format
+        while True:
+            records = [q.get()]
+            while len(records) < self.batch:
+                try:
+                    records.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            done = records[-1] is self._sentinel
+            lines = []
+            for r in records:
+                if r is self._sentinel:
+                    continue
+                try:
+                    lines.append(fmt(r))
+                except Exception:
+                    lines.append(f'log format error: {r.msg!r} {r.args!r}')
+            if lines:
+                try:
+                    self.stream.write('\n'.join(lines) + '\n')
+                    self.stream.flush()
+                except Exception:
+                    pass
+            if done:
+                return
+
+    def stop(self):
+        # wait for everything already queued to be written
+        if self.thread is not None:
+            if self.handler is not None:
+                with self.handler.lock:
+                    self.handler.report_dropped(self.handler.name or 'chatchat')
+            self.queue.put(self._sentinel)
+            self.thread.join()
+            self.thread = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        msg = record.getMessage()
+        head, _, rest = msg.partition(' ')
+        out = {'ts': round(record.created, 6), 'level': record.levelname, 'logger': record.name, 'event': head}
+        text = []
+        for tok in rest.split():
+            k, eq, v = tok.partition('=')
+            if eq:
+                out[k] = v
+            else:
+                text.append(tok)
+        if text:
+            out['msg'] = ' '.join(text)
+        if record.exc_info:
+            out['exc'] = self.formatException(record.exc_info)
+        return json.dumps(out, separators=(',', ':'))
+
+
+def parse_rates(spec):
+    rates = {}
+    for part in (spec or '').split(','):
+        if '=' in part:
+            ev, rate = part.split('=', 1)
+            rates[ev.strip()] = float(rate)
+    return rates
+
+
+def _no_caller(stack_info=False, stacklevel=1):
+    return '(unknown file)', 0, '(unknown function)', None
+
+
+def setup_logging(name='chatchat', level=None, fmt=None, sample=None, stream=None, queue_size=QUEUE_SIZE):
+    """Route `name` (and its children) through a background writer. Returns (logger, listener);
+    call listener.stop() on shutdown to flush what is still queued."""
+    level = level or os.environ.get('CHATCHAT_LOG_LEVEL', 'INFO')
+    fmt = fmt or os.environ.get('CHATCHAT_LOG_FORMAT', 'text')
+    rates = sample if sample is not None else parse_rates(os.environ.get('CHATCHAT_LOG_SAMPLE'))
+
+    if fmt == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s')
+    q = queue.SimpleQueue()
+    handler = LazyQueueHandler(q, queue_size)
+    listener = BackgroundWriter(q, stream or sys.stdout, formatter, handler=handler)
+
+    log = logging.getLogger(name)
+    # skip the per-record stack walk for the caller's file/line, which nothing formats;
+    # only for this logger, the logging module's globals stay as they are
+    log.findCaller = _no_caller
+    for h in list(log.handlers):
+        log.removeHandler(h)
+    for f in list(log.filters):
+        log.removeFilter(f)
+    log.addHandler(handler)
+    if rates:
+        # on the logger, not the handler: sampled-out records never reach the queue
+        log.addFilter(SampleFilter(rates))
+    log.setLevel(str(level).upper())
+    log.propagate = False
+    listener.start()
+    return log, listener
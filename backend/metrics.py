@@ -0,0 +1,129 @@
+"""
+In-process metrics for the WebSocket server, exposed in Prometheus text format on /metrics.
+Everything is updated from the event loop thread, so counters are plain dict increments:
+no locks, no atomics, no per-update allocation beyond the first time a label set is seen.
+Gauges that mirror existing state (queue depths, connections) are computed at scrape
+time from a callback instead of being kept in sync on the hot path.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# seconds; tuned for sub-millisecond queue hops up to multi-second Mongo stalls
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                          for k, v in zip(names, values)) + '}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, doc, labels=()):
+        self.name, self.doc, self.label_names = name, doc, tuple(labels)
+        self.values = {}
+
+    def inc(self, *labels, n=1):
+        self.values[labels] = self.values.get(labels, 0) + n
+
+    def samples(self):
+        for labels, v in self.values.items():
+            yield self.name, _labels(self.label_names, labels), v
+
+
+class Gauge:
+    kind = 'gauge'
+
+    def __init__(self, name, doc, labels=(), fn=None):
+        # fn() -> number, or {label tuple: number} for labelled gauges
+        self.name, self.doc, self.label_names, self.fn = name, doc, tuple(labels), fn
+        self.values = {}
+
+    def set(self, value, *labels):
+        self.values[labels] = value
+
+    def samples(self):
+        values = self.values
+        if self.fn is not None:
+            got = self.fn()
+            values = got if isinstance(got, dict) else {(): got}
+        for labels, v in values.items():
+            yield self.name, _labels(self.label_names, labels), v
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, doc, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.doc, self.label_names = name, doc, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}   # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *labels):
+        s = self.series.get(labels)
+        if s is None:
+            s = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        s[bisect_left(self.buckets, value)] += 1
+        s[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, *labels)
+
+    def samples(self):
+        for labels, s in self.series.items():
+            cum = 0
+            for le, n in zip(self.buckets + ('+Inf',), s[:-1]):
+                cum += n
+                yield self.name + '_bucket', _labels(self.label_names + ('le',), labels + (le,)), cum
+            yield self.name + '_count', _labels(self.label_names, labels), cum
+            yield self.name + '_sum', _labels(self.label_names, labels), s[-1]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, doc, labels=()):
+        return self.add(Counter(name, doc, labels))
+
+    def gauge(self, name, doc, labels=(), fn=None):
+        return self.add(Gauge(name, doc, labels, fn))
+
+    def histogram(self, name, doc, labels=(), buckets=LATENCY_BUCKETS):
+        return self.add(Histogram(name, doc, labels, buckets))
+
+    def render(self):
+        out = []
+        for m in self.metrics:
+            out.append(f'# HELP {m.name} {m.doc}')
+            out.append(f'# TYPE {m.name} {m.kind}')
+            for name, labels, v in m.samples():
+                out.append(f'{name}{labels} {v}')
+        return '\n'.join(out) + '\n'
+
+
+REGISTRY = Registry()
+
+FRAMES_IN = REGISTRY.counter('chatchat_frames_in_total', 'Frames received from clients', ('type',))
+BYTES_IN = REGISTRY.counter('chatchat_bytes_in_total', 'Bytes received from clients', ('type',))
+FRAMES_OUT = REGISTRY.counter('chatchat_frames_out_total', 'Frames written to client sockets', ('class',))
+BYTES_OUT = REGISTRY.counter('chatchat_bytes_out_total', 'Bytes written to client sockets', ('class',))
+FRAMES_DROPPED = REGISTRY.counter('chatchat_frames_dropped_total', 'Frames dropped by the server', ('reason',))
+SEND_LATENCY = REGISTRY.histogram('chatchat_send_latency_seconds', 'Time from enqueue to socket write', ('class',))
+MONGO_LATENCY = REGISTRY.histogram('chatchat_mongo_op_seconds', 'MongoDB operation latency', ('op',))
+ASSEMBLY_TIME = REGISTRY.histogram('chatchat_chunk_assembly_seconds', 'Time to assemble a completed transfer into a stored file',
+                                   buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
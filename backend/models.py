@@ -11,6 +11,7 @@ class Message(BaseModel):
     to: Optional[str]
     room: Optional[str]
     payload: Optional[str]
+    conv: Optional[str] = None   # 'room:<r>' or 'dm:<a>|<b>', see backend/history.py
     ts: datetime = Field(default_factory=datetime.utcnow)
 
 class FileMeta(BaseModel):
@@ -0,0 +1,204 @@
+"""
+Offline mailboxes for the WebSocket server.
+Frames for a recipient who is not connected (DMs, FILE_READY notices, the latest ACK
+per transfer) are appended to that user's mailbox: written through to the storage
+backend (backend/storage.py) and kept in a local cache. Every entry gets a per-recipient sequence number. On reconnect the
+backlog is replayed as MAILBOX frames carrying up to `batch` entries each, one batch in
+flight at a time; the client answers MAILBOX_ACK with the highest seq it processed,
+which advances the delivery cursor and deletes the entries. Unacknowledged batches are
+resent from the cursor, and clients drop entries at or below the last seq they saw, so
+replay is idempotent.
+Only names that have had a session get a mailbox (register() on connect records them, in
+the cursor document so it survives a restart), and entries older than MAILBOX_TTL are
+dropped unread, so a typo or a user who never comes back doesn't grow storage forever.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict, deque
+
+try:
+    from backend.storage import MAILBOX_TTL
+except ImportError:  # started from inside backend/ (uvicorn app:app)
+    from storage import MAILBOX_TTL
+
+MAX_PENDING = 1000          # entries per recipient
+REPLAY_BATCH = 50           # entries per MAILBOX frame
+REPLAY_BATCH_BYTES = 64 * 1024
+REPLAY_TIMEOUT = 5.0        # resend an unacknowledged batch after this long
+REPLAY_RETRIES = 3
+MAX_CACHED_BOXES = 10000
+
+
+class Box:
+    def __init__(self, name):
+        self.name = name
+        self.entries = deque()   # [seq, text, coalesce_key, queued_at], ascending seq
+        self.next_seq = 1
+        self.acked = 0           # delivery cursor: everything <= acked is gone
+        self.lock = asyncio.Lock()
+        self.acked_event = asyncio.Event()
+        self.loaded = False
+        self.replaying = False
+        self.known = False       # the name has had a session
+
+
+class Mailbox:
+    def __init__(self, store=None, cap=MAX_PENDING, batch=REPLAY_BATCH,
+                 batch_bytes=REPLAY_BATCH_BYTES, timeout=REPLAY_TIMEOUT, ttl=MAILBOX_TTL):
+        self.store = store             # backend/storage.py Storage; None keeps boxes in memory only
+        self.cap = cap
+        self.batch = batch
+        self.batch_bytes = batch_bytes
+        self.timeout = timeout
+        self.ttl = ttl
+        self.boxes = OrderedDict()     # name -> Box, least recently used first
+        self.seen = set()              # names that have had a session
+
+    async def _box(self, name):
+        box = self.boxes.get(name)
+        if box is None:
+            box = self.boxes[name] = Box(name)
+            self._evict()
+        else:
+            self.boxes.move_to_end(name)
+        async with box.lock:
+            if not box.loaded:
+                await self._load(box)
+            await self._expire(box)
+        return box
+
+    def _evict(self):
+        # only spill boxes that the database can give back
+        if self.store is None or len(self.boxes) <= MAX_CACHED_BOXES:
+            return
+        for name in list(self.boxes):
+            if len(self.boxes) <= MAX_CACHED_BOXES:
+                break
+            box = self.boxes[name]
+            if not box.replaying and not box.lock.locked():
+                del self.boxes[name]
+
+    async def _load(self, box):
+        box.loaded = True
+        if self.store is None:
+            return
+        cur, entries = await self.store.mailbox_load(box.name)
+        if cur:
+            box.next_seq = cur.get('next_seq', 1)
+            box.acked = cur.get('acked', 0)
+            box.known = bool(cur.get('seen'))
+        for seq, frame, key, at in entries:
+            if seq > box.acked:
+                box.entries.append([seq, frame, key, at])
+                box.next_seq = max(box.next_seq, seq + 1)
+
+    async def _expire(self, box):
+        # entries are queued in seq order, so the stale ones are a prefix
+        cutoff, last = time.time() - self.ttl, 0
+        while box.entries and box.entries[0][3] < cutoff:
+            last = box.entries.popleft()[0]
+        if last and self.store is not None:
+            await self.store.mailbox_delete_through(box.name, last)
+
+    async def register(self, name):
+        """Record that `name` has had a session, so frames for it may be queued from now on."""
+        if name in self.seen:
+            return
+        if self.store is not None:
+            await self.store.mailbox_cursor_max(name, seen=time.time())
+        self.seen.add(name)
+
+    async def known(self, name):
+        if name in self.seen:
+            return True
+        if self.store is None:
+            return False
+        if (await self._box(name)).known:
+            self.seen.add(name)
+            return True
+        return False
+
+    def pending(self, name):
+        box = self.boxes.get(name)
+        return len(box.entries) if box else 0
+
+    async def put(self, name, obj, text=None, coalesce=None):
+        """Queue a frame for an offline user. Returns the entry's seq, or 0 when full.
+        A `coalesce` key replaces any undelivered entry with the same key (e.g. older ACKs)."""
+        text = text if text is not None else json.dumps(obj)
+        box = await self._box(name)
+        async with box.lock:
+            if coalesce is not None and not box.replaying:
+                for i, e in enumerate(box.entries):
+                    if e[2] == coalesce:
+                        del box.entries[i]
+                        if self.store is not None:
+                            await self.store.mailbox_delete(name, e[0])
+                        break
+            if len(box.entries) >= self.cap:
+                return 0
+            seq = box.next_seq
+            box.next_seq += 1
+            at = time.time()
+            box.entries.append([seq, text, coalesce, at])
+            if self.store is not None:
+                await self.store.mailbox_insert(name, seq, text, coalesce, at)
+                await self.store.mailbox_cursor_max(name, next_seq=box.next_seq)
+            return seq
+
+    async def ack(self, name, seq):
+        box = self.boxes.get(name)
+        if box is None:
+            return
+        async with box.lock:
+            seq = min(seq, box.next_seq - 1)   # can't acknowledge what was never queued
+            if seq <= box.acked:
+                return
+            box.acked = seq
+            while box.entries and box.entries[0][0] <= seq:
+                box.entries.popleft()
+            if self.store is not None:
+                await self.store.mailbox_delete_through(name, seq)
+                await self.store.mailbox_cursor_max(name, acked=seq)
+        box.acked_event.set()
+
+    def _next_batch(self, box):
+        seqs, texts, size = [], [], 0
+        for seq, text, _, _ in box.entries:
+            if seq <= box.acked:
+                continue
+            if texts and (len(texts) >= self.batch or size + len(text) > self.batch_bytes):
+                break
+            seqs.append(seq)
+            texts.append(text)
+            size += len(text)
+        return seqs, texts
+
+    async def replay(self, name, send):
+        """Drain `name`'s backlog through send(text); one batch in flight at a time."""
+        box = await self._box(name)
+        if box.replaying:
+            return
+        box.replaying = True
+        retries = 0
+        try:
+            while True:
+                seqs, texts = self._next_batch(box)
+                if not seqs:
+                    return
+                # entries are stored pre-encoded, so the batch frame is built by concatenation
+                frame = '{"type":"MAILBOX","seqs":%s,"last":%d,"frames":[%s]}' % (
+                    json.dumps(seqs), seqs[-1], ','.join(texts))
+                box.acked_event.clear()
+                if not send(frame):
+                    return
+                try:
+                    await asyncio.wait_for(box.acked_event.wait(), timeout=self.timeout)
+                    retries = 0
+                except asyncio.TimeoutError:
+                    retries += 1
+                    if retries > REPLAY_RETRIES:
+                        return
+        finally:
+            box.replaying = False
@@ -0,0 +1,132 @@
+"""
+Per-user / per-room / per-transfer rate limiting for the WebSocket server.
+Each key owns one TokenBucket (backend/flow_control.py) kept in an LRU map; buckets
+that have been idle for longer than idle_ttl are evicted as new keys arrive, so memory
+is O(1) per *active* key. A rejected frame yields a retry hint (seconds) that the
+server sends back in a THROTTLE frame for the client's congestion control to act on.
+"""
+import os
+import time
+from collections import OrderedDict
+
+try:
+    from backend.flow_control import TokenBucket
+except ImportError:  # started from inside backend/ (uvicorn app:app)
+    from flow_control import TokenBucket
+
+
+def _env(name, default):
+    return float(os.environ.get(name, default))
+
+
+# defaults are generous for people, tight for runaway scripts; override via env
+USER_MSG_RATE = _env('CHATCHAT_USER_MSG_RATE', 20)               # MSG frames/s per user
+USER_BYTE_RATE = _env('CHATCHAT_USER_BYTE_RATE', 4 * 1024 * 1024)  # inbound bytes/s per user
+ROOM_MSG_RATE = _env('CHATCHAT_ROOM_MSG_RATE', 50)               # MSG frames/s per room
+TRANSFER_BYTE_RATE = _env('CHATCHAT_TRANSFER_BYTE_RATE', 2 * 1024 * 1024)  # bytes/s per transfer
+MAX_TRANSFERS = int(_env('CHATCHAT_MAX_TRANSFERS', 4))            # concurrent uploads per user
+BURST_SECONDS = 2.0        # bucket depth, in seconds of rate
+IDLE_TTL = 60.0
+
+
+class KeyedLimiter:
+    def __init__(self, rate, burst=None, idle_ttl=IDLE_TTL, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate * BURST_SECONDS
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+        self.buckets = OrderedDict()   # key -> TokenBucket, least recently used first
+
+    def _evict_idle(self, now):
+        while self.buckets:
+            key, bucket = next(iter(self.buckets.items()))
+            if now - bucket.stamp < self.idle_ttl:
+                break
+            del self.buckets[key]
+
+    def check(self, key, cost=1.0):
+        """0.0 if `cost` tokens were taken, else seconds until they would be available."""
+        now = self.clock()
+        self._evict_idle(now)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst, self.clock)
+        else:
+            self.buckets.move_to_end(key)
+        if bucket.consume(cost):
+            return 0.0
+        return max(bucket.delay_for(cost), 0.001)
+
+    def charge(self, key, cost):
+        """Take `cost` tokens even if that leaves the bucket in debt (later frames wait)."""
+        self.check(key, 0)
+        self.buckets[key].tokens -= cost
+
+    def __len__(self):
+        return len(self.buckets)
+
+
+class RateLimiter:
+    def __init__(self, clock=time.monotonic):
+        self.user_msgs = KeyedLimiter(USER_MSG_RATE, clock=clock)
+        self.user_bytes = KeyedLimiter(USER_BYTE_RATE, clock=clock)
+        self.room_msgs = KeyedLimiter(ROOM_MSG_RATE, clock=clock)
+        self.transfer_bytes = KeyedLimiter(TRANSFER_BYTE_RATE, clock=clock)
+        self.max_transfers = MAX_TRANSFERS
+        self.active = {}   # user -> set(transfer_id)
+
+    def check(self, name, msg, nbytes):
+        """Return None to admit the frame, or a THROTTLE frame to send back instead."""
+        mtype = msg.get('type')
+        if mtype == 'FILE_META':
+            # FILE_META is tiny and opens the transfer: its bytes are charged but never throttle
+            # it. The transfer slot is taken only once the frame is admitted, so a refused
+            # FILE_META leaves nothing behind (its sender resends it after retry_after)
+            tid = (msg.get('meta') or {}).get('transfer_id') or msg.get('transfer_id')
+            mine = self.active.get(name, set())
+            if tid and tid not in mine and len(mine) >= self.max_transfers:
+                return self._throttle('concurrent transfers', 'user', 5.0, msg)
+            self.user_bytes.charge(name, nbytes)
+            if tid:
+                self.active.setdefault(name, set()).add(tid)
+            return None
+        wait = self.user_bytes.check(name, nbytes)
+        if wait:
+            return self._throttle('byte rate', 'user', wait, msg)
+        if mtype == 'MSG':
+            wait = self.user_msgs.check(name)
+            if wait:
+                return self._throttle('message rate', 'user', wait, msg)
+            room = msg.get('room')
+            if room and not msg.get('to'):
+                wait = self.room_msgs.check(room)
+                if wait:
+                    return self._throttle('room message rate', 'room', wait, msg)
+        elif mtype in ('FILE_CHUNK', 'FEC'):
+            # parity is part of the transfer's bytes
+            tid = msg.get('transfer_id') or (msg.get('meta') or {}).get('transfer_id')
+            if tid:
+                wait = self.transfer_bytes.check(tid, nbytes)
+                if wait:
+                    return self._throttle('transfer byte rate', 'transfer', wait, msg)
+        return None
+
+    def transfer_finished(self, name, transfer_id):
+        mine = self.active.get(name)
+        if mine is not None:
+            mine.discard(transfer_id)
+            if not mine:
+                del self.active[name]
+
+    def forget_user(self, name):
+        self.active.pop(name, None)
+
+    def _throttle(self, why, scope, retry_after, msg):
+        out = {'type':'THROTTLE', 'why': why, 'scope': scope, 'retry_after': round(retry_after, 3), 'dropped': msg.get('type')}
+        tid = msg.get('transfer_id') or (msg.get('meta') or {}).get('transfer_id')
+        if tid:
+            out['transfer_id'] = tid
+        for k in ('seq', 'stream', 'chunk_index'):
+            if msg.get(k) is not None:
+                out[k] = msg[k]
+        return out
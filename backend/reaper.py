@@ -0,0 +1,104 @@
+"""
+Garbage collection for file uploads that never finish.
+A sender that disconnects mid-upload leaves its chunks and an in_progress transfer
+record behind. The reaper wakes every `interval` seconds and looks for transfers whose
+record hasn't been touched for `stale_after` seconds (chunk writes refresh it, see
+app.persist_chunk). It deletes their chunks in bounded batches, so a big upload never
+holds one long write lock, and marks them abandoned. With `blob_retention` set it also
+purges stored files that no transfer references once they are older than that. Each
+sweep handles at most `per_sweep` transfers and files, and reclaimed bytes are logged
+and counted on /metrics.
+"""
+import asyncio
+import logging
+import os
+import time
+
+try:
+    from backend.metrics import REGISTRY
+    from backend.storage import DELETE_BATCH
+except ImportError:  # started from inside backend/ (uvicorn app:app)
+    from metrics import REGISTRY
+    from storage import DELETE_BATCH
+
+log = logging.getLogger('chatchat.reaper')
+
+
+def _env(name, default):
+    return float(os.environ.get(name, default))
+
+
+STALE_AFTER = _env('CHATCHAT_REAP_STALE_AFTER', 1800)     # seconds without progress
+REAP_INTERVAL = _env('CHATCHAT_REAP_INTERVAL', 60)
+BLOB_RETENTION = _env('CHATCHAT_BLOB_RETENTION', 0)       # seconds; 0 keeps unreferenced files
+PER_SWEEP = 100
+
+REAPED = REGISTRY.counter('chatchat_reaped_total', 'Abandoned transfers and orphaned files removed', ('what',))
+RECLAIMED = REGISTRY.counter('chatchat_reclaimed_bytes_total', 'Bytes freed by the reaper', ('what',))
+
+
+class Reaper:
+    def __init__(self, storage, stale_after=STALE_AFTER, interval=REAP_INTERVAL, blob_retention=BLOB_RETENTION,
+                 batch=DELETE_BATCH, per_sweep=PER_SWEEP, on_abandoned=None, prune=None, clock=time.time):
+        self.storage = storage
+        self.stale_after = stale_after
+        self.interval = interval
+        self.blob_retention = blob_retention
+        self.batch = batch
+        self.per_sweep = per_sweep
+        self.on_abandoned = on_abandoned   # called with each abandoned transfer record
+        self.prune = prune                 # called with the stale cutoff, for state outside storage
+        self.clock = clock
+        self.blob_cursor = None            # old_blobs() resumes here, so every file is looked at in turn
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.run())
+        return self.task
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except Exception as e:
+                log.warning('reap_failed %s', e)
+
+    async def sweep(self):
+        now = self.clock()
+        stats = {'abandoned': 0, 'chunk_bytes': 0, 'blobs': 0, 'blob_bytes': 0}
+        cutoff = now - self.stale_after
+        if self.prune is not None:
+            self.prune(cutoff)
+        for doc in await self.storage.stale_transfers(cutoff, limit=self.per_sweep):
+            tid = doc['transfer_id']
+            freed = await self.storage.delete_chunks(tid, batch=self.batch)
+            await self.storage.update_transfer(tid, {'status': 'abandoned', 'updated': now})
+            if self.on_abandoned is not None:
+                self.on_abandoned(doc)
+            stats['abandoned'] += 1
+            stats['chunk_bytes'] += freed
+            log.info('transfer_abandoned transfer_id=%s sender=%s freed=%d', tid, doc.get('sender'), freed)
+        if self.blob_retention > 0:
+            ids = await self.storage.old_blobs(now - self.blob_retention, after=self.blob_cursor, limit=self.per_sweep)
+            self.blob_cursor = ids[-1] if len(ids) == self.per_sweep else None
+            for blob_id in ids:
+                if await self.storage.transfer_for_blob(blob_id) is None:
+                    stats['blob_bytes'] += await self.storage.delete_blob(blob_id)
+                    stats['blobs'] += 1
+        REAPED.inc('transfers', n=stats['abandoned'])
+        REAPED.inc('blobs', n=stats['blobs'])
+        RECLAIMED.inc('chunks', n=stats['chunk_bytes'])
+        RECLAIMED.inc('blobs', n=stats['blob_bytes'])
+        if stats['abandoned'] or stats['blobs']:
+            log.info('reaped abandoned=%d chunk_bytes=%d blobs=%d blob_bytes=%d', stats['abandoned'],
+                     stats['chunk_bytes'], stats['blobs'], stats['blob_bytes'])
+        return stats
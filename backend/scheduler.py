@@ -0,0 +1,189 @@
+"""
+Per-recipient outbound scheduling for the WebSocket server.
+Every connected client gets an OutboundQueue drained by its own writer task, so the
+handler that received a frame never blocks on a slow recipient. Frames are classed as
+control (ACKs, presence, errors), interactive (chat) or bulk (file transfer). Control
+frames are tiny and latency-critical (they clock the senders' windows), so they go
+ahead of everything else; interactive and bulk share the rest by two-level deficit
+round robin: weighted across the two classes, then fair across the senders within a
+class so one uploader can't monopolise a recipient.
+"""
+import asyncio
+import time
+from collections import deque
+
+try:
+    from backend.metrics import FRAMES_OUT, BYTES_OUT, FRAMES_DROPPED, SEND_LATENCY
+except ImportError:  # started from inside backend/ (uvicorn app:app)
+    from metrics import FRAMES_OUT, BYTES_OUT, FRAMES_DROPPED, SEND_LATENCY
+
+CONTROL, INTERACTIVE, BULK = 'control', 'interactive', 'bulk'
+
+FRAME_CLASS = {
+    'ACK': CONTROL, 'CONNECTED': CONTROL, 'CLIENTS': CONTROL, 'JOINED': CONTROL,
+    'LEFT': CONTROL, 'ERROR': CONTROL, 'SERVER_RECV_CHUNK': CONTROL, 'FILE_READY': CONTROL,
+    'THROTTLE': CONTROL, 'QUEUED': CONTROL, 'CHUNK_BAD': CONTROL,
+    # FILE_META opens a transfer and FILE_DIGEST closes it; nothing resends either, so they
+    # must never be dropped. Both receivers keep a digest that overtakes the last chunks
+    'FILE_META': CONTROL, 'FILE_DIGEST': CONTROL,
+    'MSG': INTERACTIVE, 'MAILBOX': INTERACTIVE,
+    # FEC parity shares the bulk queue so it stays behind the chunks it covers
+    'FILE_CHUNK': BULK, 'FEC': BULK,
+}
+
+# bytes of credit per round: chat gets far more than file data
+CLASS_WEIGHTS = {INTERACTIVE: 4, BULK: 1}
+QUANTUM = 16 * 1024
+MAX_QUEUE_BYTES = 8 * 1024 * 1024   # bulk frames beyond this are dropped (senders retransmit)
+
+
+def frame_class(mtype):
+    return FRAME_CLASS.get(mtype, INTERACTIVE)
+
+
+class Fifo:
+    def __init__(self):
+        self.items = deque()
+
+    def push(self, item, size):
+        self.items.append((item, size))
+
+    def peek_size(self):
+        return self.items[0][1]
+
+    def pop(self):
+        return self.items.popleft()
+
+    def __len__(self):
+        return len(self.items)
+
+
+class DeficitRoundRobin:
+    """DRR (Shreedhar & Varghese) over keyed flows. A flow is anything with
+    push/peek_size/pop/__len__, so a DeficitRoundRobin can itself be a flow."""
+    def __init__(self, quantum, weights=None, flow_factory=Fifo):
+        self.quantum = quantum
+        self.weights = weights or {}
+        self.flow_factory = flow_factory
+        self.flows = {}
+        self.deficit = {}
+        self.active = deque()
+        self.turn = False       # head flow already got its quantum this round
+        self.count = 0
+
+    def flow(self, key):
+        f = self.flows.get(key)
+        if f is None:
+            f = self.flows[key] = self.flow_factory()
+            self.deficit[key] = 0
+        return f
+
+    def push(self, key, item, size, *sub):
+        f = self.flow(key)
+        if sub:
+            f.push(*sub, item, size)
+        else:
+            f.push(item, size)
+        if key not in self.active:
+            self.active.append(key)
+        self.count += 1
+
+    def _select(self):
+        # run the round robin up to the flow whose head fits its credit. Idempotent, so
+        # peek_size() reports the frame pop() returns next, which an outer DRR checks its
+        # own credit against when this one is nested in it
+        while True:
+            key = self.active[0]
+            f = self.flows[key]
+            if not self.turn:
+                self.deficit[key] += self.quantum * self.weights.get(key, 1)
+                self.turn = True
+            if self.deficit[key] >= f.peek_size():
+                return key, f
+            self.active.rotate(-1)
+            self.turn = False
+
+    def peek_size(self):
+        return self._select()[1].peek_size()
+
+    def pop(self):
+        key, f = self._select()
+        item, size = f.pop()
+        self.deficit[key] -= size
+        self.count -= 1
+        if not len(f):
+            # idle flows keep no credit (standard DRR)
+            self.active.popleft()
+            del self.flows[key]
+            del self.deficit[key]
+            self.turn = False
+        return item, size
+
+    def __len__(self):
+        return self.count
+
+
+class OutboundQueue:
+    def __init__(self, websocket, weights=CLASS_WEIGHTS, quantum=QUANTUM, max_bytes=MAX_QUEUE_BYTES):
+        self.websocket = websocket
+        self.control = Fifo()
+        # outer DRR across classes, inner DRR across senders within each class
+        self.drr = DeficitRoundRobin(quantum, weights, flow_factory=lambda: DeficitRoundRobin(quantum))
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.dropped = 0
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def put(self, text, cls=INTERACTIVE, sender=None, stamp=None):
+        # stamp: called as the frame is written and returns the text to send (session seq)
+        size = len(text)
+        if cls == BULK and self.bytes + size > self.max_bytes:
+            self.dropped += 1
+            FRAMES_DROPPED.inc('queue_full')
+            return False
+        item = (text, cls, time.perf_counter(), stamp)
+        if cls == CONTROL:
+            self.control.push(item, size)
+        else:
+            self.drr.push(cls, item, size, sender)
+        self.bytes += size
+        self.wakeup.set()
+        return True
+
+    def depth(self):
+        return len(self.control) + len(self.drr)
+
+    def _next(self):
+        if len(self.control):
+            return self.control.pop()
+        return self.drr.pop()
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.run())
+        return self.task
+
+    async def run(self):
+        while True:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            while self.depth():
+                (text, cls, t0, stamp), size = self._next()
+                self.bytes -= size
+                if stamp is not None:
+                    text = stamp()
+                try:
+                    await self.websocket.send_text(text)
+                except Exception:
+                    return
+                SEND_LATENCY.observe(time.perf_counter() - t0, cls)
+                FRAMES_OUT.inc(cls)
+                BYTES_OUT.inc(cls, n=size)
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except (asyncio.CancelledError, Exception):
+                pass
@@ -0,0 +1,109 @@
+"""
+Resumable client sessions for the WebSocket server.
+A session outlives its WebSocket: every frame sent to the client is stamped with a
+per-session sequence number ("sseq") and control/interactive frames are kept in a short
+replay buffer. The seq is stamped by the outbox writer as the frame goes out, not when it
+is queued: control frames overtake queued bulk ones, and stamping in write order keeps
+the seqs a client sees increasing, so "highest sseq seen" stays a valid resume point. A client that reconnects with ?session=<token>&last_seq=<n> within
+SESSION_TTL gets back only the frames after n, and keeps its name, rooms and in-flight
+transfers. Bulk frames (file data) are stamped but not buffered: their senders
+retransmit anything unacknowledged, so replaying them would only duplicate work.
+"""
+import secrets
+import time
+from collections import deque
+from functools import partial
+
+try:
+    from backend.scheduler import BULK
+except ImportError:  # started from inside backend/ (uvicorn app:app)
+    from scheduler import BULK
+
+SESSION_TTL = 60.0            # how long a dropped session waits to be resumed
+REPLAY_FRAMES = 1024
+REPLAY_BYTES = 1024 * 1024
+
+
+def stamp(text, seq):
+    # frames are JSON objects, so the seq can be spliced in without re-encoding
+    return f'{text[:-1]},"sseq":{seq}}}'
+
+
+class Session:
+    def __init__(self, name, max_frames=REPLAY_FRAMES, max_bytes=REPLAY_BYTES, clock=time.monotonic):
+        self.name = name
+        self.token = secrets.token_urlsafe(18)
+        self.seq = 0
+        self.replay = deque()     # [seq, text, cls, sender], oldest first; seq is None until written
+        self.replay_bytes = 0
+        self.evicted = 0          # highest seq that fell out of the buffer
+        self.evicted_unsent = 0   # frames that fell out before they were ever written
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.websocket = None
+        self.outbox = None
+        self.detached_at = None
+
+    @property
+    def attached(self):
+        return self.outbox is not None
+
+    def attach(self, websocket, outbox):
+        self.websocket = websocket
+        self.outbox = outbox
+        self.detached_at = None
+
+    def detach(self):
+        self.outbox = None
+        self.detached_at = self.clock()
+
+    def expired(self, ttl=SESSION_TTL):
+        return self.detached_at is not None and self.clock() - self.detached_at >= ttl
+
+    def send(self, text, cls, sender=None):
+        """Remember and (when attached) enqueue a frame. While detached the frame only
+        lands in the replay buffer, to be sent on resume."""
+        entry = [None, text, cls, sender]
+        if cls != BULK:
+            self.replay.append(entry)
+            self.replay_bytes += len(text)
+            while self.replay and (len(self.replay) > self.max_frames or self.replay_bytes > self.max_bytes):
+                old = self.replay.popleft()
+                self.replay_bytes -= len(old[1])
+                if old[0] is None:
+                    old.append(True)   # still queued: written() records its seq once it goes out
+                    self.evicted_unsent += 1
+                else:
+                    self.evicted = old[0]
+        if self.outbox is not None:
+            return self.outbox.put(text, cls, sender, stamp=partial(self.written, entry))
+        return True
+
+    def written(self, entry):
+        # called by the outbox writer right before the frame goes out
+        self.seq += 1
+        entry[0] = self.seq
+        if len(entry) > 4:
+            del entry[4]
+            self.evicted_unsent -= 1
+            self.evicted = self.seq
+        return stamp(entry[1], self.seq)
+
+    def gap(self, last_seq):
+        # frames the client never saw are no longer in the buffer
+        return last_seq < self.evicted or self.evicted_unsent > 0
+
+    def resume(self, last_seq):
+        """Re-enqueue everything after last_seq, and whatever the old socket never wrote.
+        Returns (frames replayed, gap) where gap means older frames had already fallen
+        out of the buffer."""
+        gap = self.gap(last_seq)
+        # an evicted frame the old outbox never wrote is gone for good
+        self.evicted_unsent = 0
+        n = 0
+        for entry in self.replay:
+            if entry[0] is None or entry[0] > last_seq:
+                self.outbox.put(entry[1], entry[2], entry[3], stamp=partial(self.written, entry))
+                n += 1
+        return n, gap
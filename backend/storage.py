@@ -0,0 +1,470 @@
+"""
+Storage backends for the WebSocket server: transfer records, file chunks, assembled
+blobs, chat messages and offline mailboxes behind one async interface.
+- MemoryStorage keeps everything in dicts: no outside services, for tests, load runs
+  and demos. Nothing survives a restart.
+- MongoStorage is the original layout: Motor collections plus a GridFS bucket.
+- LocalFileStorage puts chunks and blobs on disk and hands everything else to another
+  backend. Chunks are written in place with os.pwrite at their byte offset into one
+  file per transfer, so assembly is a rename instead of a copy, and a finished file can
+  be served straight from disk (FileResponse) instead of being read back in pieces.
+open_storage() picks one from MONGODB_URI (memory:// means MemoryStorage) and
+CHATCHAT_FILES_DIR (chunks and blobs on local disk).
+"""
+import asyncio
+import bisect
+import hashlib
+import os
+import re
+import time
+from datetime import datetime, timezone
+
+try:
+    from backend.metrics import MONGO_LATENCY
+except ImportError:  # started from inside backend/ (uvicorn app:app)
+    from metrics import MONGO_LATENCY
+
+DELETE_BATCH = 500   # chunk documents per delete, so a big transfer never holds a long write lock
+MAILBOX_TTL = 7 * 24 * 3600   # unread mailbox entries are dropped after this long
+
+
+class Storage:
+    """Interface. Message docs are dicts with _id, conv, ts (see history.py); mailbox
+    entries are (seq, frame_text, coalesce_key) tuples in ascending seq."""
+
+    async def ensure_indexes(self):
+        pass
+
+    async def close(self):
+        pass
+
+    # transfers
+    async def put_transfer(self, transfer_id, fields):
+        raise NotImplementedError
+
+    async def get_transfer(self, transfer_id):
+        raise NotImplementedError
+
+    async def update_transfer(self, transfer_id, fields):
+        raise NotImplementedError
+
+    async def stale_transfers(self, cutoff, limit=100):
+        """in_progress transfers whose `updated` time (epoch seconds) is before cutoff."""
+        raise NotImplementedError
+
+    async def transfer_for_blob(self, blob_id):
+        raise NotImplementedError
+
+    # chunks and blobs
+    async def put_chunk(self, transfer_id, index, data, offset=None, size=None, total=None, chunk_size=None):
+        """Store one chunk (a repeat of an index replaces it); returns how many distinct
+        chunks of the transfer are stored. offset/size/total/chunk_size only matter to
+        LocalFileStorage."""
+        raise NotImplementedError
+
+    async def assemble(self, transfer_id, fname):
+        """Join the chunks in index order into a blob, drop the chunks, return the blob id."""
+        raise NotImplementedError
+
+    async def delete_chunks(self, transfer_id, batch=DELETE_BATCH):
+        """Drop a transfer's chunks, at most `batch` per delete; returns the bytes freed."""
+        raise NotImplementedError
+
+    async def old_blobs(self, cutoff, after=None, limit=100):
+        """Ids of blobs stored before cutoff, ascending, starting after `after`."""
+        raise NotImplementedError
+
+    async def delete_blob(self, blob_id):
+        """Returns the bytes freed."""
+        raise NotImplementedError
+
+    def blob_path(self, blob_id):
+        """A local file holding the blob, when the backend has one (served with sendfile)."""
+        return None
+
+    async def read_blob(self, blob_id, block=64 * 1024):
+        """Async iterator over the blob's bytes; raises KeyError for an unknown id."""
+        raise NotImplementedError
+        yield
+
+    # messages
+    async def insert_messages(self, docs):
+        raise NotImplementedError
+
+    async def message_page(self, conv, before=None, limit=50):
+        """Up to limit docs of conv, newest first, strictly older than before=(ts, _id)."""
+        raise NotImplementedError
+
+    # mailboxes
+    async def mailbox_load(self, name, after=0):
+        """(cursor dict or None, [(seq, frame, key, queued_at)] with seq > after)."""
+        raise NotImplementedError
+
+    async def mailbox_insert(self, name, seq, frame, key=None, at=None):
+        raise NotImplementedError
+
+    async def mailbox_delete(self, name, seq):
+        raise NotImplementedError
+
+    async def mailbox_delete_through(self, name, seq):
+        raise NotImplementedError
+
+    async def mailbox_cursor_max(self, name, **fields):
+        """Raise the recipient's cursor fields (next_seq, acked, seen) to at least these values."""
+        raise NotImplementedError
+
+
+class MemoryStorage(Storage):
+    def __init__(self):
+        self.transfers = {}      # transfer_id -> doc
+        self.chunks = {}         # transfer_id -> {index: bytes}
+        self.blobs = {}          # blob_id -> bytes
+        self.blob_times = {}     # blob_id -> epoch seconds stored
+        self.messages = {}       # conv -> docs sorted by (ts, _id), oldest first
+        self.mail = {}           # name -> {seq: (frame, key, queued_at)}
+        self.cursors = {}        # name -> {'next_seq', 'acked', 'seen'}
+
+    async def put_transfer(self, transfer_id, fields):
+        self.transfers.setdefault(transfer_id, {'transfer_id': transfer_id}).update(fields)
+
+    async def get_transfer(self, transfer_id):
+        doc = self.transfers.get(transfer_id)
+        return dict(doc) if doc is not None else None
+
+    async def update_transfer(self, transfer_id, fields):
+        if transfer_id in self.transfers:
+            self.transfers[transfer_id].update(fields)
+
+    async def stale_transfers(self, cutoff, limit=100):
+        return [dict(d) for d in self.transfers.values()
+                if d.get('status') == 'in_progress' and d.get('updated', 0) < cutoff][:limit]
+
+    async def transfer_for_blob(self, blob_id):
+        for d in self.transfers.values():
+            if d.get('blob_id') == blob_id:
+                return dict(d)
+        return None
+
+    async def put_chunk(self, transfer_id, index, data, offset=None, size=None, total=None, chunk_size=None):
+        chunks = self.chunks.setdefault(transfer_id, {})
+        chunks[index] = data
+        return len(chunks)
+
+    async def assemble(self, transfer_id, fname):
+        chunks = self.chunks.pop(transfer_id, {})
+        self.blobs[transfer_id] = b''.join(chunks[i] for i in sorted(chunks))
+        self.blob_times[transfer_id] = time.time()
+        return transfer_id
+
+    async def delete_chunks(self, transfer_id, batch=DELETE_BATCH):
+        return sum(len(c) for c in self.chunks.pop(transfer_id, {}).values())
+
+    async def old_blobs(self, cutoff, after=None, limit=100):
+        ids = sorted(b for b, t in self.blob_times.items() if t < cutoff and (after is None or b > after))
+        return ids[:limit]
+
+    async def delete_blob(self, blob_id):
+        self.blob_times.pop(blob_id, None)
+        return len(self.blobs.pop(blob_id, b''))
+
+    async def read_blob(self, blob_id, block=64 * 1024):
+        data = self.blobs[blob_id]
+        for i in range(0, len(data), block):
+            yield data[i:i + block]
+
+    async def insert_messages(self, docs):
+        for d in docs:
+            bisect.insort(self.messages.setdefault(d['conv'], []), d, key=lambda m: (m['ts'], m['_id']))
+
+    async def message_page(self, conv, before=None, limit=50):
+        docs = self.messages.get(conv, [])
+        end = len(docs) if before is None else bisect.bisect_left(docs, before, key=lambda m: (m['ts'], m['_id']))
+        return docs[max(0, end - limit):end][::-1]
+
+    async def mailbox_load(self, name, after=0):
+        box = self.mail.get(name, {})
+        entries = [(seq,) + entry for seq, entry in sorted(box.items()) if seq > after]
+        cur = self.cursors.get(name)
+        return (dict(cur) if cur else None), entries
+
+    async def mailbox_insert(self, name, seq, frame, key=None, at=None):
+        self.mail.setdefault(name, {})[seq] = (frame, key, at if at is not None else time.time())
+
+    async def mailbox_delete(self, name, seq):
+        self.mail.get(name, {}).pop(seq, None)
+
+    async def mailbox_delete_through(self, name, seq):
+        box = self.mail.get(name)
+        if box:
+            for s in [s for s in box if s <= seq]:
+                del box[s]
+
+    async def mailbox_cursor_max(self, name, **fields):
+        cur = self.cursors.setdefault(name, {})
+        for k, v in fields.items():
+            cur[k] = max(cur.get(k, v), v)
+
+
+class MongoStorage(Storage):
+    def __init__(self, client, db, bucket=None):
+        self.client = client
+        self.db = db
+        self.bucket = bucket     # AsyncIOMotorGridFSBucket; without it finished files aren't kept
+
+    async def ensure_indexes(self):
+        await self.db.messages.create_index([('conv', 1), ('ts', -1), ('_id', -1)])
+        await self.db.mailbox.create_index([('to', 1), ('seq', 1)], unique=True)
+        # catches the boxes nobody ever loads again; Mailbox expires the rest as it goes
+        await self.db.mailbox.create_index('at', expireAfterSeconds=MAILBOX_TTL)
+        await self.db.file_chunks.create_index([('transfer_id', 1), ('chunk_index', 1)], unique=True)
+        await self.db.file_transfers.create_index([('status', 1), ('updated', 1)])
+        await self.db.file_transfers.create_index('blob_id', sparse=True)
+
+    async def close(self):
+        self.client.close()
+
+    async def put_transfer(self, transfer_id, fields):
+        with MONGO_LATENCY.time('transfer_upsert'):
+            await self.db.file_transfers.update_one({'transfer_id': transfer_id},
+                                                    {'$set': dict(fields, transfer_id=transfer_id)}, upsert=True)
+
+    async def get_transfer(self, transfer_id):
+        with MONGO_LATENCY.time('transfer_find'):
+            return await self.db.file_transfers.find_one({'transfer_id': transfer_id})
+
+    async def update_transfer(self, transfer_id, fields):
+        await self.db.file_transfers.update_one({'transfer_id': transfer_id}, {'$set': fields})
+
+    async def stale_transfers(self, cutoff, limit=100):
+        # records written before transfers carried `updated` are stale by definition
+        query = {'status': 'in_progress', '$or': [{'updated': {'$lt': cutoff}}, {'updated': {'$exists': False}}]}
+        return [d async for d in self.db.file_transfers.find(query).limit(limit)]
+
+    async def transfer_for_blob(self, blob_id):
+        return await self.db.file_transfers.find_one({'$or': [{'blob_id': blob_id}, {'gridfs_id': blob_id}]})
+
+    async def put_chunk(self, transfer_id, index, data, offset=None, size=None, total=None, chunk_size=None):
+        # upsert, so a retransmitted chunk can't be counted twice
+        with MONGO_LATENCY.time('chunk_insert'):
+            await self.db.file_chunks.update_one({'transfer_id': transfer_id, 'chunk_index': index},
+                                                 {'$set': {'data': data}}, upsert=True)
+        with MONGO_LATENCY.time('chunk_count'):
+            return await self.db.file_chunks.count_documents({'transfer_id': transfer_id})
+
+    async def assemble(self, transfer_id, fname):
+        assembled = bytearray()
+        async for ch in self.db.file_chunks.find({'transfer_id': transfer_id}).sort('chunk_index', 1):
+            assembled.extend(ch['data'])
+        blob_id = None
+        if self.bucket is not None:
+            blob_id = await self.bucket.upload_from_stream(fname, bytes(assembled))
+        await self.delete_chunks(transfer_id)
+        return blob_id
+
+    async def delete_chunks(self, transfer_id, batch=DELETE_BATCH):
+        freed = 0
+        while True:
+            # sizes come from the server, so the chunk data itself is never read back
+            docs = [d async for d in self.db.file_chunks.aggregate([
+                {'$match': {'transfer_id': transfer_id}}, {'$limit': batch},
+                {'$project': {'size': {'$binarySize': '$data'}}}])]
+            if not docs:
+                return freed
+            with MONGO_LATENCY.time('chunk_delete'):
+                await self.db.file_chunks.delete_many({'_id': {'$in': [d['_id'] for d in docs]}})
+            freed += sum(d.get('size') or 0 for d in docs)
+            if len(docs) < batch:
+                return freed
+
+    async def old_blobs(self, cutoff, after=None, limit=100):
+        if self.bucket is None:
+            return []
+        query = {'uploadDate': {'$lt': datetime.utcfromtimestamp(cutoff)}}
+        if after is not None:
+            query['_id'] = {'$gt': after}
+        return [d['_id'] async for d in self.db.fs.files.find(query, {'_id': 1}).sort('_id', 1).limit(limit)]
+
+    async def delete_blob(self, blob_id):
+        doc = await self.db.fs.files.find_one({'_id': blob_id}, {'length': 1})
+        if doc is None:
+            return 0
+        await self.bucket.delete(blob_id)
+        return doc.get('length', 0)
+
+    async def read_blob(self, blob_id, block=64 * 1024):
+        stream = await self.bucket.open_download_stream(blob_id)
+        try:
+            chunk = await stream.read(block)
+            while chunk:
+                yield chunk
+                chunk = await stream.read(block)
+        finally:
+            await stream.close()
+
+    async def insert_messages(self, docs):
+        with MONGO_LATENCY.time('message_insert_many'):
+            await self.db.messages.insert_many(docs, ordered=False)
+
+    async def message_page(self, conv, before=None, limit=50):
+        query = {'conv': conv}
+        if before is not None:
+            ts, oid = before
+            query['$or'] = [{'ts': {'$lt': ts}}, {'ts': ts, '_id': {'$lt': oid}}]
+        cursor = self.db.messages.find(query).sort([('ts', -1), ('_id', -1)]).limit(limit)
+        with MONGO_LATENCY.time('message_page'):
+            return [d async for d in cursor]
+
+    async def mailbox_load(self, name, after=0):
+        cur = await self.db.mailbox_cursors.find_one({'_id': name})
+        entries = [(doc['seq'], doc['frame'], doc.get('key'),
+                    doc['at'].replace(tzinfo=timezone.utc).timestamp() if doc.get('at') else time.time())
+                   async for doc in self.db.mailbox.find({'to': name, 'seq': {'$gt': after}}).sort('seq', 1)]
+        return cur, entries
+
+    async def mailbox_insert(self, name, seq, frame, key=None, at=None):
+        at = datetime.utcfromtimestamp(at if at is not None else time.time())
+        with MONGO_LATENCY.time('mailbox_insert'):
+            await self.db.mailbox.insert_one({'to': name, 'seq': seq, 'frame': frame, 'key': key, 'at': at})
+
+    async def mailbox_delete(self, name, seq):
+        await self.db.mailbox.delete_one({'to': name, 'seq': seq})
+
+    async def mailbox_delete_through(self, name, seq):
+        with MONGO_LATENCY.time('mailbox_delete'):
+            await self.db.mailbox.delete_many({'to': name, 'seq': {'$lte': seq}})
+
+    async def mailbox_cursor_max(self, name, **fields):
+        await self.db.mailbox_cursors.update_one({'_id': name}, {'$max': fields}, upsert=True)
+
+
+_SAFE_ID = re.compile(r'[A-Za-z0-9_.-]{1,100}')
+
+
+class LocalFileStorage:
+    """Chunks and blobs under root/; every other call goes to `meta` (so this is not a
+    Storage subclass: the interface's stubs would shadow __getattr__)."""
+    def __init__(self, root, meta):
+        self.root = root
+        self.meta = meta
+        self.open = {}           # transfer_id -> (fd, set of chunk indices written)
+        os.makedirs(os.path.join(root, 'partial'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'blobs'), exist_ok=True)
+
+    def __getattr__(self, name):
+        return getattr(self.meta, name)
+
+    async def ensure_indexes(self):
+        await self.meta.ensure_indexes()
+
+    async def close(self):
+        for fd, _ in self.open.values():
+            os.close(fd)
+        self.open.clear()
+        await self.meta.close()
+
+    @staticmethod
+    def _file_id(transfer_id):
+        # transfer ids come from clients: never let one pick a path
+        if _SAFE_ID.fullmatch(transfer_id) and transfer_id.strip('.'):
+            return transfer_id
+        return hashlib.sha256(transfer_id.encode()).hexdigest()
+
+    def _partial(self, transfer_id):
+        return os.path.join(self.root, 'partial', self._file_id(transfer_id))
+
+    async def put_chunk(self, transfer_id, index, data, offset=None, size=None, total=None, chunk_size=None):
+        if offset is None:
+            offset = self._offset(index, len(data), size, total, chunk_size)
+        entry = self.open.get(transfer_id)
+        if entry is None:
+            fd = await asyncio.to_thread(os.open, self._partial(transfer_id), os.O_WRONLY | os.O_CREAT, 0o600)
+            entry = self.open.get(transfer_id)
+            if entry is None:
+                entry = self.open[transfer_id] = (fd, set())
+            else:
+                # another chunk of the same transfer opened it while we waited
+                os.close(fd)
+        fd, seen = entry
+        await asyncio.to_thread(os.pwrite, fd, data, offset)
+        seen.add(index)
+        return len(seen)
+
+    @staticmethod
+    def _offset(index, length, size=None, total=None, chunk_size=None):
+        # FILE_META's chunk_size places any chunk. Without it, every chunk but the last is
+        # full-size, and the short last one ends the file, which FILE_META's size pins down
+        if chunk_size:
+            return index * int(chunk_size)
+        if total and index < int(total) - 1:
+            return index * length
+        if total and size:
+            return int(size) - length
+        raise ValueError(f'no offset for chunk {index} until FILE_META gives the chunk size')
+
+    async def assemble(self, transfer_id, fname):
+        fd, _ = self.open.pop(transfer_id, (None, None))
+        if fd is not None:
+            await asyncio.to_thread(os.close, fd)
+        blob_id = self._file_id(transfer_id)
+        await asyncio.to_thread(os.replace, self._partial(transfer_id), os.path.join(self.root, 'blobs', blob_id))
+        return blob_id
+
+    async def delete_chunks(self, transfer_id, batch=DELETE_BATCH):
+        fd, _ = self.open.pop(transfer_id, (None, None))
+        if fd is not None:
+            await asyncio.to_thread(os.close, fd)
+        try:
+            return await asyncio.to_thread(self._unlink, self._partial(transfer_id))
+        except FileNotFoundError:
+            return 0
+
+    @staticmethod
+    def _unlink(path):
+        freed = os.path.getsize(path)
+        os.unlink(path)
+        return freed
+
+    async def old_blobs(self, cutoff, after=None, limit=100):
+        blobs = os.path.join(self.root, 'blobs')
+        out = []
+        for b in sorted(os.listdir(blobs)):
+            if (after is None or b > after) and os.path.getmtime(os.path.join(blobs, b)) < cutoff:
+                out.append(b)
+                if len(out) >= limit:
+                    break
+        return out
+
+    async def delete_blob(self, blob_id):
+        path = self.blob_path(blob_id)
+        if path is None:
+            return 0
+        return await asyncio.to_thread(self._unlink, path)
+
+    def blob_path(self, blob_id):
+        path = os.path.join(self.root, 'blobs', self._file_id(str(blob_id)))
+        return path if os.path.exists(path) else None
+
+    async def read_blob(self, blob_id, block=64 * 1024):
+        path = self.blob_path(blob_id)
+        if path is None:
+            raise KeyError(blob_id)
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(block)
+                if not chunk:
+                    return
+                yield chunk
+
+
+def open_storage(mongo_url, files_dir=None):
+    if mongo_url.startswith('memory:'):
+        storage = MemoryStorage()
+    else:
+        # Motor is only needed for this backend
+        from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+        client = AsyncIOMotorClient(mongo_url)
+        db = client['chatchat']
+        storage = MongoStorage(client, db, AsyncIOMotorGridFSBucket(db))
+    if files_dir:
+        storage = LocalFileStorage(files_dir, storage)
+    return storage
@@ -16,17 +16,51 @@ import time
 import hashlib
 import os
 import base64
+import uuid
+import random
+import collections
+
+from common.reassembly import Reassembler
+from common.fec import MAX_GROUP, LossMeter, group_size, rebuild, xor_parity
+from backend.integrity import CHECKSUMS, DEFAULT_CHECKSUM, StreamDigest, checksum, checksum_ok
+from common.telemetry import Telemetry
+from backend.flow_control import ALGORITHMS, FlowControl, Pacer, make_congestion_control
 
 HOST = '127.0.0.1'
 PORT = 9009
 
 # --- Hardcoded parameters (easy to change for demos) ---
+# MSS / INIT_CWND / INIT_SSTHRESH / RECV_RWND trade-offs can be measured offline with
+# tools/sim_sweep.py --mss ... --init-cwnd ... --rwnd ... before changing them here
 MSS = 512                      # bytes per segment payload
 INIT_CWND = 1 * MSS            # initial congestion window (bytes)
 INIT_SSTHRESH = 8 * MSS        # slow start threshold
-RETRANSMIT_TIMEOUT = 1.0       # seconds
-RECV_RWND = 32 * MSS           # receiver window advertise
+RETRANSMIT_TIMEOUT = 1.0       # seconds; the RTO until the first RTT sample
+MIN_RTO = 0.2                  # bounds on the RTO derived from SRTT/RTTVAR (RFC 6298)
+MAX_RTO = 60.0
+CC_ALGORITHM = 'newreno'       # reno | newreno | cubic | bbr (see backend/flow_control.py)
+PACING = True                  # space segments with a token bucket instead of bursting the window
+PACING_RATE = None             # bytes/sec; None derives the rate from cwnd/srtt
+MAX_BURST = 4 * MSS            # bytes allowed back to back when tokens have accumulated
+RECV_RWND = 32 * MSS           # initial receive buffer budget (advertised while empty)
+RECV_RWND_MAX = 512 * MSS      # ceiling for receive window auto-tuning
+PERSIST_MAX = 60.0             # max backoff (s) between zero-window probes
+DELAYED_ACK_TIMEOUT = 0.05     # seconds an ACK may be held back waiting for a second segment
+ACK_EVERY = 2                  # ACK at least every N full-sized in-order segments
+RECONNECT_MIN = 0.5            # first reconnect delay (s), doubled per failed attempt
+RECONNECT_MAX = 30.0
+RECV_DIR = '.'                 # where received files (and their .part spill files) go
+FILE_CHUNK_SIZE = MSS * 4      # bytes read and encrypted per file chunk
+CHECKSUM = DEFAULT_CHECKSUM    # per-segment crc + FILE_DIGEST (backend/integrity.py); None turns both off
+FEC = False                    # XOR parity after groups of file segments, sized by measured loss (common/fec.py; --fec)
 MAX_SEQ = 2**31
+MAX_SACK_BLOCKS = 4            # SACK ranges carried per ACK (like the TCP option limit)
+DUP_ACK_THRESH = 3             # dup ACKs (or SACKed segments above a hole) before fast retransmit
+STRIPES = 1                    # connections per file transfer (--stripes); 1 keeps the single-socket path
+STRIPE_MIN_SIZE = 32 * FILE_CHUNK_SIZE   # smaller files go over one connection
+STRIPE_BACKLOG = 2             # chunks queued on a stripe beyond what its window can take
+STRIPE_STALL = 2 * RETRANSMIT_TIMEOUT    # a stripe without ACK progress this long loses its queued chunks
+STRIPE_TICK = 0.005            # seconds between dispatcher passes
 
 # --- helpers: message framing ---
 def send_msg(conn, obj):
@@ -79,147 +113,572 @@ def derive_key_bytes(secret: bytes, length: int):
     return out[:length]
 
 
-def encrypt_bytes(data: bytes, key_secret: bytes):
+def encrypt_bytes(data: bytes, key_secret: bytes, offset: int = 0):
+    # keystream block k is SHA256(key||k) and covers stream bytes [32k, 32k+32), so any
+    # slice of a file can be (de)crypted on its own given its byte offset
     out = bytearray(len(data))
     block_size = 32
-    for i in range(0, len(data), block_size):
-        counter = (i // block_size).to_bytes(8,'big')
+    i = 0
+    while i < len(data):
+        pos = offset + i
+        counter = (pos // block_size).to_bytes(8,'big')
         ks = hashlib.sha256(key_secret + counter).digest()
-        chunk = data[i:i+block_size]
-        for j, b in enumerate(chunk):
-            out[i+j] = b ^ ks[j]
+        skip = pos % block_size
+        n = min(block_size - skip, len(data) - i)
+        x = int.from_bytes(data[i:i+n], 'big') ^ int.from_bytes(ks[skip:skip+n], 'big')
+        out[i:i+n] = x.to_bytes(n, 'big')
+        i += n
     return bytes(out)
 
 
-def decrypt_bytes(data: bytes, key_secret: bytes):
-    return encrypt_bytes(data, key_secret)
+def decrypt_bytes(data: bytes, key_secret: bytes, offset: int = 0):
+    return encrypt_bytes(data, key_secret, offset)
+
+# --- SACK helpers ---
+def sack_blocks(segments, latest=None, limit=MAX_SACK_BLOCKS):
+    """Collapse out-of-order segments {seq: length} into [start, end) ranges.
+    The block holding `latest` (most recently received seq) goes first, as in RFC 2018,
+    so the sender always learns about the newest data even when blocks are truncated."""
+    blocks = []
+    for seq in sorted(segments):
+        end = seq + (segments[seq] or 1)
+        if blocks and seq <= blocks[-1][1]:
+            blocks[-1][1] = max(blocks[-1][1], end)
+        else:
+            blocks.append([seq, end])
+    if latest is not None:
+        for i, (start, end) in enumerate(blocks):
+            if start <= latest < end:
+                blocks.insert(0, blocks.pop(i))
+                break
+    return blocks[:limit]
+
+# --- Streams: each DM, room flow or file transfer has its own sequence space ---
+INTERACTIVE, BULK = 0, 1       # stream priority classes, lower is served first
+DEFAULT_STREAM = 'default'     # ACKs from peers that predate streams
+
+
+def stream_id_for(payload_type, to=None, room=None, meta=None):
+    if payload_type == 'FILE_CHUNK' and meta and meta.get('transfer_id'):
+        return 'file:' + meta['transfer_id']
+    if to:
+        return 'dm:' + to
+    return 'room:' + (room or '')
+
+
+class SendStream:
+    def __init__(self, sid, priority):
+        self.sid = sid
+        self.priority = priority
+        self.next_seq = 1
+        self.send_base = 1
+        self.buffer = {}    # seq -> dict(segment)
+        self.dup_acks = {}  # ack -> count
+        # SACK scoreboard: segments carry 'sacked'/'retx' flags; recovery_point is the
+        # highest seq outstanding when loss recovery started (None when not recovering)
+        self.recovery_point = None
+        self.high_sacked = 0
+        self.acked_time = 0.0  # when the cumulative ACK last advanced: restarts the RTO (RFC 6298 s5.3)
+        self.served = 0     # scheduler stamp: lower goes first within a priority class
+        self.closed = False # no more data will be queued (file fully read)
+        # FEC: first transmissions waiting for their group's parity, the group size picked when
+        # the group opened, [first, end) of groups whose parity went out, and the receiver's
+        # count of segments it rebuilt from parity
+        self.fec_open = []
+        self.fec_k = 0
+        self.fec_groups = collections.deque()
+        self.repaired = 0
+
+    def pipe(self):
+        # bytes in flight: sent, not cumulatively ACKed and not SACKed (RFC 6675 "pipe")
+        return sum(len(seg['payload']) or 1 for seg in self.buffer.values() if seg['sent'] and not seg['sacked'])
+
+    def has_unsent(self):
+        return any(not seg['sent'] and not seg['sacked'] for seg in self.buffer.values())
+
+    def unsent(self):
+        return sum(len(seg['payload']) for seg in self.buffer.values() if not seg['sent'] and not seg['sacked'])
+
+    def fec_cover(self, seq):
+        # end of the parity group holding seq, if its parity has been sent
+        for first, end in self.fec_groups:
+            if first <= seq < end:
+                return end
+        return None
+
+    def update_scoreboard(self, blocks):
+        # mark every buffered segment that lies entirely inside a SACK block
+        count = 0
+        for start, end in blocks:
+            for seq, seg in self.buffer.items():
+                if seg['sacked'] or not seg['sent']:
+                    continue
+                if start <= seq and seq + (len(seg['payload']) or 1) <= end:
+                    seg['sacked'] = True
+                    count += 1
+            self.high_sacked = max(self.high_sacked, end)
+        return count
+
+    def sacked_above(self, seq):
+        return sum(len(seg['payload']) or 1 for s, seg in self.buffer.items() if s > seq and seg['sacked'])
+
+    def mark_holes_lost(self):
+        # every un-SACKed segment below the highest SACKed byte is a hole; retransmit each once
+        for seq in sorted(self.buffer.keys()):
+            if seq >= self.high_sacked:
+                break
+            seg = self.buffer[seq]
+            if seg['sent'] and not seg['sacked'] and not seg['retx']:
+                seg['sent'] = False
 
 # --- Sender side: manages send buffer, cwnd, ssthresh, retransmit, etc. ---
 class Sender:
-    def __init__(self, conn, myname):
+    def __init__(self, conn, myname, cc=CC_ALGORITHM, pacing=PACING, pacing_rate=PACING_RATE, max_burst=MAX_BURST, telemetry=None,
+                 interactive=True, fec=FEC):
         self.conn = conn
         self.myname = myname
-        self.next_seq = 1
-        self.send_base = 1
-        self.buffer = {}    # seq -> dict(segment)
-        self.buffer_lock = threading.Lock()
+        self.telemetry = telemetry   # common.telemetry.Telemetry: per-stream CSV event traces
+        # independent sequence spaces sharing one congestion window
+        self.streams = {}   # stream id -> SendStream
+        self.served = 0
+        self.buffer_lock = threading.RLock()  # re-entered when the RTO timer calls _try_send
 
-        # congestion variables (bytes)
-        self.cwnd = INIT_CWND
-        self.ssthresh = INIT_SSTHRESH
+        # congestion control strategy owns cwnd/ssthresh (bytes)
+        self.cc = make_congestion_control(cc, INIT_CWND, INIT_SSTHRESH, MSS)
+        self.pacer = Pacer(MSS, max_burst, rate=pacing_rate)
+        self.pacer.enabled = pacing
+        self.pace_timer = None
+        self.persist_timer = None
+        self.persist_backoff = RETRANSMIT_TIMEOUT
+        # set by Receiver: returns the pending ACK fields for a peer so data can carry them
+        self.piggyback = None
 
-        self.dup_acks = {}  # ack -> count
         self.timer = None
         self.timer_lock = threading.Lock()
+        self.rttvar = None
+        self.rto = RETRANSMIT_TIMEOUT
+        self.backoff = 1   # doubles per RTO expiry, back to 1 once the ACKs move again
+        self.paused_until = 0.0     # server THROTTLE: no new data before this time
+        self.last_throttle = 0.0
+        self.metas = {}             # transfer_id -> FILE_META frame, resent if the server throttles it
+        # the one cc sees a single sequence space: bytes first sent / cumulatively ACKed over all
+        # streams (each stream's seqs only mean something inside that stream)
+        self.sent_bytes = 0
+        self.delivered = 0
 
         # advertised receiver window (we will assume a default and update on ACKs)
         self.rwnd = RECV_RWND
+        self.stopped = False
+        self.fec = fec
+        self.loss = LossMeter()     # drives the parity group size
 
-        # start thread to listen for local send requests (user input)
-        threading.Thread(target=self._user_input_loop, daemon=True).start()
+        # start thread to listen for local send requests (user input); a stripe's Sender has none
+        if interactive:
+            threading.Thread(target=self._user_input_loop, daemon=True).start()
         # thread to manage retransmit timers
         threading.Thread(target=self._retransmit_manager, daemon=True).start()
 
+    def attach(self, conn):
+        # resumed session on a new socket: stream state is kept, so transfers continue
+        # from send_base; the RTO clock restarts rather than resending the whole window
+        with self.buffer_lock:
+            self.conn = conn
+            now = time.time()
+            for st in self.streams.values():
+                for seg in st.buffer.values():
+                    if seg['sent']:
+                        seg['sent_time'] = now
+            self.persist_backoff = RETRANSMIT_TIMEOUT
+        self._try_send()
+
+    @property
+    def cwnd(self):
+        return int(self.cc.cwnd)
+
+    @property
+    def ssthresh(self):
+        return int(self.cc.ssthresh)
+
     def send_chat_message(self, to=None, room=None, text=''):
         data = text.encode('utf-8')
         self._enqueue_and_try_send(payload_type='MSG', to=to, room=room, payload=data)
 
+    def _stream(self, sid, priority=INTERACTIVE):
+        st = self.streams.get(sid)
+        if st is None:
+            st = self.streams[sid] = SendStream(sid, priority)
+        return st
+
     def _enqueue_and_try_send(self, payload_type, to, room, payload: bytes, meta=None):
+        sid = stream_id_for(payload_type, to, room, meta)
         with self.buffer_lock:
+            st = self._stream(sid, BULK if payload_type == 'FILE_CHUNK' else INTERACTIVE)
             i = 0
             while i < len(payload):
                 seg = payload[i:i+MSS]
-                seq = self.next_seq
-                self.buffer[seq] = {'payload':seg, 'meta':meta, 'type':payload_type, 'to':to, 'room':room, 'sent':False, 'sent_time':None}
-                self.next_seq += len(seg) or 1
+                seq = st.next_seq
+                seg_meta = meta
+                if meta and 'offset' in meta:
+                    # each segment of a file chunk carries its own byte offset
+                    seg_meta = dict(meta, offset=meta['offset'] + i)
+                st.buffer[seq] = {'payload':seg, 'meta':seg_meta, 'type':payload_type, 'to':to, 'room':room, 'sent':False, 'sent_time':None, 'sacked':False, 'retx':False, 'xmits':0,
+                                  'crc': checksum(seg, CHECKSUM) if CHECKSUM else None}
+                st.next_seq += len(seg) or 1
                 i += len(seg)
         self._try_send()
 
+    def take_back(self, sid, from_seq):
+        """Withdraw the segments of stream `sid` from `from_seq` on, so a striped transfer can
+        move them to another connection. Only a tail never put on the wire can go."""
+        with self.buffer_lock:
+            st = self.streams.get(sid)
+            if st is None:
+                return False
+            tail = [seq for seq in st.buffer if seq >= from_seq]
+            if not tail or any(st.buffer[seq]['xmits'] for seq in tail):
+                return False
+            for seq in tail:
+                del st.buffer[seq]
+            st.next_seq = from_seq
+            return True
+
+    def _pipe(self):
+        return sum(st.pipe() for st in self.streams.values())
+
+    def _trace(self, st, event, seq=None, nbytes=None, rtt=None, inflight=None):
+        if self.telemetry is not None:
+            self.telemetry.record(st.sid, event, seq, nbytes, int(self.cc.cwnd), int(self.cc.ssthresh),
+                                  self.cc.srtt, rtt, inflight, self.cc.phase())
+
+    def _schedule(self):
+        # interactive streams first; round robin (least recently served) within a class
+        return sorted((st for st in self.streams.values() if st.has_unsent()), key=lambda st: (st.priority, st.served))
+
     def _try_send(self):
         with self.buffer_lock:
-            outstanding = (self.next_seq - self.send_base)
+            if self.stopped or time.time() < self.paused_until:
+                return
+            outstanding = self._pipe()
             allowed = int(min(self.cwnd, self.rwnd)) - outstanding
+            if self.rwnd <= 0:
+                self._start_persist_timer()
             if allowed <= 0:
                 self._debug_print("Window full — cannot send now. outstanding=%d cwnd=%d rwnd=%d" % (outstanding, self.cwnd, self.rwnd))
+                # the RTO thread exits after each check; a full window must still be timed
+                if outstanding:
+                    self._arm_timer()
                 return
-            seqs = sorted(self.buffer.keys())
-            for seq in seqs:
-                if allowed <= 0:
+            self.pacer.update(self.cc)
+            while allowed > 0:
+                order = self._schedule()
+                if not order:
+                    break
+                st = order[0]
+                # one segment per turn so a bulk stream never holds the window for long
+                seq = min(s for s, seg in st.buffer.items() if not seg['sent'] and not seg['sacked'])
+                seg = st.buffer[seq]
+                to_send = seg['payload']
+                wait = self.pacer.admit(len(to_send) or 1)
+                if wait > 0:
+                    self._schedule_paced_send(wait)
                     break
-                seg = self.buffer[seq]
-                if seg['sent'] is False:
-                    to_send = seg['payload']
-                    msg = {
-                        'type': seg['type'],
-                        'from': self.myname,
-                        'to': seg['to'],
-                        'room': seg['room'],
-                        'seq': seq,
-                        'payload': base64.b64encode(to_send).decode('ascii'),
-                    }
-                    ok = send_msg(self.conn, msg)
-                    if not ok:
-                        return
-                    seg['sent'] = True
-                    seg['sent_time'] = time.time()
-                    self._debug_print(f"SENT seq={seq} len={len(to_send)} cwnd={self.cwnd} ssthresh={self.ssthresh} outstanding={outstanding}")
-                    allowed -= len(to_send)
-            with self.timer_lock:
-                if self.timer is None or not self.timer.is_alive():
-                    self.timer = threading.Thread(target=self._start_timer, daemon=True)
-                    self.timer.start()
+                if not self._transmit(st, seq, seg):
+                    return
+                self.loss.sent()
+                if seg['xmits'] == 1:
+                    if self.fec and st.priority == BULK:
+                        allowed -= self._add_to_parity(st, seq, seg, allowed <= (len(to_send) or 1))
+                else:
+                    self.loss.lost()
+                outstanding += len(to_send) or 1
+                self._trace(st, 'retx' if seg['xmits'] > 1 else 'send', seq, len(to_send), inflight=outstanding)
+                self.served += 1
+                st.served = self.served
+                self._debug_print(f"SENT stream={st.sid} seq={seq} len={len(to_send)} cwnd={self.cwnd} ssthresh={self.ssthresh} outstanding={outstanding}")
+                allowed -= len(to_send) or 1
+            self._arm_timer()
 
-    def _start_timer(self):
-        time.sleep(RETRANSMIT_TIMEOUT)
+    def _arm_timer(self):
+        with self.timer_lock:
+            if self.timer is None or not self.timer.is_alive():
+                self.timer = threading.Thread(target=self._start_timer, daemon=True)
+                self.timer.start()
+
+    def _transmit(self, st, seq, seg):
+        msg = {
+            'type': seg['type'],
+            'from': self.myname,
+            'to': seg['to'],
+            'room': seg['room'],
+            'stream': st.sid,
+            'seq': seq,
+            'payload': base64.b64encode(seg['payload']).decode('ascii'),
+        }
+        if seg['meta']:
+            msg['meta'] = seg['meta']
+        if seg['crc'] is not None:
+            msg['crc'] = seg['crc']
+            if CHECKSUM != 'crc32':
+                msg['crc_alg'] = CHECKSUM
+        if self.cc.srtt:
+            # lets the peer's receive window auto-tuning size itself to our BDP
+            msg['srtt'] = round(self.cc.srtt, 4)
+        if self.piggyback and seg['to']:
+            msg.update(self.piggyback(seg['to']))
+        if not send_msg(self.conn, msg):
+            return False
+        if not seg['xmits']:
+            self.sent_bytes += len(seg['payload']) or 1
+        seg['sent'] = True
+        seg['sent_time'] = time.time()
+        seg['xmits'] += 1
+        if seq < st.high_sacked:
+            seg['retx'] = True
+        return True
+
+    def _add_to_parity(self, st, seq, seg, window_full):
+        # first transmissions of a bulk stream are grouped, and each group is followed by its
+        # parity. A group also closes when the window does or the stream runs dry: otherwise
+        # a small window would wait out an RTO for parity that is never sent. Returns the
+        # bytes sent
+        if not st.fec_open:
+            st.fec_k = group_size(self.loss.rate)
+            if not st.fec_k:
+                return 0
+        st.fec_open.append((seq, seg))
+        if len(st.fec_open) < st.fec_k and not window_full and st.has_unsent():
+            return 0
+        return self._send_parity(st)
+
+    def _send_parity(self, st):
+        group, st.fec_open = st.fec_open, []
+        parity = xor_parity([seg['payload'] for _, seg in group])
+        first = group[0][1]
+        msg = {'type': 'FEC', 'from': self.myname, 'to': first['to'], 'room': first['room'], 'stream': st.sid,
+               'segs': [[seq, len(seg['payload']), (seg['meta'] or {}).get('offset'), seg['crc']] for seq, seg in group],
+               'payload': base64.b64encode(parity).decode('ascii')}
+        if first['meta'] and first['meta'].get('transfer_id'):
+            msg['transfer_id'] = first['meta']['transfer_id']
+        if CHECKSUM and CHECKSUM != 'crc32':
+            msg['crc_alg'] = CHECKSUM
+        if not send_msg(self.conn, msg):
+            return 0
+        last, seg = group[-1]
+        st.fec_groups.append((group[0][0], last + (len(seg['payload']) or 1)))
+        self._trace(st, 'parity', group[0][0], len(parity))
+        return len(parity)
+
+    def _schedule_paced_send(self, delay):
+        # one pending wake-up is enough: _try_send re-evaluates the whole window
+        if self.pace_timer is not None and self.pace_timer.is_alive():
+            return
+        self.pace_timer = threading.Timer(delay, self._try_send)
+        self.pace_timer.daemon = True
+        self.pace_timer.start()
+
+    def _start_persist_timer(self):
+        if self.persist_timer is not None and self.persist_timer.is_alive():
+            return
+        self.persist_timer = threading.Timer(self.persist_backoff, self._window_probe)
+        self.persist_timer.daemon = True
+        self.persist_timer.start()
+
+    def _window_probe(self):
+        # peer advertised a zero window: push one segment past it so the ACK reports
+        # whether space has opened up (the probe is dropped if it has not)
         with self.buffer_lock:
-            if self.send_base >= self.next_seq:
+            if self.rwnd > 0:
+                self.persist_backoff = RETRANSMIT_TIMEOUT
+                return
+            pending = [(st.priority, seq, st) for st in self.streams.values()
+                       for seq, seg in st.buffer.items() if not seg['sacked']]
+            if not pending:
                 return
-            seq = self.send_base
-            if seq not in self.buffer:
+            _, seq, st = min(pending, key=lambda p: (p[0], p[1]))
+            seg = st.buffer[seq]
+            self._debug_print(f"Zero-window probe stream={st.sid} seq={seq} backoff={self.persist_backoff:.1f}s")
+            send_msg(self.conn, {'type': seg['type'], 'from': self.myname, 'to': seg['to'], 'room': seg['room'],
+                                 'stream': st.sid, 'seq': seq, 'meta': seg['meta'],
+                                 'payload': base64.b64encode(seg['payload']).decode('ascii')})
+            self._trace(st, 'probe', seq, len(seg['payload']))
+            self.persist_backoff = min(self.persist_backoff * 2, PERSIST_MAX)
+        self._start_persist_timer()
+
+    def _rtt_sample(self, rtt):
+        # RFC 6298: RTTVAR is the deviation from the SRTT before this sample; the cc keeps SRTT
+        if self.cc.srtt is None or self.rttvar is None:
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.cc.srtt - rtt)
+        self.cc.on_rtt_sample(rtt)
+        if self.cc.srtt:
+            self.rto = min(MAX_RTO, max(MIN_RTO, self.cc.srtt + 4 * self.rttvar))
+
+    def _rto(self):
+        return min(MAX_RTO, self.rto * self.backoff)
+
+    def _heads(self):
+        # (stream, head segment, when its RTO started) for every stream with data in flight
+        return [(st, st.buffer[st.send_base], max(st.buffer[st.send_base]['sent_time'], st.acked_time))
+                for st in self.streams.values()
+                if st.send_base in st.buffer and st.buffer[st.send_base]['sent']]
+
+    def _start_timer(self):
+        with self.buffer_lock:
+            due = [start + self._rto() for _, _, start in self._heads()]
+        time.sleep(max(0.01, min(due) - time.time()) if due else self._rto())
+        with self.buffer_lock:
+            now = time.time()
+            rto = self._rto()
+            timed_out = [(st, seg) for st, seg, start in self._heads() if now - start >= rto]
+            if not timed_out:
                 return
-            print(f"[SENDER] Timeout for seq={seq} -> retransmit and reduce cwnd")
-            self.ssthresh = max(int(self.cwnd // 2), MSS)
-            self.cwnd = MSS
-            self.buffer[seq]['sent'] = False
+            # one window reduction per timer expiry, however many streams stalled
+            self.cc.on_loss('timeout')
+            self.backoff *= 2
+            for st, head in timed_out:
+                print(f"[SENDER] Timeout for stream={st.sid} seq={st.send_base} rto={rto:.2f}s -> retransmit and reduce cwnd")
+                self._trace(st, 'timeout', st.send_base)
+                # only the head is resent, past the window (RFC 6298 s5.4). The rest keep
+                # their SACK state; the ACK for the head is a partial ACK of this recovery,
+                # which resends the holes below the highest SACK once more
+                st.recovery_point = st.next_seq
+                for seg in st.buffer.values():
+                    if not seg['sacked']:
+                        seg['retx'] = False
+                if self._transmit(st, st.send_base, head):
+                    self.loss.sent()
+                    self.loss.lost()
+                    self._trace(st, 'retx', st.send_base, len(head['payload']), inflight=self._pipe())
             self._try_send()
 
     def _retransmit_manager(self):
-        while True:
+        while not self.stopped:
             time.sleep(0.1)
             self._try_send()
 
-    def handle_ack(self, ack, adv_rwnd=None):
+    def close(self):
+        with self.buffer_lock:
+            self.stopped = True
+            self.streams.clear()
+
+    def on_throttle(self, retry_after, why='', frame=None):
+        # the server dropped our frame for exceeding a rate limit: treat it as a congestion
+        # signal (at most one window cut per RTT) and hold off for the hinted time
+        with self.buffer_lock:
+            now = time.time()
+            self.paused_until = max(self.paused_until, now + (retry_after or 0))
+            if now - self.last_throttle > (self.cc.srtt or RETRANSMIT_TIMEOUT):
+                self.cc.on_loss('fast')
+                self.last_throttle = now
+            self._debug_print(f"THROTTLE ({why}) retry_after={retry_after}s cwnd={self.cwnd}")
+            for st in self.streams.values():
+                if st.buffer:
+                    self._trace(st, 'throttle')
+        tid = (frame or {}).get('transfer_id')
+        if (frame or {}).get('dropped') == 'FILE_META' and tid in self.metas:
+            # nothing else would ever deliver the transfer's FILE_META
+            t = threading.Timer(retry_after or 0, self._resend_meta, args=(tid,))
+        else:
+            t = threading.Timer(retry_after or 0, self._try_send)
+        t.daemon = True
+        t.start()
+
+    def _resend_meta(self, tid):
+        with self.buffer_lock:
+            frame = self.metas.get(tid)
+            if frame is not None:
+                send_msg(self.conn, frame)
+
+    def handle_ack(self, ack, adv_rwnd=None, sack=None, stream=None, repaired=None):
+        self._on_ack(ack, adv_rwnd, sack, stream or DEFAULT_STREAM, repaired)
+        # holes marked for retransmission go out now rather than on the next manager tick
+        self._try_send()
+
+    def _on_ack(self, ack, adv_rwnd, sack, sid, repaired=None):
         with self.buffer_lock:
             if adv_rwnd is not None:
+                if adv_rwnd > 0 and self.rwnd <= 0:
+                    self.persist_backoff = RETRANSMIT_TIMEOUT
                 self.rwnd = adv_rwnd
-            if ack > self.send_base:
-                self._debug_print(f"ACK {ack} (new). old send_base={self.send_base}")
-                to_delete = []
-                for seq in list(self.buffer.keys()):
-                    if seq < ack:
-                        to_delete.append(seq)
-                for seq in to_delete:
-                    del self.buffer[seq]
-                self.send_base = ack
-                if self.cwnd < self.ssthresh:
-                    self.cwnd += MSS
-                else:
-                    self.cwnd += max(1, int(MSS * (MSS / max(1,self.cwnd))))
-                self.dup_acks.clear()
+            st = self.streams.get(sid)
+            if st is None:
+                return
+            if repaired is not None and repaired > st.repaired:
+                # lost on the way even though parity saved the retransmission
+                self.loss.lost(repaired - st.repaired)
+                st.repaired = repaired
+            newly_sacked = st.update_scoreboard(sack or [])
+            if ack > st.send_base:
+                self._debug_print(f"ACK {ack} stream={sid} (new). old send_base={st.send_base}")
+                acked_bytes = ack - st.send_base
+                rtt = None
+                for seq in [seq for seq in st.buffer if seq < ack]:
+                    seg = st.buffer.pop(seq)
+                    # Karn: only segments transmitted exactly once give a usable RTT sample, and
+                    # a SACKed one arrived long ago: its ACK only waited for the hole below it
+                    if seg['xmits'] == 1 and seg['sent_time'] and not seg['sacked']:
+                        rtt = time.time() - seg['sent_time']
+                if rtt is not None:
+                    self._rtt_sample(rtt)
+                st.send_base = ack
+                st.acked_time = time.time()
+                self.backoff = 1
+                st.dup_acks.clear()
+                while st.fec_groups and st.fec_groups[0][1] <= ack:
+                    st.fec_groups.popleft()
+                self.delivered += acked_bytes
+                self.cc.on_ack(acked_bytes, ack=self.delivered)
+                self._trace(st, 'ack', ack, acked_bytes, rtt=rtt, inflight=self._pipe())
+                if not st.buffer and st.closed:
+                    # a finished file transfer's sequence space is never reused
+                    del self.streams[sid]
+                    if sid.startswith('file:'):
+                        self.metas.pop(sid[len('file:'):], None)
+                    if self.telemetry is not None:
+                        self.telemetry.finish(sid)
+                if st.recovery_point is not None:
+                    if ack >= st.recovery_point:
+                        st.recovery_point = None
+                        self._debug_print(f"Recovery complete: cwnd={self.cwnd} ssthresh={self.ssthresh}")
+                    else:
+                        # partial ACK: the next hole is lost too, repair it without waiting for RTO
+                        st.mark_holes_lost()
+                    return
                 self._debug_print(f"After ACK: cwnd={self.cwnd} ssthresh={self.ssthresh}")
-            elif ack == self.send_base:
-                self.dup_acks[ack] = self.dup_acks.get(ack, 0) + 1
-                cnt = self.dup_acks[ack]
-                self._debug_print(f"Duplicate ACK {ack} (count {cnt})")
-                if cnt >= 3:
-                    self.ssthresh = max(int(self.cwnd // 2), MSS)
-                    self.cwnd = self.ssthresh + 3*MSS
-                    if self.send_base in self.buffer:
-                        self.buffer[self.send_base]['sent'] = False
-                    self._debug_print(f"Fast retransmit triggered: cwnd={self.cwnd} ssthresh={self.ssthresh}")
+            elif ack == st.send_base and st.buffer:
+                st.dup_acks[ack] = st.dup_acks.get(ack, 0) + 1
+                cnt = st.dup_acks[ack]
+                self._debug_print(f"Duplicate ACK {ack} stream={sid} (count {cnt}) sacked+={newly_sacked}")
+                self._trace(st, 'dupack', ack)
+                if st.recovery_point is not None:
+                    # already recovering: new SACK info may expose further holes
+                    self.cc.on_dup_ack(cnt, self.sent_bytes)
+                    st.mark_holes_lost()
+                    return
+                if st.sacked_above(st.send_base) >= DUP_ACK_THRESH * MSS:
+                    cnt = max(cnt, DUP_ACK_THRESH)
+                if st.fec_open and st.fec_open[0][0] <= st.send_base:
+                    # the hole is in a group still filling up: send its parity now
+                    self._send_parity(st)
+                end = st.fec_cover(st.send_base)
+                if end is not None and st.sacked_above(end - 1) < DUP_ACK_THRESH * MSS:
+                    # the group's parity lets the receiver rebuild this hole; only SACKs for
+                    # data sent after it show that it could not
+                    cnt = min(cnt, DUP_ACK_THRESH - 1)
+                # fast retransmit is decided per stream. The shared window is cut once per
+                # episode: a cc already recovering for another stream returns False (and only
+                # counts the dup ACK), yet this stream's hole still goes out now
+                if self.cc.on_dup_ack(cnt, self.sent_bytes) or (cnt >= DUP_ACK_THRESH and self.cc.in_recovery):
+                    st.recovery_point = st.next_seq
+                    if st.send_base in st.buffer:
+                        st.buffer[st.send_base]['sent'] = False
+                    st.mark_holes_lost()
+                    self._trace(st, 'fast', st.send_base)
+                    self._debug_print(f"Fast retransmit (SACK recovery to {st.recovery_point}, stream={sid}, {self.cc.name}): cwnd={self.cwnd} ssthresh={self.ssthresh}")
 
     def _user_input_loop(self):
-        print("Commands:\n  /msg <user> <text>\n  /room <room> <text>\n  /join <room>\n  /leave\n  /sendfile <user|room> <file_path>\n  /quit\n")
+        print("Commands:\n  /msg <user> <text>\n  /room <room> <text>\n  /join <room>\n  /leave\n  /sendfile <user|room> <file_path>\n  /stats\n  /quit\n")
         while True:
             try:
                 line = input('> ')
@@ -248,44 +707,113 @@ class Sender:
                 else:
                     to = target; room = None
                 self.send_file(path, to=to, room=room)
+            elif cmd == '/stats':
+                print(f"[SENDER] cc={self.cc.name} cwnd={self.cwnd} ssthresh={self.ssthresh} srtt={self.cc.srtt} pacing={self.pacer.stats()}")
+                with self.buffer_lock:
+                    for st in self.streams.values():
+                        print(f"  stream={st.sid} prio={st.priority} queued={len(st.buffer)} in_flight={st.pipe()}")
             elif cmd == '/quit':
                 print("Quitting...")
                 os._exit(0)
             else:
                 print("Unknown or malformed command.")
 
-    def send_file(self, path, to=None, room=None):
+    def send_file(self, path, to=None, room=None, stripes=None):
         if not os.path.exists(path):
             print("No such file:", path); return
         filesize = os.path.getsize(path)
         fname = os.path.basename(path)
         key_secret = os.urandom(32)
-        meta = {'fname':fname, 'size':filesize, 'key': base64.b64encode(key_secret).decode('ascii')}
-        send_msg(self.conn, {'type':'FILE_META','from':self.myname,'to':to,'room':room,'meta':meta})
-        print(f"[SENDER] Sending encrypted file '{fname}' size={filesize} bytes")
+        transfer_id = uuid.uuid4().hex
+        meta = {'transfer_id':transfer_id, 'fname':fname, 'size':filesize, 'key': base64.b64encode(key_secret).decode('ascii')}
+        if CHECKSUM:
+            meta['checksum'] = CHECKSUM   # a FILE_DIGEST with the Merkle root follows the chunks
+        stripes = STRIPES if stripes is None else stripes
+        if stripes > 1 and filesize >= STRIPE_MIN_SIZE:
+            meta['stripes'] = stripes
+        frame = self.metas[transfer_id] = {'type':'FILE_META','from':self.myname,'to':to,'room':room,'meta':meta}
+        send_msg(self.conn, frame)
+        print(f"[SENDER] Sending encrypted file '{fname}' size={filesize} bytes id={transfer_id}")
+        if 'stripes' in meta:
+            return StripedTransfer(self, path, to, room, meta, key_secret).start()
+        # leaves over the ciphertext: that is what the receiver holds before it decrypts
+        digest = StreamDigest(FILE_CHUNK_SIZE, CHECKSUM) if CHECKSUM else None
         with open(path,'rb') as f:
             counter = 0
+            offset = 0
             while True:
-                chunk = f.read(MSS * 4)
+                chunk = f.read(FILE_CHUNK_SIZE)
                 if not chunk: break
-                enc = encrypt_bytes(chunk, key_secret)
-                self._enqueue_and_try_send(payload_type='FILE_CHUNK', to=to, room=room, payload=enc, meta={'chunk_id':counter})
+                enc = encrypt_bytes(chunk, key_secret, offset)
+                if digest is not None:
+                    digest.update(enc)
+                self._enqueue_and_try_send(payload_type='FILE_CHUNK', to=to, room=room, payload=enc,
+                                           meta={'transfer_id':transfer_id, 'chunk_id':counter, 'offset':offset})
                 counter += 1
+                offset += len(chunk)
+        self.close_file(transfer_id)
+        if digest is not None:
+            self.send_digest(transfer_id, digest, to, room)
         print("[SENDER] File queued for send.")
 
+    def close_file(self, transfer_id):
+        with self.buffer_lock:
+            st = self.streams.get('file:' + transfer_id)
+            if st is not None:
+                st.closed = True
+                if not st.buffer:
+                    del self.streams[st.sid]
+
+    def send_digest(self, transfer_id, digest, to=None, room=None):
+        # under the buffer lock so it can't interleave with a segment being written
+        with self.buffer_lock:
+            send_msg(self.conn, {'type':'FILE_DIGEST','from':self.myname,'to':to,'room':room,
+                                 'transfer_id':transfer_id,'digest':digest.digest()})
+
     def _debug_print(self, s):
         print(f"[SENDER-{self.myname}] {s}")
 
 # --- Receiver: processes incoming app segments and sends ACKs (advertises rwnd) ---
+class RecvStream:
+    def __init__(self):
+        self.expected_seq = 1
+        self.buffer = {}  # out-of-order seq -> (payload, type, meta)
+        self.recent = {}  # seq -> payload of the last file segments delivered, for parity repair
+        self.parity = {}  # first seq -> FEC frame of a group still missing more than one segment
+        self.repaired = 0 # segments rebuilt from parity, reported back in ACKs
+
+    def sack(self, latest=None):
+        return sack_blocks({s: len(v[0]) for s, v in self.buffer.items()}, latest=latest)
+
+    def keep(self, seq, payload):
+        self.recent[seq] = payload
+        if len(self.recent) > 2 * MAX_GROUP:
+            del self.recent[next(iter(self.recent))]
+
+    def held(self, seq):
+        if seq in self.buffer:
+            return self.buffer[seq][0]
+        return self.recent.get(seq)
+
+
 class Receiver:
     def __init__(self, conn, myname, sender: Sender):
         self.conn = conn
         self.myname = myname
-        self.expected_seq = 1
-        self.buffer = {}  # out-of-order seq -> payload
+        # (peer, stream id) -> RecvStream; one receive buffer budget shared by all streams
+        self.streams = {}
         self.lock = threading.Lock()
         self.sender = sender  # to send ACKs back to server
-        self.files = {}
+        # file chunks go straight to disk at their offset, keyed by transfer id
+        self.reassembly = Reassembler(RECV_DIR)
+        self.flow = FlowControl(RECV_RWND, max_window=RECV_RWND_MAX)
+        # recently written transfers: a striped sender's second copy of a chunk can land after the file is done
+        self.finished = collections.deque(maxlen=64)
+        # delayed ACK state: (peer, stream) -> in-order segments received since our last ACK
+        self.unacked = {}
+        self.ack_timers = {}
+        if sender is not None:
+            sender.piggyback = self.take_pending_ack
 
     def process_segment(self, msg):
         seq = msg.get('seq')
@@ -293,87 +821,490 @@ class Receiver:
         payload = base64.b64decode(payload_b64)
         ty = msg.get('type')
         frm = msg.get('from')
+        key = (frm, msg.get('stream') or DEFAULT_STREAM)
+        if checksum_ok(payload, msg.get('crc'), msg.get('crc_alg')) is False:
+            # damaged in transit: drop it like a loss; the ACK's SACK blocks leave just this hole
+            print(f"[RECV-{self.myname}] DROP seq={seq}: checksum mismatch")
+            with self.lock:
+                self._send_ack(key, latest=seq)
+            return
         with self.lock:
-            if seq == self.expected_seq:
-                self._deliver_payload(ty, frm, payload, msg.get('meta'))
-                self.expected_seq += len(payload) or 1
-                while self.expected_seq in self.buffer:
-                    p, t, fmeta = self.buffer.pop(self.expected_seq)
-                    self._deliver_payload(t, frm, p, fmeta)
-                    self.expected_seq += len(p) or 1
-            elif seq > self.expected_seq:
-                self.buffer[seq] = (payload, ty, msg.get('meta'))
-                print(f"[RECV-{self.myname}] OUT-OF-ORDER seq={seq} expected={self.expected_seq}")
+            st = self.streams.get(key)
+            if st is None:
+                st = self.streams[key] = RecvStream()
+            if msg.get('srtt'):
+                self.flow.rtt = msg['srtt']
+            immediate = self._accept(st, key, seq, ty, payload, msg.get('meta'))
+            if st.parity:
+                # this segment may leave a group short of only one, which its parity can rebuild
+                self._repair(st, key)
+            if len(payload) >= MSS:
+                self.unacked[key] = self.unacked.get(key, 0) + 1
+            if immediate or self.unacked.get(key, 0) >= ACK_EVERY:
+                self._send_ack(key, latest=seq)
             else:
-                print(f"[RECV-{self.myname}] DUP/OLD seq={seq} < expected={self.expected_seq}")
-            ack_msg = {'type':'ACK','from':self.myname,'ack':self.expected_seq,'rwnd':RECV_RWND}
-            send_msg(self.conn, ack_msg)
-            try:
-                self.sender.handle_ack(self.expected_seq, adv_rwnd=RECV_RWND)
-            except Exception:
+                self._arm_ack_timer(key)
+
+    def _accept(self, st, key, seq, ty, payload, meta):
+        # deliver or buffer one segment; True when its ACK should go out at once
+        frm = key[0]
+        immediate = bool(st.buffer)   # filling a hole must be reported at once
+        # a segment filling the hole always gets in: it drains the out-of-order data holding the budget
+        if seq == st.expected_seq and ty == 'FILE_CHUNK' and not st.buffer and not self.flow.fits(len(payload)):
+            print(f"[RECV-{self.myname}] DROP seq={seq}: receive buffer full ({self.flow.used} bytes held)")
+            immediate = True
+        elif seq == st.expected_seq:
+            self._deliver_payload(ty, frm, payload, meta)
+            if ty == 'FILE_CHUNK':
+                st.keep(seq, payload)
+            st.expected_seq += len(payload) or 1
+            while st.expected_seq in st.buffer:
+                p, t, fmeta = st.buffer.pop(st.expected_seq)
+                self.flow.release(len(p))
+                self._deliver_payload(t, frm, p, fmeta)
+                if t == 'FILE_CHUNK':
+                    st.keep(st.expected_seq, p)
+                st.expected_seq += len(p) or 1
+        elif seq > st.expected_seq:
+            immediate = True
+            if seq in st.buffer:
                 pass
+            elif not self.flow.fits(len(payload)):
+                # beyond the buffer budget (e.g. a zero-window probe): drop, the ACK tells why
+                print(f"[RECV-{self.myname}] DROP seq={seq}: receive buffer full ({self.flow.used} bytes held)")
+            else:
+                st.buffer[seq] = (payload, ty, meta)
+                self.flow.hold(len(payload))
+                print(f"[RECV-{self.myname}] OUT-OF-ORDER stream={key[1]} seq={seq} expected={st.expected_seq}")
+        else:
+            print(f"[RECV-{self.myname}] DUP/OLD stream={key[1]} seq={seq} < expected={st.expected_seq}")
+            immediate = True
+        return immediate
+
+    def on_parity(self, msg):
+        # FEC frame: the XOR of a group of segments just sent on one stream (common/fec.py)
+        key = (msg.get('from'), msg.get('stream') or DEFAULT_STREAM)
+        with self.lock:
+            st = self.streams.get(key)
+            if st is None:
+                st = self.streams[key] = RecvStream()
+            segs = msg.get('segs') or []
+            if not segs:
+                return
+            st.parity[segs[0][0]] = msg
+            if len(st.parity) > 2 * MAX_GROUP:
+                del st.parity[min(st.parity)]
+            self._repair(st, key)
+
+    def _repair(self, st, key):
+        for first, msg in list(st.parity.items()):
+            missing = [s for s in msg['segs'] if s[0] >= st.expected_seq and s[0] not in st.buffer]
+            if len(missing) > 1:
+                continue   # a retransmission may bring it down to one
+            del st.parity[first]
+            if not missing:
+                continue
+            seq, length, offset, crc = missing[0]
+            others = [st.held(s[0]) for s in msg['segs'] if s[0] != seq]
+            if any(p is None for p in others):
+                continue   # a member is no longer kept: the hole is left to retransmission
+            payload = rebuild(base64.b64decode(msg.get('payload') or ''), others, length)
+            if checksum_ok(payload, crc, msg.get('crc_alg')) is False:
+                continue
+            meta = {'transfer_id': msg['transfer_id'], 'offset': offset} if msg.get('transfer_id') else None
+            st.repaired += 1
+            print(f"[RECV-{self.myname}] REPAIRED stream={key[1]} seq={seq} from parity")
+            self._accept(st, key, seq, 'FILE_CHUNK', payload, meta)
+            self._send_ack(key, latest=seq)
+
+    def _arm_ack_timer(self, key):
+        t = self.ack_timers.get(key)
+        if t is not None and t.is_alive():
+            return
+        t = threading.Timer(DELAYED_ACK_TIMEOUT, self._ack_timeout, args=(key,))
+        t.daemon = True
+        self.ack_timers[key] = t
+        t.start()
+
+    def _ack_timeout(self, key):
+        with self.lock:
+            if key in self.ack_timers:
+                self._send_ack(key)
+
+    def take_pending_ack(self, peer):
+        """Fields to piggyback on a data frame to `peer`; cancels the delayed ACK they replace."""
+        with self.lock:
+            pending = [k for k in list(self.ack_timers) + list(self.unacked) if k[0] == peer]
+            if not pending or pending[0] not in self.streams:
+                return {}
+            key = pending[0]
+            self._clear_pending(key)
+            st = self.streams[key]
+            fields = {'ack': st.expected_seq, 'ack_stream': key[1], 'rwnd': self.flow.advertise()}
+            sack = st.sack()
+            if sack:
+                fields['sack'] = sack
+            if st.repaired:
+                fields['repaired'] = st.repaired
+            return fields
+
+    def _clear_pending(self, key):
+        self.unacked.pop(key, None)
+        t = self.ack_timers.pop(key, None)
+        if t is not None:
+            t.cancel()
+
+    def _send_ack(self, key, latest=None):
+        self._clear_pending(key)
+        st = self.streams.get(key)
+        if st is None:
+            return
+        ack_msg = {'type':'ACK','from':self.myname,'to':key[0],'stream':key[1],'ack':st.expected_seq,'rwnd':self.flow.advertise()}
+        sack = st.sack(latest)
+        if sack:
+            ack_msg['sack'] = sack
+        if st.repaired:
+            ack_msg['repaired'] = st.repaired
+        send_msg(self.conn, ack_msg)
 
     def _deliver_payload(self, ty, frm, payload, meta):
         if ty == 'MSG':
             text = payload.decode('utf-8', errors='replace')
             print(f"[RECV-{self.myname}] MSG from={frm}: {text}")
+            self.flow.consumed(len(payload))
         elif ty == 'FILE_CHUNK':
-            fid = frm
-            rec = self.files.setdefault(fid, {'chunks':[], 'meta':None})
-            rec['chunks'].append(payload)
-            print(f"[RECV-{self.myname}] Received file chunk len={len(payload)} from={frm}")
+            meta = meta or {}
+            # senders that predate transfer ids: one file per peer, chunks appended in order
+            tid = meta.get('transfer_id') or f'legacy-{frm}'
+            if tid in self.finished:
+                self.flow.consumed(len(payload))
+                return
+            t = self.reassembly.get(tid)
+            offset = meta.get('offset', t.received)
+            t.write(offset, payload)
+            self.flow.consumed(len(payload))
+            print(f"[RECV-{self.myname}] Received file chunk len={len(payload)} off={offset} id={tid} from={frm}")
+            self._maybe_finish(tid)
         elif ty == 'FILE_META':
             metaobj = meta
             print(f"[RECV-{self.myname}] FILE_META: {metaobj}")
         else:
             print(f"[RECV-{self.myname}] Unknown payload type {ty}")
 
+    def on_file_meta(self, frm, meta):
+        tid = meta.get('transfer_id') or f'legacy-{frm}'
+        with self.lock:
+            if tid in self.finished:
+                return   # a resent FILE_META for a file already written
+            t = self.reassembly.get(tid, size=meta.get('size'))
+            t.meta = dict(meta, sender=frm)
+            self._maybe_finish(tid)
+
+    def on_file_digest(self, frm, tid, digest):
+        # the sender's Merkle root, sent once it has read the whole file; checked at finalize
+        with self.lock:
+            if tid in self.finished:
+                return
+            t = self.reassembly.get(tid)
+            t.digest = digest
+            self._maybe_finish(tid)
+
+    def _maybe_finish(self, tid):
+        t = self.reassembly.transfers.get(tid)
+        if t is None or t.meta is None or not t.complete():
+            return
+        if t.meta.get('checksum') and t.digest is None:
+            return   # FILE_META promised a FILE_DIGEST: wait for it
+        self.reassembly.pop(tid)
+        self.finished.append(tid)
+        key = base64.b64decode(t.meta.get('key') or '')
+        fname = os.path.join(RECV_DIR, f"recv_from_{t.meta['sender']}_" + os.path.basename(t.meta.get('fname') or tid))
+        expected = t.digest
+        check = None
+        if expected and expected.get('alg') in CHECKSUMS:
+            # hash the ciphertext in the same pass that decrypts it
+            seen = StreamDigest(expected.get('chunk_size') or FILE_CHUNK_SIZE, expected['alg'])
+
+            def transform(block, off):
+                seen.update(block)
+                return decrypt_bytes(block, key, off)
+            check = lambda: seen.digest()['root'] == expected.get('root')
+        else:
+            transform = lambda block, off: decrypt_bytes(block, key, off)
+        # decrypt block by block in place: memory stays at one block regardless of file size
+        fname = t.finalize(fname, transform=transform, check=check)
+        if check is None:
+            print(f"[CLIENT] Wrote decrypted file to {fname} (size {t.size})")
+        elif fname.endswith('.corrupt'):
+            print(f"[CLIENT] Digest mismatch: kept {fname} (size {t.size}) but it does not match what was sent")
+        else:
+            print(f"[CLIENT] Wrote decrypted file to {fname} (size {t.size}, digest verified)")
+
+# --- Striped transfers: one file over several connections ---
+class Stripe:
+    """One connection of a striped transfer: a Sender with its own congestion window, plus the
+    chunks handed to it as (chunk id, first seq, end seq) in the order they were queued."""
+    def __init__(self, sender, sock=None):
+        self.sender = sender
+        self.sock = sock           # None for the client's own connection, which stays open
+        self.assigned = collections.deque()
+        self.base = 0
+        self.progress = time.time()
+        self.avoid = False         # had its chunks stolen; gets no more until it makes progress
+        self.chunks = 0
+
+    @classmethod
+    def connect(cls, name, primary):
+        sock, resp = connect_session(name, {'token': None, 'last_seq': 0})
+        if sock is None:
+            raise ConnectionError((resp or {}).get('why', 'no CONNECTED'))
+        sender = Sender(sock, name, cc=primary.cc.name, pacing=primary.pacer.enabled, interactive=False, fec=primary.fec)
+        stripe = cls(sender, sock)
+        threading.Thread(target=stripe._recv_loop, daemon=True).start()
+        return stripe
+
+    def _recv_loop(self):
+        # a stripe only ever carries file chunks out, so ACKs and THROTTLEs are all it reads
+        while True:
+            m = recv_msg(self.sock)
+            if m is None:
+                return
+            if m.get('type') == 'ACK':
+                self.sender.handle_ack(m.get('ack', 0), adv_rwnd=m.get('rwnd'), sack=m.get('sack'), stream=m.get('stream'),
+                                       repaired=m.get('repaired'))
+            elif m.get('type') == 'THROTTLE':
+                self.sender.on_throttle(m.get('retry_after', RETRANSMIT_TIMEOUT), m.get('why'), m)
+
+    def unsent(self, sid):
+        with self.sender.buffer_lock:
+            st = self.sender.streams.get(sid)
+            return st.unsent() if st is not None else 0
+
+    def close(self):
+        if self.sock is None:
+            return
+        self.sender.close()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class StripedTransfer:
+    """Sends one file over the client's connection plus STRIPES-1 extra ones (named
+    `<name>~<k>`), each with its own Sender and congestion window, so a high-BDP path is
+    not limited to what one window can keep in flight. Chunks are handed out one at a time
+    to whichever stripe has drained its queue, so faster stripes carry more of the file. A
+    stripe that makes no ACK progress for STRIPE_STALL has its never-sent chunks taken back
+    and its in-flight ones queued again on the others; whichever copy lands first is kept.
+    Every chunk keeps the transfer id and byte offset, so the receiver writes it into the same
+    Reassembler transfer whichever connection it came on."""
+    def __init__(self, sender, path, to, room, meta, key_secret):
+        self.primary = sender
+        self.path = path
+        self.to = to
+        self.room = room
+        self.meta = meta
+        self.key_secret = key_secret
+        self.tid = meta['transfer_id']
+        self.sid = 'file:' + self.tid
+        self.total = (meta['size'] + FILE_CHUNK_SIZE - 1) // FILE_CHUNK_SIZE
+        self.digest = StreamDigest(FILE_CHUNK_SIZE, CHECKSUM) if CHECKSUM else None
+        self.fresh = 0             # next chunk never handed out
+        self.pending = collections.deque()   # chunks to hand out again (stolen or hedged)
+        self.hedged = set()
+        self.done = set()
+        self.stripes = []
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+
+    def run(self):
+        self.stripes = [Stripe(self.primary)]
+        for k in range(1, self.meta['stripes']):
+            try:
+                self.stripes.append(Stripe.connect(f'{self.primary.myname}~{k}', self.primary))
+            except (OSError, ConnectionError) as e:
+                print(f"[SENDER] stripe {k} not opened ({e}); continuing with {len(self.stripes)}")
+                break
+        t0 = time.time()
+        try:
+            with open(self.path, 'rb') as f:
+                while len(self.done) < self.total:
+                    now = time.time()
+                    for s in self.stripes:
+                        self._collect(s, now)
+                        if s.assigned and not s.avoid and len(self.stripes) > 1 and now - s.progress > STRIPE_STALL:
+                            self._steal(s, now)
+                    for s in sorted(self.stripes, key=lambda s: s.unsent(self.sid)):
+                        if not s.avoid:
+                            self._fill(s, f)
+                    time.sleep(STRIPE_TICK)
+        finally:
+            for s in self.stripes:
+                s.close()
+            self.primary.close_file(self.tid)
+        print(f"[SENDER] File sent over {len(self.stripes)} stripes in {time.time() - t0:.2f}s, "
+              f"chunks per stripe {[s.chunks for s in self.stripes]}")
+
+    def _collect(self, s, now):
+        # chunks wholly below the stripe's cumulative ACK have been delivered
+        with s.sender.buffer_lock:
+            st = s.sender.streams.get(self.sid)
+            if st is None:
+                return   # nothing handed to this stripe yet
+            base = st.send_base
+        if base > s.base:
+            s.base = base
+            s.progress = now
+            s.avoid = False
+        while s.assigned and s.assigned[0][2] <= s.base:
+            self.done.add(s.assigned.popleft()[0])
+        if not s.assigned:
+            s.progress = now
+
+    def _steal(self, s, now):
+        stolen = []
+        with s.sender.buffer_lock:
+            while s.assigned and s.sender.take_back(self.sid, s.assigned[-1][1]):
+                stolen.append(s.assigned.pop()[0])
+            hedge = [cid for cid, _, _ in s.assigned if cid not in self.hedged]
+        self.hedged.update(hedge)
+        # oldest first: the in-flight chunks hold up the end of the file the longest
+        self.pending.extendleft(stolen)
+        self.pending.extendleft(reversed(hedge))
+        s.avoid = True
+        s.progress = now
+        print(f"[SENDER] stripe {s.sender.myname} stalled: {len(stolen)} chunks moved, {len(hedge)} re-sent elsewhere")
+
+    def _fill(self, s, f):
+        limit = max(STRIPE_BACKLOG * FILE_CHUNK_SIZE, min(s.sender.cwnd, s.sender.rwnd))
+        while s.unsent(self.sid) < limit:
+            cid = self._next_chunk()
+            if cid is None:
+                return
+            offset = cid * FILE_CHUNK_SIZE
+            f.seek(offset)
+            enc = encrypt_bytes(f.read(FILE_CHUNK_SIZE), self.key_secret, offset)
+            if cid == self.fresh:
+                self.fresh += 1
+                if self.digest is not None:
+                    self.digest.update(enc)
+                    if self.fresh == self.total:
+                        self.primary.send_digest(self.tid, self.digest, self.to, self.room)
+            with s.sender.buffer_lock:
+                first = s.sender._stream(self.sid, BULK).next_seq
+                s.sender._enqueue_and_try_send(payload_type='FILE_CHUNK', to=self.to, room=self.room, payload=enc,
+                                               meta={'transfer_id':self.tid, 'chunk_id':cid, 'offset':offset})
+                s.assigned.append((cid, first, s.sender.streams[self.sid].next_seq))
+            s.chunks += 1
+
+    def _next_chunk(self):
+        while self.pending:
+            cid = self.pending.popleft()
+            if cid not in self.done:
+                return cid
+        if self.fresh < self.total:
+            return self.fresh
+        return None
+
 # --- Main client logic: connects, spawns handler threads ---
-def run_client(name):
+def connect_session(name, session):
+    # CONNECT carries the session token and last seen server seq when resuming
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     sock.connect((HOST, PORT))
-    send_msg(sock, {'type':'CONNECT','from':name})
+    hello = {'type':'CONNECT','from':name}
+    if session.get('token'):
+        hello.update(session=session['token'], last_seq=session['last_seq'])
+    send_msg(sock, hello)
     resp = recv_msg(sock)
-    if resp and resp.get('type') == 'CONNECTED':
-        print(f"Connected as {name}")
-    else:
+    if not resp or resp.get('type') != 'CONNECTED':
+        sock.close()
+        return None, resp
+    if not resp.get('resumed'):
+        session['last_seq'] = 0   # new session: the server's seq starts over
+    elif resp.get('gap'):
+        print("[CLIENT] resumed, but some frames were lost while disconnected")
+    session['token'] = resp.get('session')
+    return sock, resp
+
+
+def run_client(name, cc=CC_ALGORITHM, pacing=PACING, pacing_rate=PACING_RATE, max_burst=MAX_BURST, trace_dir=None, fec=FEC):
+    session = {'token': None, 'last_seq': 0}
+    sock, resp = connect_session(name, session)
+    if sock is None:
         print("Failed to connect:", resp); return
+    print(f"Connected as {name}")
 
-    sender = Sender(sock, name)
+    telemetry = Telemetry(trace_dir, header={'who': name, 'cc': cc, 'mss': MSS}) if trace_dir else None
+    sender = Sender(sock, name, cc=cc, pacing=pacing, pacing_rate=pacing_rate, max_burst=max_burst, telemetry=telemetry, fec=fec)
     receiver = Receiver(sock, name, sender)
 
+    def reconnect():
+        # exponential backoff with jitter so many clients don't stampede a restarted server
+        attempt = 0
+        while True:
+            delay = min(RECONNECT_MAX, RECONNECT_MIN * 2 ** attempt) * random.uniform(0.5, 1.0)
+            print(f"[CLIENT] connection lost, reconnecting in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+            try:
+                new_sock, resp = connect_session(name, session)
+            except OSError:
+                continue
+            if new_sock is None:
+                if resp and resp.get('why') == 'name taken':
+                    print("Name taken; giving up")
+                    os._exit(0)
+                continue
+            receiver.conn = new_sock
+            sender.attach(new_sock)
+            print(f"[CLIENT] {'resumed session' if resp.get('resumed') else 'reconnected with a new session'}")
+            return new_sock
+
     def recv_loop():
+        nonlocal sock
         while True:
             m = recv_msg(sock)
             if m is None:
-                print("Server closed or bad message")
-                os._exit(0)
+                sock = reconnect()
+                continue
+            seq = m.get('sseq')
+            if seq is not None:
+                # server-stamped session seq: frames a resume replayed twice are dropped
+                if seq <= session['last_seq']:
+                    continue
+                session['last_seq'] = seq
             mtype = m.get('type')
             if mtype in ('MSG','FILE_CHUNK'):
+                if 'ack' in m:
+                    # cumulative ACK piggybacked on the peer's data
+                    sender.handle_ack(m['ack'], adv_rwnd=m.get('rwnd'), sack=m.get('sack'), stream=m.get('ack_stream'),
+                                      repaired=m.get('repaired'))
                 receiver.process_segment(m)
             elif mtype == 'FILE_META':
-                meta = m.get('meta')
-                frm = m.get('from')
-                key_b64 = meta.get('key')
-                key = base64.b64decode(key_b64)
-                fname = f"recv_from_{frm}_" + meta.get('fname')
-                rec = receiver.files.get(frm)
-                if not rec:
-                    rec = {'chunks':[], 'meta':None}
-                rec['meta'] = meta
-                enc = b''.join(rec['chunks'])
-                dec = decrypt_bytes(enc, key)
-                with open(fname, 'wb') as fout:
-                    fout.write(dec)
-                print(f"[CLIENT] Wrote decrypted file to {fname} (size {len(dec)})")
-                receiver.files.pop(frm, None)
+                receiver.on_file_meta(m.get('from'), m.get('meta') or {})
+            elif mtype == 'FILE_DIGEST':
+                receiver.on_file_digest(m.get('from'), m.get('transfer_id'), m.get('digest') or {})
+            elif mtype == 'FEC':
+                receiver.on_parity(m)
             elif mtype == 'ACK':
-                # server-echoed ACKs could arrive; but receiver also notifies sender locally
-                pass
+                # ACKs (with optional SACK ranges) from the peer's Receiver drive our Sender
+                sender.handle_ack(m.get('ack', 0), adv_rwnd=m.get('rwnd'), sack=m.get('sack'), stream=m.get('stream'),
+                                  repaired=m.get('repaired'))
             elif mtype == 'JOINED':
                 print(f"Joined room {m.get('room')}")
             elif mtype == 'LEFT':
                 print(f"Left room {m.get('room')}")
+            elif mtype == 'THROTTLE':
+                sender.on_throttle(m.get('retry_after', RETRANSMIT_TIMEOUT), m.get('why'), m)
             elif mtype == 'ERROR':
                 print("Error from server:", m.get('why'))
             else:
@@ -388,5 +1319,14 @@ def run_client(name):
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--name', required=True)
+    parser.add_argument('--cc', default=CC_ALGORITHM, choices=sorted(ALGORITHMS), help='congestion control algorithm')
+    parser.add_argument('--no-pacing', action='store_true', help='send the whole window back to back')
+    parser.add_argument('--pace-rate', type=float, default=PACING_RATE, help='explicit pacing rate in bytes/sec')
+    parser.add_argument('--max-burst', type=int, default=MAX_BURST, help='max bytes sent back to back')
+    parser.add_argument('--trace', metavar='DIR', help='write per-stream congestion traces (see tools/trace_summary.py)')
+    parser.add_argument('--stripes', type=int, default=STRIPES, help='connections per file transfer (large files only)')
+    parser.add_argument('--fec', action='store_true', help='send XOR parity with file chunks when the path loses segments')
     args = parser.parse_args()
-    run_client(args.name)
+    STRIPES = args.stripes
+    run_client(args.name, cc=args.cc, pacing=not args.no_pacing, pacing_rate=args.pace_rate, max_burst=args.max_burst, trace_dir=args.trace,
+               fec=args.fec)
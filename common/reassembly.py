@@ -0,0 +1,144 @@
+"""
+Per-transfer file reassembly with bounded memory.
+Chunks are written at their byte offset straight into a preallocated spill file
+(os.pwrite), so a transfer costs one open file descriptor and a short list of
+received ranges no matter how large the file is. When every byte has arrived the
+file is post-processed block by block (e.g. decrypted) and renamed into place.
+"""
+import hashlib
+import os
+import re
+import threading
+
+BLOCK = 64 * 1024   # bytes per read/transform/write step when finalizing
+_SAFE_ID = re.compile(r'[A-Za-z0-9_.-]{1,100}')
+
+
+def _pwrite(fd, data, offset):
+    if hasattr(os, 'pwrite'):
+        return os.pwrite(fd, data, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.write(fd, data)
+
+
+def _pread(fd, n, offset):
+    if hasattr(os, 'pread'):
+        return os.pread(fd, n, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, n)
+
+
+def _file_id(transfer_id):
+    # transfer ids come from the peer: never let one pick a path
+    transfer_id = str(transfer_id)
+    if _SAFE_ID.fullmatch(transfer_id) and transfer_id.strip('.'):
+        return transfer_id
+    return hashlib.sha256(transfer_id.encode()).hexdigest()
+
+
+class Transfer:
+    def __init__(self, transfer_id, directory, size=None):
+        self.transfer_id = transfer_id
+        self.path = os.path.join(directory, f'.{_file_id(transfer_id)}.part')
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        self.size = None
+        self.ranges = []          # sorted, merged [start, end) byte ranges on disk
+        self.received = 0
+        self.meta = None
+        self.digest = None        # sender's FILE_DIGEST (backend/integrity.py), if any
+        if size is not None:
+            self.set_size(size)
+
+    def set_size(self, size):
+        self.size = int(size)
+        # preallocate so out-of-order writes don't keep growing the file
+        os.ftruncate(self.fd, self.size)
+
+    def write(self, offset, data):
+        """Store `data` at `offset`; returns the number of bytes that were new."""
+        if not data:
+            return 0
+        _pwrite(self.fd, data, offset)
+        new = self._add_range(offset, offset + len(data))
+        self.received += new
+        return new
+
+    def _add_range(self, start, end):
+        merged = []
+        absorbed = 0
+        for s, e in self.ranges:
+            if e < start or s > end:
+                merged.append([s, e])
+            else:
+                absorbed += e - s
+                start, end = min(s, start), max(e, end)
+        merged.append([start, end])
+        merged.sort()
+        self.ranges = merged
+        return (end - start) - absorbed
+
+    def complete(self):
+        if self.size is None:
+            return False
+        if self.size == 0:
+            return True
+        return len(self.ranges) == 1 and self.ranges[0][0] == 0 and self.ranges[0][1] >= self.size
+
+    def finalize(self, dest, transform=None, check=None):
+        """Apply transform(block, offset) in place, block by block, and move to `dest`.
+        If check() is given and returns False afterwards, the file goes to dest + '.corrupt'."""
+        if transform is not None:
+            offset = 0
+            while offset < self.size:
+                block = _pread(self.fd, min(BLOCK, self.size - offset), offset)
+                if not block:
+                    break
+                _pwrite(self.fd, transform(block, offset), offset)
+                offset += len(block)
+        os.ftruncate(self.fd, self.size)
+        os.close(self.fd)
+        self.fd = None
+        if check is not None and not check():
+            dest += '.corrupt'
+        os.replace(self.path, dest)
+        return dest
+
+    def abort(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class Reassembler:
+    """Transfers keyed by transfer id; safe to call from several receiver threads."""
+    def __init__(self, directory='.'):
+        self.directory = directory
+        self.transfers = {}
+        self.lock = threading.Lock()
+
+    def get(self, transfer_id, size=None):
+        with self.lock:
+            t = self.transfers.get(transfer_id)
+            if t is None:
+                t = self.transfers[transfer_id] = Transfer(transfer_id, self.directory, size)
+            elif size is not None and t.size is None:
+                t.set_size(size)
+            return t
+
+    def write(self, transfer_id, offset, data):
+        t = self.get(transfer_id)
+        return t, t.write(offset, data)
+
+    def pop(self, transfer_id):
+        with self.lock:
+            return self.transfers.pop(transfer_id, None)
+
+    def abort_all(self):
+        with self.lock:
+            for t in self.transfers.values():
+                t.abort()
+            self.transfers.clear()
@@ -0,0 +1,129 @@
+"""
+Per-transfer congestion-control traces.
+A sender calls Telemetry.record(trace_id, event, ...) from its hot path: the event is a
+tuple appended to that trace's ring buffer (a bounded deque - append is atomic under the
+GIL, so no lock). A daemon thread flushes every buffer to <dir>/trace-<id>.csv twice a
+second. If a producer outruns the flusher the oldest events are overwritten and the
+loss is counted in the trace footer rather than slowing the sender down.
+tools/trace_summary.py reads the files back.
+
+CSV columns: t,event,seq,bytes,cwnd,ssthresh,srtt,rtt,inflight,state
+  t         seconds since the trace was opened
+  event     send | retx | ack | dupack | fast | timeout | throttle | probe | parity
+  cwnd, ssthresh, bytes, inflight in bytes; srtt, rtt in seconds (rtt only on samples)
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+
+COLUMNS = ('t', 'event', 'seq', 'bytes', 'cwnd', 'ssthresh', 'srtt', 'rtt', 'inflight', 'state')
+RING_SIZE = 8192            # events buffered per trace between flushes
+FLUSH_INTERVAL = 0.5
+
+
+def _fmt(v):
+    if v is None:
+        return ''
+    if isinstance(v, float):
+        return f'{v:.6g}'
+    return str(v)
+
+
+class Trace:
+    def __init__(self, path, header=None, ring_size=RING_SIZE, clock=time.monotonic):
+        self.path = path
+        self.clock = clock
+        self.start = clock()
+        self.ring = deque(maxlen=ring_size)
+        self.recorded = 0
+        self.written = 0
+        self.closed = False
+        self.io_lock = threading.Lock()   # flusher thread vs close(); record() never takes it
+        self.file = open(path, 'w', buffering=1024 * 1024)
+        meta = dict(header or {}, start=round(time.time(), 3))
+        self.file.write('# ' + ' '.join(f'{k}={v}' for k, v in meta.items()) + '\n')
+        self.file.write(','.join(COLUMNS) + '\n')
+
+    def record(self, event, seq=None, nbytes=None, cwnd=None, ssthresh=None, srtt=None, rtt=None, inflight=None, state=None):
+        self.recorded += 1
+        self.ring.append((self.clock() - self.start, event, seq, nbytes, cwnd, ssthresh, srtt, rtt, inflight, state))
+
+    def flush(self):
+        with self.io_lock:
+            if not self.closed:
+                self._drain()
+
+    def _drain(self):
+        lines = []
+        ring = self.ring
+        while ring:
+            try:
+                ev = ring.popleft()
+            except IndexError:
+                break
+            lines.append(','.join(_fmt(v) for v in ev))
+        if lines:
+            self.written += len(lines)
+            self.file.write('\n'.join(lines) + '\n')
+        self.file.flush()
+
+    def close(self):
+        with self.io_lock:
+            if self.closed:
+                return
+            self._drain()
+            lost = self.recorded - self.written
+            self.file.write(f'# events={self.recorded} overwritten={lost}\n')
+            self.file.close()
+            self.closed = True
+
+
+class Telemetry:
+    """Traces keyed by transfer/stream id, flushed by one background thread."""
+    def __init__(self, directory='.', header=None, ring_size=RING_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.header = header or {}
+        self.ring_size = ring_size
+        self.flush_interval = flush_interval
+        self.traces = {}
+        self.lock = threading.Lock()   # guards the dict, not the rings
+        self.stopped = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        threading.Thread(target=self._flusher, name='telemetry-flush', daemon=True).start()
+
+    def trace(self, trace_id):
+        t = self.traces.get(trace_id)
+        if t is None:
+            with self.lock:
+                t = self.traces.get(trace_id)
+                if t is None:
+                    safe = re.sub(r'[^A-Za-z0-9._-]+', '_', str(trace_id))
+                    path = os.path.join(self.directory, f'trace-{safe}.csv')
+                    t = self.traces[trace_id] = Trace(path, dict(self.header, id=trace_id), self.ring_size)
+        return t
+
+    def record(self, trace_id, event, *args, **kw):
+        self.trace(trace_id).record(event, *args, **kw)
+
+    def finish(self, trace_id):
+        with self.lock:
+            t = self.traces.pop(trace_id, None)
+        if t is not None:
+            t.close()
+        return t.path if t is not None else None
+
+    def _flusher(self):
+        while not self.stopped.wait(self.flush_interval):
+            with self.lock:
+                traces = list(self.traces.values())
+            for t in traces:
+                t.flush()
+
+    def close(self):
+        self.stopped.set()
+        with self.lock:
+            traces, self.traces = list(self.traces.values()), {}
+        for t in traces:
+            t.close()
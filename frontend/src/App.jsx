@@ -1,6 +1,100 @@
 import React, {useEffect, useState, useRef} from 'react';
 import './App.css';
 
+// chunk checksums and the per-transfer Merkle root, laid out as in backend/integrity.py
+const CRC_POLYS = {crc32: 0xEDB88320, crc32c: 0x82F63B78};
+const crcTables = {};
+const crc32 = (u8, alg='crc32')=>{
+  let table = crcTables[alg];
+  if(!table){
+    table = crcTables[alg] = new Uint32Array(256);
+    for(let n=0;n<256;n++){
+      let c = n;
+      for(let k=0;k<8;k++) c = c & 1 ? CRC_POLYS[alg] ^ (c >>> 1) : c >>> 1;
+      table[n] = c >>> 0;
+    }
+  }
+  let c = 0xFFFFFFFF;
+  for(let i=0;i<u8.length;i++) c = table[(c ^ u8[i]) & 0xFF] ^ (c >>> 8);
+  return (c ^ 0xFFFFFFFF) >>> 0;
+};
+const sha256 = async (bytes)=>new Uint8Array(await crypto.subtle.digest('SHA-256', bytes));
+const chunkLeaf = (length, crc)=>{
+  const b = new Uint8Array(13); // 0x00 || u64 length || u32 crc
+  const v = new DataView(b.buffer);
+  v.setUint32(1, Math.floor(length / 2 ** 32));
+  v.setUint32(5, length >>> 0);
+  v.setUint32(9, crc >>> 0);
+  return sha256(b);
+};
+const merkleRoot = async (leaves)=>{
+  if(leaves.length === 0) return sha256(new Uint8Array(0));
+  let level = leaves;
+  while(level.length > 1){
+    const next = [];
+    for(let i=0;i+1<level.length;i+=2){
+      const b = new Uint8Array(65);
+      b[0] = 1;
+      b.set(level[i], 1);
+      b.set(level[i+1], 33);
+      next.push(sha256(b));
+    }
+    const carried = level.length % 2 ? [level[level.length-1]] : [];
+    level = [...await Promise.all(next), ...carried];
+  }
+  return level[0];
+};
+const toHex = (u8)=>Array.from(u8, b=>b.toString(16).padStart(2, '0')).join('');
+const fromB64 = (b64)=>{
+  const raw = atob(b64);
+  const u8 = new Uint8Array(raw.length);
+  for(let i=0;i<raw.length;i++) u8[i] = raw.charCodeAt(i);
+  return u8;
+};
+const toB64 = (u8)=>{
+  let binary = '';
+  for(let i=0;i<u8.length;i+=0x8000) binary += String.fromCharCode.apply(null, u8.subarray(i, i + 0x8000));
+  return btoa(binary);
+};
+
+// forward error correction, as in common/fec.py: one XOR parity chunk per group of k chunks,
+// k the largest group in which two losses stay less likely than FEC_RESIDUAL at the measured loss
+const FEC_MIN_GROUP = 2;
+const FEC_MAX_GROUP = 16;
+const FEC_MIN_LOSS = 0.005; // measured loss below this sends no parity
+const FEC_RESIDUAL = 0.05;
+const FEC_WINDOW = 8; // chunks per loss sample (a chunk is 128 client_tcp segments)
+const fecGroupSize = (loss)=>{
+  if(loss < FEC_MIN_LOSS) return 0;
+  for(let k=FEC_MAX_GROUP;k>=FEC_MIN_GROUP;k--){
+    const ok = (1 - loss) ** (k + 1) + (k + 1) * loss * (1 - loss) ** k;
+    if(1 - ok <= FEC_RESIDUAL) return k;
+  }
+  return FEC_MIN_GROUP;
+};
+// XOR src into acc (at least as long) a 32-bit word at a time, the tail byte by byte.
+// Both come from fresh buffers, so their offsets are word aligned
+const xorInto = (acc, src)=>{
+  const words = src.length >> 2;
+  const a = new Uint32Array(acc.buffer, acc.byteOffset, words);
+  const b = new Uint32Array(src.buffer, src.byteOffset, words);
+  for(let i=0;i<words;i++) a[i] ^= b[i];
+  for(let i=words << 2;i<src.length;i++) acc[i] ^= src[i];
+  return acc;
+};
+// share of an entry's transmissions lost, EWMA'd per FEC_WINDOW sends; the first sample is
+// taken as is so a lossy path gets parity from the start (LossMeter in common/fec.py)
+const meterLoss = (entry, sends, losses)=>{
+  const m = entry.loss = entry.loss || {rate: 0, samples: 0, sends: 0, losses: 0};
+  m.sends += sends;
+  m.losses += losses;
+  if(m.sends < FEC_WINDOW) return;
+  const sample = Math.min(1, m.losses / m.sends);
+  m.rate = m.samples ? m.rate + 0.25 * (sample - m.rate) : sample;
+  m.samples += 1;
+  m.sends = m.losses = 0;
+};
+
 function App(){
   const [connected, setConnected] = useState(false);
   const [name, setName] = useState('Alice');
@@ -8,26 +102,196 @@ function App(){
   const [clientsList, setClientsList] = useState([]);
   const [selectedRecipient, setSelectedRecipient] = useState('');
   const [transfersProgress, setTransfersProgress] = useState({}); // transfer_id -> {acked, total}
+  const [stripes, setStripes] = useState(1); // congestion windows per outgoing file (see dispatchStripes)
+  const [fec, setFec] = useState(false); // parity groups on outgoing files (see addToParity)
   const wsRef = useRef(null);
-  const transfersRef = useRef({}); // transfer_id -> {meta, chunks: Map(index->Uint8Array), received, next_expected}
+  const historyCursorRef = useRef({}); // peer -> cursor for the next older page (null = exhausted)
+  const mailboxSeqRef = useRef(0); // highest offline-mailbox seq already processed
+  const sessionRef = useRef({token: null, lastSeq: 0, attempts: 0, timer: null, closing: false}); // resumable server session
+  const transfersRef = useRef({}); // transfer_id -> {meta, chunks: Map(index->Uint8Array), received, next_expected, sums: [[len, crc]], digest}
+  const assembledRef = useRef({}); // transfer_id -> {sums, fname} of files assembled before their FILE_DIGEST came
   const sentTransfersRef = useRef({}); // outgoing transfer_id -> {meta, total_chunks, acked_up_to, payloads: Map(idx->b64), sentAt: Map(idx->ts)}
+                                       // striped files add one entry per stripe under `${transfer_id}/${k}`
 
   // Congestion control defaults (measured in chunks)
+  const RECONNECT_MIN_MS = 500; // first reconnect delay, doubled per failed attempt
+  const RECONNECT_MAX_MS = 30000;
   const INITIAL_CWND = 1; // start with 1 chunk
   const INITIAL_SSTHRESH = 64; // arbitrary large
   const ALPHA = 0.125; // for RTT smoothing
   const BETA = 0.25;
+  const MAX_SACK_BLOCKS = 4; // chunk-index ranges carried per ACK
+  const DELAYED_ACK_MS = 50; // hold an in-order ACK this long waiting for a second chunk
+  const ACK_EVERY = 2; // ...but always ACK every second in-order chunk
+  const TRACE_MAX = 20000; // congestion trace events kept per outgoing transfer (ring buffer)
+  const TRACE_COLUMNS = 't,event,seq,bytes,cwnd,ssthresh,srtt,rtt,inflight,state';
+
+  // per-transfer congestion trace in the same CSV format as common/telemetry.py
+  // (seq is a chunk index; window sizes converted to bytes); summarize with tools/trace_summary.py
+  const traceEvent = (entry, event, seq=null, nbytes=null, rtt=null)=>{
+    // every chunk sent passes through here: sends and resends also feed the loss meter FEC sizes groups by
+    if(event === 'send' || event === 'retx') meterLoss(entry, 1, event === 'retx' ? 1 : 0);
+    const cc = entry.cc || {};
+    const tr = entry.trace = entry.trace || {start: performance.now(), ring: [], next: 0, total: 0};
+    const state = cc.recoveryPoint != null ? 'recovery' : (cc.cwnd < cc.ssthresh ? 'slow_start' : 'avoidance');
+    const row = [((performance.now() - tr.start) / 1000).toFixed(4), event, seq ?? '', nbytes ?? '',
+      Math.round((cc.cwnd || 0) * CHUNK_SIZE), Math.round((cc.ssthresh || 0) * CHUNK_SIZE),
+      cc.srtt != null ? (cc.srtt / 1000).toFixed(4) : '', rtt != null ? (rtt / 1000).toFixed(4) : '',
+      cc.inFlight ? cc.inFlight.size * CHUNK_SIZE : '', state].join(',');
+    if(tr.ring.length < TRACE_MAX) tr.ring.push(row); else tr.ring[tr.next] = row;
+    tr.next = (tr.next + 1) % TRACE_MAX;
+    tr.total += 1;
+  };
+
+  const downloadTrace = (tid)=>{
+    const entry = sentTransfersRef.current[tid];
+    if(entry && entry.striped){ entry.stripes.forEach(downloadTrace); return; } // one trace per window
+    const tr = entry && entry.trace;
+    if(!tr) return;
+    const rows = tr.ring.length < TRACE_MAX ? tr.ring : [...tr.ring.slice(tr.next), ...tr.ring.slice(0, tr.next)];
+    const csv = [`# id=${tid} who=${name} cc=reno-chunks mss=${CHUNK_SIZE}`, TRACE_COLUMNS, ...rows,
+      `# events=${tr.total} overwritten=${tr.total - rows.length}`].join('\n') + '\n';
+    const a = document.createElement('a');
+    a.href = URL.createObjectURL(new Blob([csv], {type: 'text/csv'}));
+    a.download = `trace-${tid}.csv`;
+    a.click();
+    setTimeout(()=>URL.revokeObjectURL(a.href), 1000);
+  };
+
+  // collapse received chunk indices above the cumulative ack into [start, end) ranges,
+  // newest range first so truncation never hides the latest arrival
+  const sackBlocks = (chunks, from, latest)=>{
+    const idx = Array.from(chunks.keys()).filter(i=>i > from).sort((a,b)=>a-b);
+    const blocks = [];
+    for(const i of idx){
+      const last = blocks[blocks.length-1];
+      if(last && i === last[1]) last[1] = i + 1;
+      else blocks.push([i, i + 1]);
+    }
+    const li = blocks.findIndex(b=>b[0] <= latest && latest < b[1]);
+    if(li > 0) blocks.unshift(blocks.splice(li, 1)[0]);
+    return blocks.slice(0, MAX_SACK_BLOCKS);
+  };
+
+  // FILE_CHUNK frame for chunk i of an outgoing entry. A stripe numbers its chunks on its
+  // own (stripe_seq, which its ACKs count) but the frame keeps the file's chunk index, so
+  // the server and receiver see an ordinary chunk of the transfer
+  const chunkFrame = (tid, entry, i)=>{
+    const out = {type:'FILE_CHUNK', from:name, transfer_id: tid, chunk_index: i, total_chunks: entry.total_chunks, payload: entry.payloads[i], crc: entry.crcs[i]};
+    if(entry.parent != null){
+      const parent = sentTransfersRef.current[entry.parent];
+      Object.assign(out, {transfer_id: entry.parent, chunk_index: entry.chunkIds[i], total_chunks: parent.total_chunks, stripe: entry.stripe, stripe_seq: i});
+    }
+    if(entry.to) out.to = entry.to;
+    if(entry.room) out.room = entry.room;
+    return out;
+  };
+
+  // the entry that last sent chunk idx of tid, and its index there (a stripe, for striped files)
+  const sentChunk = (tid, idx)=>{
+    const entry = sentTransfersRef.current[tid];
+    if(!entry || !entry.striped || idx == null) return [entry, idx];
+    const owner = entry.owner[idx];
+    return owner ? [sentTransfersRef.current[owner[0]], owner[1]] : [null, idx];
+  };
+
+  // FEC frame for entry's open parity group: each member as [chunk_index, seq in entry, length, crc]
+  const sendParity = (tid, entry)=>{
+    const g = entry.fecOpen;
+    entry.fecOpen = null;
+    const out = {type:'FEC', from:name, transfer_id: tid, total_chunks: entry.total_chunks, chunks: g.chunks, payload: toB64(g.acc.subarray(0, g.size))};
+    if(entry.parent != null){
+      Object.assign(out, {transfer_id: entry.parent, total_chunks: sentTransfersRef.current[entry.parent].total_chunks, stripe: entry.stripe});
+    }
+    if(entry.to) out.to = entry.to;
+    if(entry.room) out.room = entry.room;
+    try{
+      wsRef.current.send(JSON.stringify(out));
+      entry.fecGroups = entry.fecGroups || [];
+      entry.fecGroups.push([g.first, g.first + g.chunks.length]);
+      traceEvent(entry, 'parity', g.first, g.size);
+    }catch(e){ console.warn('parity send failed', e); }
+  };
+
+  // fold chunk i's first transmission into entry's open parity group (opened at the size the
+  // measured loss calls for). The parity goes out once the group is full, once the window is
+  // (with at least two members: parity over one chunk is just a second copy), or when no more
+  // chunks are ready
+  const addToParity = (tid, entry, i, frame, windowFull)=>{
+    if(!entry.fecOpen){
+      const k = fecGroupSize(entry.loss ? entry.loss.rate : 0);
+      if(!k) return;
+      entry.fecOpen = {k, first: i, chunks: [], acc: new Uint8Array(CHUNK_SIZE), size: 0};
+    }
+    const g = entry.fecOpen;
+    const u8 = fromB64(frame.payload);
+    xorInto(g.acc, u8);
+    g.size = Math.max(g.size, u8.length);
+    g.chunks.push([frame.chunk_index, i, u8.length, frame.crc]);
+    const more = entry.nextToSend < entry.total_chunks && entry.payloads[entry.nextToSend];
+    if(g.chunks.length >= g.k || (windowFull && g.chunks.length >= FEC_MIN_GROUP) || !more) sendParity(tid, entry);
+  };
+
+  // a hole whose group parity is out may be rebuilt by the receiver: hold off fast
+  // retransmit until three chunks past the group are SACKed
+  const parityCovers = (entry, hole)=>{
+    const g = (entry.fecGroups || []).find(([first, end])=>first <= hole && hole < end);
+    if(!g) return false;
+    let past = 0;
+    for(const i of entry.cc.sacked) if(i >= g[1]) past += 1;
+    return past < 3;
+  };
+
+  // once every chunk of a parity group but one has arrived, the missing one is the XOR of
+  // the parity and the rest: replay it as if it had come in, marked so the ACK counts it
+  const repairChunks = (handleFrame, tid, t)=>{
+    for(const p of [...t.parity]){
+      if(transfersRef.current[tid] !== t) return; // a rebuilt chunk completed the file
+      if(!t.parity.includes(p)) continue;
+      const missing = p.chunks.filter(c=>!t.chunks.has(c[0]));
+      if(missing.length > 1) continue; // a retransmission may bring it down to one
+      t.parity.splice(t.parity.indexOf(p), 1);
+      if(missing.length === 0) continue;
+      const [idx, seq, len, crc] = missing[0];
+      const acc = fromB64(p.payload);
+      for(const c of p.chunks) if(c[0] !== idx) xorInto(acc, t.chunks.get(c[0]));
+      const buf = acc.subarray(0, len);
+      if(crc != null && crc32(buf) !== crc) continue;
+      const chunk = {type:'FILE_CHUNK', from: p.from, transfer_id: tid, chunk_index: idx, total_chunks: p.total_chunks, payload: toB64(buf), crc, repaired: true};
+      if(p.stripe != null) Object.assign(chunk, {stripe: p.stripe, stripe_seq: seq});
+      setMessages(m => [...m, {from:'system', text:`Rebuilt chunk ${idx} for ${tid} from parity`}]);
+      handleFrame(chunk);
+    }
+  };
 
   useEffect(()=>{
     return ()=>{
+      sessionRef.current.closing = true;
+      clearTimeout(sessionRef.current.timer);
       if(wsRef.current) wsRef.current.close();
     }
   },[])
 
+  // after a resume the server replays what we missed (including ACKs): give in-flight
+  // chunks a fresh timer instead of resending every unacked chunk at once
+  const rearmTransfers = ()=>{
+    const now = Date.now();
+    for(const tid in sentTransfersRef.current){
+      const entry = sentTransfersRef.current[tid];
+      for(const i in (entry.sentAt || {})) entry.sentAt[i] = now;
+    }
+  };
+
   const connect = ()=>{
-    const ws = new WebSocket(`ws://localhost:9009/ws?name=${encodeURIComponent(name)}`);
+    const sess = sessionRef.current;
+    sess.closing = false;
+    clearTimeout(sess.timer);
+    let url = `ws://localhost:9009/ws?name=${encodeURIComponent(name)}`;
+    if(sess.token) url += `&session=${encodeURIComponent(sess.token)}&last_seq=${sess.lastSeq}`;
+    const ws = new WebSocket(url);
     ws.onopen = async ()=>{
       console.log('[WS] open', {name});
+      sess.attempts = 0;
       setConnected(true);
       setMessages(m => [...m, {from:'system', text:'connected'}]);
       // fetch connected clients for recipient selection
@@ -37,33 +301,137 @@ function App(){
         const list = j.clients || [];
         setClientsList(list);
         const others = list.filter(c=>c !== name);
-        if(others.length>0) setSelectedRecipient(others[0]);
+        if(others.length>0) setSelectedRecipient(cur => cur || others[0]);
       }catch(e){ console.warn('could not fetch clients', e); }
     }
-    ws.onmessage = (ev)=>{
-      // log raw incoming frame for debugging
-      try{ console.log('[WS] in', ev.data); }catch(e){}
+    // one decoded frame; mailbox backlogs and chunks rebuilt from parity come through here too
+    const handleFrame = (msg)=>{
       try{
-        const msg = JSON.parse(ev.data);
+        // server-stamped session seq: drop anything a resume replayed twice
+        if(typeof msg.sseq === 'number'){
+          if(msg.sseq <= sess.lastSeq) return;
+          sess.lastSeq = msg.sseq;
+        }
+        if(msg.type === 'ERROR' && msg.why === 'name taken') sess.closing = true; // don't retry into it
+        if(msg.type === 'CONNECTED'){
+          if(!msg.resumed) sess.lastSeq = 0; // new session: its seq starts over
+          else rearmTransfers();
+          sess.token = msg.session;
+          setMessages(m => [...m, {from:'system', text: msg.resumed ? `session resumed${msg.gap ? ' (some frames were lost; load history)' : ''}` : `connected as ${msg.you}`}]);
+          return;
+        }
+        // backlog held while we were offline: handle each frame as if it had just arrived, then ack
+        if(msg.type === 'MAILBOX'){
+          const seqs = msg.seqs || [];
+          (msg.frames || []).forEach((f, i)=>{
+            if(seqs[i] <= mailboxSeqRef.current) return; // already seen (resent batch)
+            handleFrame(f);
+          });
+          mailboxSeqRef.current = Math.max(mailboxSeqRef.current, msg.last || 0);
+          ws.send(JSON.stringify({type:'MAILBOX_ACK', seq: msg.last}));
+          return;
+        }
+        if(msg.type === 'QUEUED'){
+          setMessages(m => [...m, {from:'system', text:`${msg.to} is offline; message will be delivered when they reconnect`}]);
+          return;
+        }
         // special internal server ack when server persisted a chunk
         if(msg.type === 'SERVER_RECV_CHUNK'){
           console.log('[SERVER] recv chunk ack', msg);
           setMessages(m => [...m, {from:'server', text:`Server persisted chunk ${msg.chunk_index} for ${msg.transfer_id}`}]);
           return;
         }
+        // server rate limiter dropped one of our frames: back off and resend after the hint
+        if(msg.type === 'THROTTLE'){
+          const tid = msg.transfer_id;
+          const [entry, idx] = tid ? sentChunk(tid, msg.chunk_index) : [null, null];
+          const waitMs = Math.max(0, (msg.retry_after || 1) * 1000);
+          if(msg.dropped === 'FILE_META' && (sentTransfersRef.current[tid] || {}).metaMsg){
+            // nothing else would ever deliver the transfer's FILE_META
+            setTimeout(()=>{
+              const t = sentTransfersRef.current[tid];
+              const ws = wsRef.current;
+              if(t && ws && ws.readyState === WebSocket.OPEN) ws.send(JSON.stringify(t.metaMsg));
+            }, waitMs);
+          }
+          if(entry && entry.cc){
+            const now = Date.now();
+            // one multiplicative decrease per pause window, like a loss signal
+            if(!entry.pauseUntil || now >= entry.pauseUntil){
+              entry.cc.ssthresh = Math.max(1, Math.floor(entry.cc.cwnd / 2));
+              entry.cc.cwnd = entry.cc.ssthresh;
+            }
+            entry.pauseUntil = Math.max(entry.pauseUntil || 0, now + waitMs);
+            traceEvent(entry, 'throttle', idx ?? null);
+            if(idx != null){
+              entry.cc.inFlight.delete(idx);
+              entry.sentAt[idx] = 0; // retransmit monitor resends it after the pause
+            }
+          }
+          setMessages(m => [...m, {from:'system', text:`Server throttled ${msg.dropped || 'frame'} (${msg.why}); retry in ${msg.retry_after}s`}]);
+          return;
+        }
+        // the server got one of our chunks damaged: resend just that one. Corruption is
+        // not a congestion signal, so the window is left alone
+        if(msg.type === 'CHUNK_BAD'){
+          const [entry, idx] = sentChunk(msg.transfer_id, msg.chunk_index);
+          if(entry && entry.cc && idx != null){
+            entry.cc.inFlight.delete(idx);
+            entry.sentAt[idx] = 0; // retransmit monitor resends it
+            traceEvent(entry, 'corrupt', idx);
+          }
+          setMessages(m => [...m, {from:'system', text:`Server rejected damaged chunk ${msg.chunk_index} of ${msg.transfer_id}; resending`}]);
+          return;
+        }
         // handle ACKs and file transfer messages specially
   if(msg.type === 'ACK'){
-          // update outgoing transfer progress if we sent this transfer
-          const tid = msg.transfer_id;
+          // update outgoing transfer progress if we sent this transfer (a stripe's ACKs name it in `stream`)
+          const tid = msg.stream || msg.transfer_id;
           if(tid && sentTransfersRef.current[tid]){
             const entry = sentTransfersRef.current[tid];
             const prevAck = entry.acked_up_to || 0;
             const newAck = Math.max(prevAck, msg.ack || 0);
             // ensure cc state
             entry.cc = entry.cc || {cwnd: INITIAL_CWND, ssthresh: INITIAL_SSTHRESH, inFlight: new Set(), nextToSend: 0, lastAck: 0, dupAcks: 0, srtt:500, rto:1000, rttvar:500};
+            entry.cc.sacked = entry.cc.sacked || new Set();
+            entry.cc.retx = entry.cc.retx || new Set();
+            // SACK scoreboard: chunks the receiver already holds leave the flight and are never resent
+            let highSacked = entry.cc.highSacked || 0;
+            for(const [start, end] of (msg.sack || [])){
+              for(let i=start;i<end;i++){
+                if(!entry.cc.sacked.has(i)){ entry.cc.sacked.add(i); entry.cc.inFlight.delete(i); }
+              }
+              highSacked = Math.max(highSacked, end);
+            }
+            entry.cc.highSacked = highSacked;
+            // chunks the receiver rebuilt from parity were lost all the same, though never resent
+            if(msg.repaired > (entry.repaired || 0)){
+              meterLoss(entry, 0, msg.repaired - (entry.repaired || 0));
+              entry.repaired = msg.repaired;
+            }
+            // retransmit every un-SACKed hole below the highest SACKed chunk once per recovery
+            const resendHoles = (from)=>{
+              for(let i=from;i<entry.cc.highSacked;i++){
+                if(entry.cc.sacked.has(i) || entry.cc.retx.has(i)) continue;
+                const p = entry.payloads && entry.payloads[i];
+                if(!p) continue;
+                const out = chunkFrame(tid, entry, i);
+                try{
+                  wsRef.current.send(JSON.stringify(out));
+                  entry.sentAt[i] = Date.now();
+                  entry.cc.retx.add(i);
+                  traceEvent(entry, 'retx', i, CHUNK_SIZE);
+                  setMessages(m=>[...m,{from:'system', text:`[sack-retransmit] resent ${i} for ${tid}`}]);
+                }catch(e){console.warn('sack retransmit failed', e)}
+              }
+            };
 
             if(newAck > prevAck){
               // advanced ack
+              // RTT estimation using the last newly ACKed chunk (read its send time before cleanup)
+              const sampleIdx = newAck - 1;
+              const sentTs = entry.sentAt && entry.sentAt[sampleIdx];
+              const sampleRTT = (sentTs && !entry.cc.retx.has(sampleIdx)) ? Date.now() - sentTs : null;
               // remove acked chunks from inFlight and payloads
               for(let i=prevAck;i<newAck;i++){
                 if(entry.cc && entry.cc.inFlight) entry.cc.inFlight.delete(i);
@@ -71,12 +439,8 @@ function App(){
                 if(entry.sentAt) { delete entry.sentAt[i]; }
               }
 
-              // RTT estimation using the last newly ACKed chunk
               try{
-                const sampleIdx = newAck - 1;
-                const sentTs = entry.sentAt && entry.sentAt[sampleIdx];
-                if(sentTs){
-                  const sampleRTT = Date.now() - sentTs;
+                if(sampleRTT != null){
                   // initialize rttvar if missing
                   entry.cc.rttvar = entry.cc.rttvar || (entry.cc.srtt/2 || 250);
                   // SRTT update
@@ -98,25 +462,50 @@ function App(){
               entry.cc.dupAcks = 0;
               entry.cc.lastAck = newAck;
               entry.acked_up_to = newAck;
+              traceEvent(entry, 'ack', newAck, (newAck - prevAck) * CHUNK_SIZE, sampleRTT);
+              for(const i of Array.from(entry.cc.sacked)){ if(i < newAck) entry.cc.sacked.delete(i); }
+              if(entry.fecGroups) entry.fecGroups = entry.fecGroups.filter(([, end])=>end > newAck);
+              if(entry.cc.recoveryPoint != null){
+                if(newAck >= entry.cc.recoveryPoint){
+                  // full ACK: recovery is over, deflate to ssthresh
+                  entry.cc.recoveryPoint = null;
+                  entry.cc.retx.clear();
+                  entry.cc.cwnd = entry.cc.ssthresh;
+                }else{
+                  // partial ACK: remaining holes are lost as well
+                  resendHoles(newAck);
+                }
+              }
               console.log('[ACK] advanced', {transfer_id: tid, newAck, cwnd: entry.cc.cwnd, rto: entry.cc.rto});
               setMessages(m => [...m, {from:'system', text:`ACK for ${tid}: cumulative ack=${entry.acked_up_to}/${entry.total_chunks} cwnd=${entry.cc.cwnd.toFixed(2)} rto=${entry.cc.rto}`}]);
-              setTransfersProgress(p=>({...p, [tid]: {acked: entry.acked_up_to, total: entry.total_chunks}}));
+              if(entry.parent == null) setTransfersProgress(p=>({...p, [tid]: {acked: entry.acked_up_to, total: entry.total_chunks}}));
             }else{
               // duplicate ACK
               entry.cc.dupAcks = (entry.cc.dupAcks || 0) + 1;
+              traceEvent(entry, 'dupack', newAck);
               setMessages(m => [...m, {from:'system', text:`Dup-ACK (${entry.cc.dupAcks}) for ${tid} ack=${newAck}`}]);
-              if(entry.cc.dupAcks >= 3){
+              // the hole is in the group still filling up: its parity now may spare the retransmission
+              if(entry.fecOpen && entry.fecOpen.first <= newAck) sendParity(tid, entry);
+              if(entry.cc.recoveryPoint != null){
+                // already in SACK recovery: new SACK ranges may reveal further holes
+                resendHoles(newAck);
+              }else if((entry.cc.dupAcks >= 3 || entry.cc.sacked.size >= 3) && !parityCovers(entry, newAck)){
                 // fast retransmit
                 entry.cc.ssthresh = Math.max(1, Math.floor(entry.cc.cwnd / 2));
                 entry.cc.cwnd = entry.cc.ssthresh + 3;
+                entry.cc.recoveryPoint = entry.nextToSend;
+                entry.cc.retx.add(newAck);
+                traceEvent(entry, 'fast', newAck);
+                resendHoles(newAck + 1);
                 const toResend = newAck;
                 const p = entry.payloads && entry.payloads[toResend];
                 if(p){
                     try{
-                    const out = {type:'FILE_CHUNK', from:name, to: entry.to || null, room: entry.room || null, transfer_id: tid, chunk_index: toResend, total_chunks: entry.total_chunks, payload: p};
+                    const out = chunkFrame(tid, entry, toResend);
                     console.log('[fast-retransmit] out', out);
                     wsRef.current.send(JSON.stringify(out));
                     entry.sentAt[toResend] = Date.now();
+                    traceEvent(entry, 'retx', toResend, CHUNK_SIZE);
                     setMessages(m=>[...m,{from:'system', text:`[fast-retransmit] resent ${toResend} for ${tid}`}]);
                   }catch(e){console.warn('fast retransmit failed', e)}
                 }
@@ -154,7 +543,7 @@ function App(){
           const meta = msg.meta || {};
           const tid = meta.transfer_id || msg.transfer_id;
           if(tid){
-            transfersRef.current[tid] = {meta, chunks: new Map(), received: 0, total: meta.total_chunks || null, from: msg.from, next_expected: 0};
+            transfersRef.current[tid] = {meta, chunks: new Map(), received: 0, total: meta.total_chunks || null, from: msg.from, next_expected: 0, sums: []};
             console.log('[FILE_META] in', {meta, from: msg.from});
             setMessages(m => [...m, {from: 'server', text: `Incoming file meta ${meta.fname} (${meta.size} bytes) id=${tid}`}]);
           } else {
@@ -162,6 +551,17 @@ function App(){
           }
           return;
         }
+        if(msg.type === 'FILE_DIGEST'){
+          const tid = msg.transfer_id;
+          const done = assembledRef.current[tid];
+          if(done){
+            delete assembledRef.current[tid];
+            verifyReceived(tid, done.sums, done.fname, msg.digest);
+          }else if(transfersRef.current[tid]){
+            transfersRef.current[tid].digest = msg.digest;
+          }
+          return;
+        }
         if(msg.type === 'FILE_READY'){
           const tid = msg.transfer_id;
           const fname = msg.fname;
@@ -171,6 +571,17 @@ function App(){
           setTransfersProgress(p=>({...p, [tid]: {acked: (p[tid] && p[tid].total) || null, total: (p[tid] && p[tid].total) || null}}));
           return;
         }
+        // parity over a group of chunks (see addToParity): kept until all but one of them are here
+        if(msg.type === 'FEC'){
+          const t = transfersRef.current[msg.transfer_id];
+          if(t && (msg.chunks || []).length){
+            t.parity = t.parity || [];
+            t.parity.push(msg);
+            if(t.parity.length > 2 * FEC_MAX_GROUP) t.parity.shift();
+            repairChunks(handleFrame, msg.transfer_id, t);
+          }
+          return;
+        }
         if(msg.type === 'FILE_CHUNK'){
           const tid = msg.transfer_id || (msg.meta||{}).transfer_id;
           const idx = msg.chunk_index;
@@ -178,29 +589,66 @@ function App(){
             let t = transfersRef.current[tid];
             if(!t){
               // no meta yet; create placeholder
-              t = transfersRef.current[tid] = {meta: null, chunks: new Map(), received:0, total: null, from: msg.from};
+              t = transfersRef.current[tid] = {meta: null, chunks: new Map(), received:0, total: null, from: msg.from, next_expected: 0, sums: []};
             }
             // decode base64 payload to binary (Uint8Array)
             const raw = atob(msg.payload);
             const buf = new Uint8Array(raw.length);
             for(let i=0;i<raw.length;i++) buf[i]=raw.charCodeAt(i);
-            t.chunks.set(idx, buf);
-            t.received += 1;
+            // a chunk that fails its checksum is treated as lost: the immediate ACK below
+            // leaves a SACK hole, so the sender resends only that chunk
+            // a striped sender's chunks arrive on several windows, each numbered on its own
+            // (stripe_seq): ACK that lane's sequence, keep the chunk at its place in the file
+            const striped = msg.stripe != null;
+            const lanes = t.lanes = t.lanes || {};
+            const lane = striped ? (lanes[msg.stripe] = lanes[msg.stripe] || {chunks: new Map(), next_expected: 0}) : t;
+            const seq = striped ? msg.stripe_seq : idx;
+            const alg = msg.crc_alg || 'crc32';
+            const corrupt = msg.crc != null && CRC_POLYS[alg] != null && crc32(buf, alg) !== msg.crc;
+            if(corrupt){
+              console.warn('[FILE_CHUNK] checksum mismatch', {transfer_id: tid, chunk_index: idx});
+              setMessages(m => [...m, {from: 'system', text: `Dropped damaged chunk ${idx} for ${tid}`}]);
+            }else{
+              t.chunks.set(idx, buf);
+              if(striped) lane.chunks.set(seq, true);
+              if(msg.repaired) lane.repaired = (lane.repaired || 0) + 1; // reported back for the sender's loss meter
+              if(msg.crc != null) t.sums[idx] = [buf.length, msg.crc];
+              t.received += 1;
+              setMessages(m => [...m, {from: 'server', text: `Received chunk ${idx} for ${tid}`}]);
+            }
             if(t.total == null && msg.total_chunks) t.total = msg.total_chunks;
             console.log('[FILE_CHUNK] in', {transfer_id: tid, chunk_index: idx, from: msg.from});
-            setMessages(m => [...m, {from: 'server', text: `Received chunk ${idx} for ${tid}`}]);
             // advance next_expected as long as contiguous chunks exist
-            while(t.chunks.has(t.next_expected)){
-              t.next_expected += 1;
+            const prevExpected = lane.next_expected;
+            const hadGap = lane.chunks.size - 1 > prevExpected;
+            while(lane.chunks.has(lane.next_expected)){
+              lane.next_expected += 1;
             }
-            // send cumulative ACK (next expected index) for this transfer back to sender via server
-            try{
-              const ackMsg = {type:'ACK', from:name, to: msg.from, transfer_id: tid, ack: t.next_expected};
-              console.log('[ACK] out', ackMsg);
-              wsRef.current.send(JSON.stringify(ackMsg));
-              setMessages(m => [...m, {from:'system', text:`Sent cumulative ACK ${t.next_expected} for ${tid}`}]);
-            }catch(e){
-              console.warn('ACK send failed', e);
+            // send cumulative ACK (next expected index) for this transfer back to sender via server;
+            // in-order chunks are ACKed every second chunk or after DELAYED_ACK_MS, anything
+            // out of order, duplicated, hole-filling or final is ACKed immediately
+            const sendAck = ()=>{
+              if(lane.ackTimer){ clearTimeout(lane.ackTimer); lane.ackTimer = null; }
+              lane.pendingAcks = 0;
+              try{
+                const ackMsg = {type:'ACK', from:name, to: msg.from, transfer_id: tid, ack: lane.next_expected};
+                if(striped) ackMsg.stream = `${tid}/${msg.stripe}`;
+                const sack = sackBlocks(lane.chunks, lane.next_expected, seq);
+                if(sack.length > 0) ackMsg.sack = sack;
+                if(lane.repaired) ackMsg.repaired = lane.repaired;
+                console.log('[ACK] out', ackMsg);
+                wsRef.current.send(JSON.stringify(ackMsg));
+                setMessages(m => [...m, {from:'system', text:`Sent cumulative ACK ${lane.next_expected} for ${ackMsg.stream || tid}`}]);
+              }catch(e){
+                console.warn('ACK send failed', e);
+              }
+            };
+            lane.pendingAcks = (lane.pendingAcks || 0) + 1;
+            const complete = t.total != null && t.chunks.size >= t.total;
+            if(corrupt || seq !== prevExpected || hadGap || complete || lane.pendingAcks >= ACK_EVERY){
+              sendAck();
+            }else if(!lane.ackTimer){
+              lane.ackTimer = setTimeout(sendAck, DELAYED_ACK_MS);
             }
 
             // check completion
@@ -220,8 +668,14 @@ function App(){
               const url = URL.createObjectURL(blob);
               const fname = (t.meta && t.meta.fname) ? t.meta.fname : `file_${tid}`;
               setMessages(m => [...m, {from:'system', text: `File received: ${fname}`, link: url, fname}]);
+              // compare with the sender's Merkle root now, or when its FILE_DIGEST arrives
+              if(t.digest) verifyReceived(tid, t.sums, fname, t.digest);
+              else if(t.sums.length) assembledRef.current[tid] = {sums: t.sums, fname};
               // cleanup
               delete transfersRef.current[tid];
+            }else if(t.parity && t.parity.length){
+              // this chunk may leave a group short of only one, which its parity can rebuild
+              repairChunks(handleFrame, tid, t);
             }
           } else {
             setMessages(m => [...m, {from: msg.from || 'server', text: JSON.stringify(msg)}]);
@@ -231,13 +685,45 @@ function App(){
         // default: push message (stringified)
         setMessages(m => [...m, {from: msg.from || 'server', text: JSON.stringify(msg)}]);
       }catch(e){
+        setMessages(m => [...m, {from:'server', text: JSON.stringify(msg)}]);
+      }
+    }
+    ws.onmessage = (ev)=>{
+      // log raw incoming frame for debugging
+      try{ console.log('[WS] in', ev.data); }catch(e){}
+      let msg;
+      try{ msg = JSON.parse(ev.data); }
+      catch(e){
         setMessages(m => [...m, {from:'server', text:ev.data}]);
+        return;
       }
+      handleFrame(msg);
+    }
+    ws.onclose = ()=>{
+      setConnected(false);
+      if(wsRef.current !== ws || sess.closing) return;
+      // reconnect with exponential backoff and jitter so a server restart isn't stampeded
+      const delay = Math.min(RECONNECT_MAX_MS, RECONNECT_MIN_MS * 2 ** sess.attempts) * (0.5 + Math.random() / 2);
+      sess.attempts += 1;
+      setMessages(m => [...m, {from:'system', text:`disconnected; reconnecting in ${Math.round(delay)}ms`}]);
+      sess.timer = setTimeout(connect, delay);
     }
-    ws.onclose = ()=>{ setConnected(false); setMessages(m => [...m, {from:'system', text:'disconnected'}]); }
     wsRef.current = ws;
   }
 
+  // root over the (length, crc) of every chunk we kept vs the one the sender computed
+  const verifyReceived = async (tid, sums, fname, digest)=>{
+    if(!digest || !digest.root) return;
+    const leaves = [];
+    for(let i=0;i<(digest.chunks || 0);i++){
+      if(!sums[i]) return; // some chunk came without a checksum: nothing to compare
+      leaves.push(chunkLeaf(sums[i][0], sums[i][1]));
+    }
+    const root = toHex(await merkleRoot(await Promise.all(leaves)));
+    if(root === digest.root) setMessages(m => [...m, {from:'system', text:`Verified ${fname} (${digest.chunks} chunks)`}]);
+    else setMessages(m => [...m, {from:'system', text:`${fname} (${tid}) failed its integrity check: do not trust this copy`}]);
+  };
+
   const sendMsg = (text)=>{
     if(!wsRef.current || wsRef.current.readyState !== WebSocket.OPEN) return;
     const msg = {type:'MSG', from:name, payload:btoa(text)}; // frontend uses base64 payload
@@ -249,6 +735,68 @@ function App(){
   // --- file send ---
   const CHUNK_SIZE = 64 * 1024; // 64KB
   const RETRANSMIT_MS = 3000;
+  const STRIPE_MIN_CHUNKS = 8; // smaller files use one window whatever the stripes setting
+  const STRIPE_BACKLOG = 2; // chunks queued on a stripe beyond what its window can take
+  const STRIPE_STALL_MS = 2 * RETRANSMIT_MS; // a stripe without ACK progress this long loses its queued chunks
+
+  // striped send: each stripe is an entry with its own congestion window, so a high-BDP path
+  // is not limited to what one window keeps in flight. Chunks are handed out as a stripe's
+  // queue drains, so faster stripes carry more; a stripe that stops making progress has its
+  // unsent chunks taken back and its in-flight ones queued again on the others
+  const dispatchStripes = (tid, entry, now)=>{
+    const stripes = entry.stripes.map(k=>sentTransfersRef.current[k]);
+    const delivered = (g)=>{
+      if(entry.done.has(g)) return;
+      entry.done.add(g);
+      delete entry.payloads[g];
+    };
+    for(const s of stripes){
+      // the receiver stores chunks as they come, so SACKed ones are delivered too
+      for(; s.doneUpTo < s.acked_up_to; s.doneUpTo++) delivered(s.chunkIds[s.doneUpTo]);
+      for(const i of (s.cc.sacked || [])) delivered(s.chunkIds[i]);
+      if(s.acked_up_to > s.lastBase){ s.lastBase = s.acked_up_to; s.lastProgress = now; s.avoid = false; }
+      if(s.acked_up_to >= s.total_chunks){ s.lastProgress = now; continue; } // idle, not stalled
+      if(s.avoid || stripes.length < 2 || now - s.lastProgress < STRIPE_STALL_MS) continue;
+      const stolen = [];
+      for(let i=s.nextToSend;i<s.total_chunks;i++){ stolen.push(s.chunkIds[i]); delete s.payloads[i]; }
+      s.total_chunks = s.nextToSend;
+      const hedged = [];
+      for(let i=s.acked_up_to;i<s.nextToSend;i++){
+        const g = s.chunkIds[i];
+        if(!(s.cc.sacked && s.cc.sacked.has(i)) && !entry.hedged.has(g)){ entry.hedged.add(g); hedged.push(g); }
+      }
+      entry.pending.unshift(...hedged, ...stolen); // oldest first: they hold up the end of the file
+      s.avoid = true;
+      s.lastProgress = now;
+      traceEvent(s, 'stall', s.acked_up_to);
+      setMessages(m=>[...m,{from:'system', text:`[stripes] ${s.key} stalled: ${stolen.length} chunks moved, ${hedged.length} re-sent elsewhere`}]);
+    }
+    const next = ()=>{
+      while(entry.pending.length){
+        const g = entry.pending.shift();
+        if(!entry.done.has(g)) return g;
+      }
+      // fresh chunks once sendFile has read them
+      if(entry.nextToSend < entry.total_chunks && entry.payloads[entry.nextToSend]) return entry.nextToSend++;
+      return null;
+    };
+    const backlog = (s)=>s.total_chunks - s.nextToSend;
+    for(const s of stripes.filter(s=>!s.avoid).sort((a,b)=>backlog(a) - backlog(b))){
+      while(backlog(s) < Math.max(STRIPE_BACKLOG, Math.ceil(s.cc.cwnd))){
+        const g = next();
+        if(g == null) break;
+        const i = s.total_chunks++;
+        s.chunkIds[i] = g;
+        s.payloads[i] = entry.payloads[g];
+        s.crcs[i] = entry.crcs[g];
+        entry.owner[g] = [s.key, i];
+      }
+    }
+    if(entry.done.size !== entry.acked_up_to){
+      entry.acked_up_to = entry.done.size;
+      setTransfersProgress(p=>({...p, [tid]: {acked: entry.acked_up_to, total: entry.total_chunks}}));
+    }
+  };
 
   // retransmit monitor
   useEffect(()=>{
@@ -257,15 +805,19 @@ function App(){
       const now = Date.now();
       for(const tid in sentTransfersRef.current){
         const entry = sentTransfersRef.current[tid];
+        if(entry.striped) continue; // its stripes send and resend
+        if(entry.pauseUntil && now < entry.pauseUntil) continue;
         const ack = entry.acked_up_to || 0;
         const total = entry.total_chunks || 0;
-        for(let i=ack;i<total;i++){
+        const sent = Math.min(total, entry.nextToSend ?? total);
+        for(let i=ack;i<sent;i++){
           const last = entry.sentAt && entry.sentAt[i];
           if(!entry.payloads || !entry.payloads[i]) continue; // nothing to resend
+          if(entry.cc && entry.cc.sacked && entry.cc.sacked.has(i)) continue; // receiver already has it
           if(!last || (now - last) > RETRANSMIT_MS){
             // resend chunk
-            const chunkMsg = {type:'FILE_CHUNK', from:name, to: entry.to || null, room: entry.room || null, transfer_id: tid, chunk_index:i, total_chunks: total, payload: entry.payloads[i]};
-            try{ wsRef.current.send(JSON.stringify(chunkMsg)); entry.sentAt[i] = Date.now(); setMessages(m=>[...m,{from:'system', text:`Retransmitted chunk ${i} for ${tid}`}]); }catch(e){console.warn('retransmit failed', e)}
+            const chunkMsg = chunkFrame(tid, entry, i);
+            try{ wsRef.current.send(JSON.stringify(chunkMsg)); entry.sentAt[i] = Date.now(); traceEvent(entry, 'retx', i, CHUNK_SIZE); setMessages(m=>[...m,{from:'system', text:`Retransmitted chunk ${i} for ${tid}`}]); }catch(e){console.warn('retransmit failed', e)}
           }
         }
       }
@@ -281,6 +833,8 @@ function App(){
         for(const tid in sentTransfersRef.current){
           const entry = sentTransfersRef.current[tid];
           if(!entry) continue;
+          if(entry.striped){ dispatchStripes(tid, entry, now); continue; }
+          if(entry.pauseUntil && now < entry.pauseUntil) continue; // throttled by the server
           // initialize cc state
           entry.cc = entry.cc || {cwnd: INITIAL_CWND, ssthresh: INITIAL_SSTHRESH, inFlight: new Set(), nextToSend: 0, lastAck: 0, dupAcks: 0, srtt: 500, rto: 1000};
           const cwndVal = Math.max(1, Math.floor(entry.cc.cwnd));
@@ -289,15 +843,15 @@ function App(){
             const i = entry.nextToSend;
             const payload = entry.payloads && entry.payloads[i];
             if(!payload) break; // nothing prepared yet
-            const chunkMsg = {type:'FILE_CHUNK', from:name, transfer_id: tid, chunk_index:i, total_chunks: entry.total_chunks, payload};
-            if(entry.to) chunkMsg.to = entry.to;
-            if(entry.room) chunkMsg.room = entry.room;
+            const chunkMsg = chunkFrame(tid, entry, i);
             try{
               console.log('[WS] out FILE_CHUNK', {transfer_id: tid, chunk_index: i, to: chunkMsg.to});
               wsRef.current.send(JSON.stringify(chunkMsg));
               entry.sentAt[i] = Date.now();
               entry.cc.inFlight.add(i);
               entry.nextToSend += 1;
+              traceEvent(entry, 'send', i, CHUNK_SIZE);
+              if(entry.fec) addToParity(tid, entry, i, chunkMsg, entry.cc.inFlight.size >= cwndVal);
               setMessages(m=>[...m,{from:'system', text:`[send-loop] sent chunk ${i} for ${tid} (inflight=${entry.cc.inFlight.size}/${cwndVal})`}]);
             }catch(e){ console.warn('send in loop failed', e); break; }
           }
@@ -310,14 +864,13 @@ function App(){
               // timeout -> multiplicative decrease
               entry.cc.ssthresh = Math.max(1, Math.floor(entry.cc.cwnd/2));
               entry.cc.cwnd = 1;
+              traceEvent(entry, 'timeout', entry.acked_up_to || 0);
               // retransmit first unacked (which is entry.acked_up_to)
               const toResend = entry.acked_up_to || 0;
               const p = entry.payloads && entry.payloads[toResend];
               if(p){
-                const chunkMsg = {type:'FILE_CHUNK', from:name, transfer_id: tid, chunk_index: toResend, total_chunks: entry.total_chunks, payload: p};
-                if(entry.to) chunkMsg.to = entry.to;
-                if(entry.room) chunkMsg.room = entry.room;
-                try{ wsRef.current.send(JSON.stringify(chunkMsg)); entry.sentAt[toResend]=Date.now(); setMessages(m=>[...m,{from:'system', text:`[timeout] retransmitted ${toResend} for ${tid}`}]); }catch(e){console.warn('retransmit failed', e)}
+                const chunkMsg = chunkFrame(tid, entry, toResend);
+                try{ wsRef.current.send(JSON.stringify(chunkMsg)); entry.sentAt[toResend]=Date.now(); traceEvent(entry, 'retx', toResend, CHUNK_SIZE); setMessages(m=>[...m,{from:'system', text:`[timeout] retransmitted ${toResend} for ${tid}`}]); }catch(e){console.warn('retransmit failed', e)}
               }
               // reset inFlight to only unacked ones
               entry.cc.inFlight = new Set(Array.from(entry.cc.inFlight).filter(x=> x >= (entry.acked_up_to||0)));
@@ -329,7 +882,7 @@ function App(){
       return ()=>clearInterval(iv);
     }, [name]);
 
-  const sendFile = async (file, to=null, room=null) =>{
+  const sendFile = async (file, to=null, room=null, stripes=1, fec=false) =>{
     if(!wsRef.current || wsRef.current.readyState !== WebSocket.OPEN) return;
     // require an explicit recipient or room for one-to-one/room sends
     if(!to && !room){
@@ -339,16 +892,31 @@ function App(){
     const transfer_id = (crypto && crypto.randomUUID) ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2,8)}`;
     const total_chunks = Math.ceil(file.size / CHUNK_SIZE);
   // register outgoing transfer for ACK tracking + initialize cc and send pointers
-  sentTransfersRef.current[transfer_id] = {meta:{fname:file.name,size:file.size}, total_chunks, acked_up_to:0, payloads:{}, sentAt:{}, to, room, nextToSend:0, cc: {cwnd: INITIAL_CWND, ssthresh: INITIAL_SSTHRESH, inFlight: new Set(), nextToSend:0, lastAck:0, dupAcks:0, srtt:500, rto:1000, rttvar:250}};
-    const meta = {transfer_id, fname: file.name, size: file.size, total_chunks};
+  const newCc = ()=>({cwnd: INITIAL_CWND, ssthresh: INITIAL_SSTHRESH, inFlight: new Set(), nextToSend:0, lastAck:0, dupAcks:0, srtt:500, rto:1000, rttvar:250});
+  sentTransfersRef.current[transfer_id] = {meta:{fname:file.name,size:file.size}, total_chunks, acked_up_to:0, payloads:{}, crcs:{}, sentAt:{}, to, room, nextToSend:0, cc: newCc(), fec};
+    const meta = {transfer_id, fname: file.name, size: file.size, total_chunks, chunk_size: CHUNK_SIZE, checksum: 'crc32'}; // FILE_DIGEST follows the chunks
+    if(stripes > 1 && total_chunks >= STRIPE_MIN_CHUNKS){
+      // the file's entry only holds the chunks read so far; dispatchStripes feeds them to the stripes
+      const entry = sentTransfersRef.current[transfer_id];
+      Object.assign(entry, {striped: true, cc: null, stripes: [], pending: [], done: new Set(), hedged: new Set(), owner: {}});
+      for(let k=0;k<stripes;k++){
+        const key = `${transfer_id}/${k}`;
+        sentTransfersRef.current[key] = {parent: transfer_id, stripe: k, key, total_chunks: 0, acked_up_to: 0, payloads: {}, crcs: {}, sentAt: {}, chunkIds: [], to, room,
+          nextToSend: 0, doneUpTo: 0, lastBase: 0, lastProgress: Date.now(), cc: newCc(), fec};
+        entry.stripes.push(key);
+      }
+      meta.stripes = stripes;
+    }
     // only include to/room keys when present to avoid server interpreting null as absent
     const metaMsg = {type:'FILE_META', from: name, meta};
     if(to) metaMsg.to = to;
     if(room) metaMsg.room = room;
+    sentTransfersRef.current[transfer_id].metaMsg = metaMsg; // resent if the server throttles it
   console.log('[WS] out FILE_META', metaMsg);
   wsRef.current.send(JSON.stringify(metaMsg));
     setMessages(m => [...m, {from:'you', text:`Sending file ${file.name} (${file.size} bytes) id=${transfer_id}`}]);
 
+    const leaves = [];
     for(let i=0;i<total_chunks;i++){
       const start = i * CHUNK_SIZE;
       const end = Math.min((i+1)*CHUNK_SIZE, file.size);
@@ -361,15 +929,45 @@ function App(){
       const b64 = btoa(binary);
   // store payload for possible retransmit; actual sending is handled by sender loop (cwnd-aware)
   const entry = sentTransfersRef.current[transfer_id];
+  entry.crcs[i] = crc32(u8);
+  leaves.push(chunkLeaf(u8.length, entry.crcs[i]));
   entry.payloads[i] = b64;
   // mark not-yet-sent; sender loop will set sentAt[] when it sends
   setMessages(m => [...m, {from:'you', text:`Queued chunk ${i+1}/${total_chunks}`}]);
       // small throttle so UI remains responsive
       await new Promise(r=>setTimeout(r, 10));
     }
+    // whole-file digest: Merkle root over the chunk checksums (backend/integrity.py)
+    const digest = {alg: 'crc32', chunk_size: CHUNK_SIZE, chunks: total_chunks, root: toHex(await merkleRoot(await Promise.all(leaves)))};
+    const digestMsg = {type:'FILE_DIGEST', from: name, transfer_id, digest};
+    if(to) digestMsg.to = to;
+    if(room) digestMsg.room = room;
+    try{ wsRef.current.send(JSON.stringify(digestMsg)); }catch(e){ console.warn('digest send failed', e); }
     setMessages(m => [...m, {from:'you', text:`File send queued: ${file.name}`}]);
   }
 
+  // page backwards through stored DM history with the server's keyset cursor
+  const loadHistory = async (peer)=>{
+    if(!peer) return;
+    const cursors = historyCursorRef.current;
+    if(cursors[peer] === null) return;
+    const token = sessionRef.current.token;
+    if(!token) return;
+    const params = new URLSearchParams({peer, session: token, limit: '50'});
+    if(cursors[peer]) params.set('before', cursors[peer]);
+    try{
+      const res = await fetch(`http://localhost:9009/history?${params}`);
+      const j = await res.json();
+      cursors[peer] = j.next || null;
+      const older = (j.messages || []).map(h=>{
+        let text = h.payload || '';
+        try{ text = atob(text); }catch(e){}
+        return {from: h.from, text, ts: h.ts};
+      });
+      setMessages(m => [...older, ...m]);
+    }catch(e){ console.warn('could not load history', e); }
+  };
+
   return (
     <div style={{padding:20}}>
       <h2>ChatChat (demo)</h2>
@@ -380,11 +978,15 @@ function App(){
           <option value="">(none)</option>
           {clientsList.filter(c=>c!==name).map(c=>(<option key={c} value={c}>{c}</option>))}
         </select></label>
+        <button style={{marginLeft:4}} onClick={()=>loadHistory(selectedRecipient)} disabled={!connected || !selectedRecipient}>History</button>
         <label style={{marginLeft:10}}>File: <input id="file-input" type="file" disabled={!connected} /></label>
         <button style={{marginLeft:8}} onClick={()=>{
           const el = document.getElementById('file-input');
-          if(el && el.files && el.files[0]) sendFile(el.files[0], selectedRecipient || null);
+          if(el && el.files && el.files[0]) sendFile(el.files[0], selectedRecipient || null, null, stripes, fec);
         }} disabled={!connected}>Send File</button>
+        <label style={{marginLeft:10}}>Stripes: <input type="number" min={1} max={8} value={stripes} style={{width:40}}
+          onChange={e=>setStripes(Math.max(1, Math.min(8, parseInt(e.target.value, 10) || 1)))} /></label>
+        <label style={{marginLeft:10}}><input type="checkbox" checked={fec} onChange={e=>setFec(e.target.checked)} /> FEC</label>
       </div>
       <div style={{marginTop:10}}>
         <MessageList messages={messages} />
@@ -394,7 +996,7 @@ function App(){
           {Object.entries(transfersProgress).map(([tid, st])=>{
             const pct = st.total ? Math.round((st.acked||0)/st.total*100) : 0;
             return (<div key={tid} style={{marginBottom:6}}>
-              <div style={{fontSize:12}}>{tid} — {st.acked||0}/{st.total||'?'} ({pct}%)</div>
+              <div style={{fontSize:12}}>{tid} — {st.acked||0}/{st.total||'?'} ({pct}%) <a href="#" onClick={e=>{e.preventDefault(); downloadTrace(tid);}}>trace</a></div>
               <div style={{background:'#333', height:8, borderRadius:4}}><div style={{width:`${pct}%`, height:'100%', background:'#46d'}} /></div>
             </div>)
           })}
@@ -0,0 +1,38 @@
+# Regression tests for backend/rate_limit.py
+from backend.rate_limit import RateLimiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def meta(tid):
+    return {'type': 'FILE_META', 'meta': {'transfer_id': tid}}
+
+
+def test_file_meta_is_admitted_when_bytes_run_out():
+    rl = RateLimiter(clock=Clock())
+    # drain the user's byte bucket
+    rl.user_bytes.charge('alice', rl.user_bytes.burst * 2)
+    assert rl.check('alice', {'type': 'FILE_CHUNK', 'transfer_id': 'x'}, 1000)['why'] == 'byte rate'
+    # nothing resends a dropped FILE_META on its own: it goes through, and its bytes are charged
+    debt = rl.user_bytes.buckets['alice'].tokens
+    for i in range(rl.max_transfers):
+        assert rl.check('alice', meta(f't{i}'), 200) is None
+    assert rl.user_bytes.buckets['alice'].tokens < debt
+    assert rl.active['alice'] == {f't{i}' for i in range(rl.max_transfers)}
+
+
+def test_refused_file_meta_takes_no_slot():
+    rl = RateLimiter(clock=Clock())
+    for i in range(rl.max_transfers):
+        assert rl.check('alice', meta(f't{i}'), 200) is None
+    refused = rl.check('alice', meta('extra'), 200)
+    assert refused['why'] == 'concurrent transfers' and refused['transfer_id'] == 'extra'
+    assert 'extra' not in rl.active['alice']
+    rl.transfer_finished('alice', 't0')
+    assert rl.check('alice', meta('extra'), 200) is None
@@ -0,0 +1,15 @@
+# Regression tests for backend/scheduler.py
+from backend.scheduler import DeficitRoundRobin
+
+
+def test_nested_drr_checks_credit_against_the_frame_it_pops():
+    outer = DeficitRoundRobin(60, flow_factory=lambda: DeficitRoundRobin(100))
+    # the inner round robin skips X's big frame (100 credit < 250) and sends Y's
+    outer.push('bulk', 'x', 250, 'X')
+    outer.push('bulk', 'y', 50, 'Y')
+    assert outer.peek_size() == 50
+    assert outer.pop() == ('y', 50)
+    # one quantum granted, charged for the frame that went out
+    assert outer.deficit['bulk'] == 10
+    assert outer.pop() == ('x', 250)
+    assert len(outer) == 0
@@ -0,0 +1,68 @@
+# Regression tests for client_tcp.Sender loss recovery across streams sharing one cc
+import json
+import struct
+
+import pytest
+
+import client_tcp
+from client_tcp import MSS, Sender
+
+
+class FakeConn:
+    def __init__(self):
+        self.frames = []
+
+    def sendall(self, raw):
+        self.frames.append(json.loads(raw[4:]))
+        assert struct.unpack('!I', raw[:4])[0] == len(raw) - 4
+
+    def close(self):
+        pass
+
+
+def sender(cc):
+    s = Sender(FakeConn(), 'me', cc=cc, pacing=False, interactive=False, fec=False)
+    s.cc.cwnd = s.cc.ssthresh = 64 * MSS   # room for every segment, before and after a cut
+    s.rwnd = 1 << 20
+    s.send_chat_message(to='a', text='x' * (8 * MSS))
+    s.send_chat_message(to='b', text='x' * (16 * MSS))
+    return s
+
+
+def sends(s, sid, seq):
+    return sum(1 for f in s.conn.frames if f.get('stream') == sid and f.get('seq') == seq)
+
+
+def lose_head(s, sid):
+    # segments 2-4 SACKed, the first one missing: three dup ACKs' worth of evidence
+    s.handle_ack(1, sack=[[1 + MSS, 1 + 4 * MSS]], stream=sid)
+
+
+@pytest.mark.parametrize('cc', sorted(client_tcp.ALGORITHMS))
+def test_fast_retransmit_is_per_stream(cc):
+    s = sender(cc)
+    assert sends(s, 'dm:a', 1) == 1 and sends(s, 'dm:b', 1) == 1
+    lose_head(s, 'dm:a')
+    assert s.streams['dm:a'].recovery_point is not None
+    assert sends(s, 'dm:a', 1) == 2
+    cwnd = s.cc.cwnd
+    # another stream losing a segment while the cc is already recovering still retransmits
+    lose_head(s, 'dm:b')
+    assert s.streams['dm:b'].recovery_point is not None
+    assert sends(s, 'dm:b', 1) == 2
+    # ... without cutting the shared window a second time
+    assert s.cc.cwnd >= cwnd
+
+
+@pytest.mark.parametrize('cc', ['newreno', 'cubic', 'bbr'])
+def test_other_stream_acks_do_not_end_recovery(cc):
+    s = sender(cc)
+    lose_head(s, 'dm:a')
+    assert s.cc.in_recovery
+    # dm:b's seqs are in their own space: its ACK past dm:a's last seq must not look like
+    # the full ACK that ends dm:a's recovery
+    s.handle_ack(1 + 10 * MSS, stream='dm:b')
+    assert s.cc.in_recovery
+    s.handle_ack(1 + 8 * MSS, stream='dm:a')
+    s.handle_ack(1 + 16 * MSS, stream='dm:b')
+    assert not s.cc.in_recovery
@@ -0,0 +1,190 @@
+# impair_bench.py
+# Goodput of a real client_tcp.py file transfer through tools/impair_proxy.py under each
+# impairment profile. A minimal frame relay stands in for the TCP chat server (it only
+# answers CONNECT and routes frames by 'to'); alice and bob are client_tcp Sender/Receiver
+# pairs running in this process, both connected through the proxy, so every frame between
+# them crosses the profile twice (alice's uplink, then bob's downlink). With --stripes,
+# alice sends over that many connections (client_tcp.StripedTransfer); the proxy impairs
+# and rate-caps each connection on its own, as separate TCP flows would see. --fec on
+# turns on alice's parity groups (common/fec.py).
+#
+#   python tools/impair_bench.py --profiles clean,lan,wifi,lossy --size 262144 --cc newreno,cubic
+#   python tools/impair_bench.py --profiles xregion --size 4194304 --stripes 1,2,4,8
+#   python tools/impair_bench.py --profiles lossy,mobile --fec off,on
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import secrets
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import client_tcp
+from impair_proxy import PROFILES, ImpairProxy, Script
+
+
+class Relay:
+    def __init__(self):
+        self.clients = {}
+
+    async def handle(self, reader, writer):
+        name = None
+        try:
+            while True:
+                hdr = await reader.readexactly(4)
+                body = await reader.readexactly(struct.unpack('!I', hdr)[0])
+                msg = json.loads(body)
+                if name is None:
+                    name = msg.get('from')
+                    self.clients[name] = writer
+                    raw = json.dumps({'type': 'CONNECTED', 'you': name, 'session': secrets.token_urlsafe(8),
+                                      'resumed': False}).encode()
+                    writer.write(struct.pack('!I', len(raw)) + raw)
+                    continue
+                peer = self.clients.get(msg.get('to'))
+                if peer is not None:
+                    peer.write(hdr + body)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if self.clients.get(name) is writer:
+                del self.clients[name]
+            writer.close()
+
+
+class Network:
+    """Relay + proxy on an event loop in a background thread."""
+    def __init__(self, profile, seed):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.proxy = None
+        self.port = asyncio.run_coroutine_threadsafe(self._start(profile, seed), self.loop).result()
+
+    async def _start(self, profile, seed):
+        relay = await asyncio.start_server(Relay().handle, '127.0.0.1', 0, limit=2 ** 24)
+        upstream = relay.sockets[0].getsockname()[:2]
+        self.proxy = ImpairProxy(upstream, Script({'profile': profile}), seed=seed)
+        server = await self.proxy.serve('127.0.0.1', 0)
+        self.servers = (relay, server)
+        return server.sockets[0].getsockname()[1]
+
+    def close(self):
+        async def stop():
+            for s in self.servers:
+                s.close()
+            # the clients' sockets are closed: handlers see EOF and finish on their own
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            if tasks:
+                await asyncio.wait(tasks, timeout=2)
+        asyncio.run_coroutine_threadsafe(stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def client(name, cc, fec=False):
+    sock, resp = client_tcp.connect_session(name, {'token': None, 'last_seq': 0})
+    sender = client_tcp.Sender(sock, name, cc=cc, fec=fec)
+    receiver = client_tcp.Receiver(sock, name, sender)
+
+    def recv_loop():
+        try:
+            while True:
+                m = client_tcp.recv_msg(sock)
+                if m is None:
+                    return
+                mtype = m.get('type')
+                if mtype in ('MSG', 'FILE_CHUNK'):
+                    if 'ack' in m:
+                        sender.handle_ack(m['ack'], adv_rwnd=m.get('rwnd'), sack=m.get('sack'), stream=m.get('ack_stream'),
+                                          repaired=m.get('repaired'))
+                    receiver.process_segment(m)
+                elif mtype == 'FILE_META':
+                    receiver.on_file_meta(m.get('from'), m.get('meta') or {})
+                elif mtype == 'FILE_DIGEST':
+                    receiver.on_file_digest(m.get('from'), m.get('transfer_id'), m.get('digest') or {})
+                elif mtype == 'FEC':
+                    receiver.on_parity(m)
+                elif mtype == 'ACK':
+                    sender.handle_ack(m.get('ack', 0), adv_rwnd=m.get('rwnd'), sack=m.get('sack'), stream=m.get('stream'),
+                                      repaired=m.get('repaired'))
+        except OSError:
+            return   # the run is over: the socket was closed under a blocked recv or a send
+
+    threading.Thread(target=recv_loop, daemon=True).start()
+    return sock, sender
+
+
+def run(profile, cc, size, timeout, seed, stripes=1, fec=False):
+    net = Network(profile, seed)
+    workdir = tempfile.mkdtemp(prefix='impair-bench-')
+    client_tcp.PORT = net.port
+    client_tcp.RECV_DIR = workdir
+    src = os.path.join(workdir, 'payload.bin')
+    data = os.urandom(size)
+    with open(src, 'wb') as f:
+        f.write(data)
+    dest = os.path.join(workdir, 'recv_from_alice_payload.bin')
+    socks = []
+    striped = None
+    try:
+        a_sock, alice = client('alice', cc, fec)
+        b_sock, _ = client('bob', cc)
+        socks = [a_sock, b_sock]
+        t0 = time.perf_counter()
+        striped = alice.send_file(src, to='bob', stripes=stripes)
+        while not os.path.exists(dest) and time.perf_counter() - t0 < timeout:
+            time.sleep(0.01)
+        elapsed = time.perf_counter() - t0
+        ok = os.path.exists(dest)
+        if ok:
+            with open(dest, 'rb') as f:
+                ok = f.read() == data
+            status = 'ok' if ok else 'CORRUPT'
+        else:
+            status = 'timeout'
+        return {'status': status, 'elapsed': elapsed, 'goodput': size / elapsed if ok else 0.0,
+                'stats': net.proxy.report()}
+    finally:
+        if striped is not None:
+            striped.join(5)   # its last ACKs, then it closes the extra connections itself
+        for s in socks:
+            with contextlib.suppress(OSError):
+                s.shutdown(socket.SHUT_RDWR)   # wakes the recv thread and sends FIN through the proxy
+                s.close()
+        net.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profiles', default='clean,lan,wifi,lossy,bursty,3g')
+    parser.add_argument('--cc', default=client_tcp.CC_ALGORITHM, help='comma-separated algorithms')
+    parser.add_argument('--size', type=int, default=256 * 1024, help='file bytes per transfer')
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--stripes', default='1', help='comma-separated connection counts per transfer')
+    parser.add_argument('--fec', default='off', help='comma-separated: off, on')
+    parser.add_argument('-v', '--verbose', action='store_true', help='show proxy counters per run')
+    args = parser.parse_args()
+    for p in args.profiles.split(','):
+        if p not in PROFILES:
+            parser.error(f'unknown profile {p!r}')
+    out = sys.stdout
+    print(f"{'profile':<10} {'cc':<8} {'stripes':>7} {'fec':<4} {'status':<8} {'seconds':>8} {'KiB/s':>8}", file=out)
+    # the clients print per segment; keep that (and their stdin command loop) out of the way
+    sys.stdin = io.StringIO()
+    for profile in args.profiles.split(','):
+        for cc in args.cc.split(','):
+            for stripes in (int(n) for n in args.stripes.split(',')):
+                for fec in args.fec.split(','):
+                    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                        r = run(profile, cc, args.size, args.timeout, args.seed, stripes, fec == 'on')
+                    print(f"{profile:<10} {cc:<8} {stripes:>7} {fec:<4} {r['status']:<8} {r['elapsed']:>8.2f} "
+                          f"{r['goodput'] / 1024:>8.1f}", file=out)
+                    if args.verbose:
+                        print(f"    {r['stats']}", file=out)
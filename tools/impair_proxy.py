@@ -0,0 +1,364 @@
+# impair_proxy.py
+# Userspace network impairment between a client and a server (no root, no netem).
+# It parses the stream into whole frames - the 4-byte length-prefixed JSON of
+# common/framing.py (--mode frames, client_tcp.py) or WebSocket frames (--mode ws, the
+# React client and backend/app.py; the HTTP upgrade passes through untouched) - and
+# applies delay, jitter, loss, reordering, duplication and a bandwidth cap per frame,
+# separately for each direction, so dropping or reordering never corrupts the stream.
+# Damage is opt-in ('corrupt'): one base64 character of a frame's "payload" is changed,
+# which keeps the frame parseable and leaves it to the chunk checksums to notice.
+#
+# Frames a client sends once and never retransmits (CONNECT, FILE_META, JOIN...) are
+# spared from loss, reordering and duplication, but still share the delay and bandwidth;
+# so are WebSocket control frames and fragments. --spare changes the list.
+#
+#   python tools/impair_proxy.py --listen 127.0.0.1:9010 --upstream 127.0.0.1:9009 --profile wifi
+#   python tools/impair_proxy.py --mode ws --listen :8010 --upstream 127.0.0.1:8000 --delay 50 --loss 0.02
+#   python tools/impair_proxy.py --script phases.json
+#
+# Profiles are dicts of delay/jitter/reorder_ms (ms), loss, reorder, duplicate and
+# corrupt (probabilities; WebSocket frames are only damaged server -> client, client
+# frames are masked), ge ([p, r, loss_good, loss_bad] Gilbert-Elliott), rate (Mbit/s) and
+# queue (bytes waiting for the bandwidth cap before drop-tail). Values apply to both
+# directions; an 'up' (client -> server) or 'down' dict overrides one of them. A --script
+# file is either one such dict or a timeline:
+#   {"repeat": 60, "phases": [{"at": 0, "profile": "wifi"},
+#                             {"at": 20, "loss": 0.3, "down": {"rate": 0.5}},
+#                             {"at": 40, "profile": "clean"}]}
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import struct
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tcp_simulator import Bernoulli, GilbertElliott
+
+DEFAULTS = {'delay': 0.0, 'jitter': 0.0, 'loss': 0.0, 'ge': None, 'reorder': 0.0, 'reorder_ms': 20.0,
+            'duplicate': 0.0, 'corrupt': 0.0, 'rate': None, 'queue': 256 * 1024}
+PROFILES = {
+    'clean': {},
+    'lan': {'delay': 1, 'jitter': 0.5},
+    'wifi': {'delay': 5, 'jitter': 10, 'loss': 0.005, 'reorder': 0.01},
+    'dsl': {'delay': 20, 'jitter': 2, 'rate': 16, 'up': {'rate': 1}},
+    '3g': {'delay': 100, 'jitter': 30, 'loss': 0.01, 'rate': 2, 'queue': 64 * 1024},
+    'lossy': {'delay': 20, 'loss': 0.05},
+    'mobile': {'delay': 40, 'jitter': 10, 'loss': 0.1},
+    'noisy': {'delay': 5, 'corrupt': 0.01},
+    'bursty': {'delay': 20, 'ge': [0.01, 0.25]},
+    'satellite': {'delay': 300, 'jitter': 5, 'loss': 0.005, 'rate': 10},
+    'xregion': {'delay': 75, 'jitter': 2, 'loss': 0.001},
+}
+SPARE = ('CONNECT', 'CONNECTED', 'FILE_META', 'FILE_DIGEST', 'FILE_READY', 'JOIN', 'LEAVE', 'ERROR')
+TYPE_RE = re.compile(rb'"type"\s*:\s*"([A-Za-z_]+)"')
+HIGH_WATER = 1024 * 1024    # stop reading a side while this much is buffered for the other
+
+
+class Impairment:
+    def __init__(self, **kw):
+        cfg = dict(DEFAULTS, **kw)
+        self.delay = cfg['delay'] / 1000
+        self.jitter = cfg['jitter'] / 1000
+        self.loss = cfg['loss']
+        self.ge = cfg['ge']
+        self.reorder = cfg['reorder']
+        self.reorder_gap = cfg['reorder_ms'] / 1000
+        self.duplicate = cfg['duplicate']
+        self.corrupt = cfg['corrupt']
+        self.rate = cfg['rate'] * 1e6 / 8 if cfg['rate'] else None
+        self.queue = cfg['queue']
+
+    def loss_model(self, rng):
+        if self.ge:
+            return GilbertElliott(*self.ge, rng=rng)
+        return Bernoulli(self.loss, rng) if self.loss else None
+
+
+def resolve(spec, base=None, overrides=None):
+    """{'up': Impairment, 'down': Impairment} from a profile dict (see module comment)."""
+    spec = dict(spec)
+    name = spec.pop('profile', base or 'clean')
+    if name not in PROFILES:
+        raise ValueError(f'unknown profile {name!r} (choose from {", ".join(PROFILES)})')
+    layers = [PROFILES[name], overrides or {}, spec]
+    out = {}
+    for side in ('up', 'down'):
+        cfg = {}
+        for layer in layers:
+            cfg.update({k: v for k, v in layer.items() if k not in ('up', 'down', 'at')})
+            cfg.update(layer.get(side, {}))
+        out[side] = Impairment(**cfg)
+    return out
+
+
+class Script:
+    """Impairments as a function of time since the proxy started."""
+    def __init__(self, spec, base=None, overrides=None):
+        phases = spec.get('phases') if 'phases' in spec else [dict(spec, at=0)]
+        self.phases = sorted(((float(p.get('at', 0)), resolve(p, base, overrides)) for p in phases),
+                             key=lambda p: p[0])
+        self.repeat = spec.get('repeat')
+        self.start = time.monotonic()
+
+    def current(self):
+        t = time.monotonic() - self.start
+        if self.repeat:
+            t %= self.repeat
+        cur = self.phases[0][1]
+        for at, imp in self.phases:
+            if at > t:
+                break
+            cur = imp
+        return cur
+
+
+def frame_type(sample, whole=None):
+    m = TYPE_RE.search(sample) or (TYPE_RE.search(whole) if whole is not None else None)
+    return m.group(1).decode() if m else ''
+
+
+def unmask(data, mask):
+    n = len(data)
+    key = (mask * (n // 4 + 1))[:n]
+    return (int.from_bytes(data, 'big') ^ int.from_bytes(key, 'big')).to_bytes(n, 'big')
+
+
+async def read_length_prefixed(reader):
+    hdr = await reader.readexactly(4)
+    (n,) = struct.unpack('!I', hdr)
+    body = await reader.readexactly(n)
+    return hdr + body, frame_type(body[:256], body)
+
+
+async def read_ws(reader):
+    head = await reader.readexactly(2)
+    b0, b1 = head
+    n = b1 & 0x7f
+    ext = b''
+    if n == 126:
+        ext = await reader.readexactly(2)
+        (n,) = struct.unpack('!H', ext)
+    elif n == 127:
+        ext = await reader.readexactly(8)
+        (n,) = struct.unpack('!Q', ext)
+    mask = await reader.readexactly(4) if b1 & 0x80 else b''
+    payload = await reader.readexactly(n)
+    raw = head + ext + mask + payload
+    op = b0 & 0x0f
+    if op not in (1, 2) or not b0 & 0x80:
+        return raw, None   # control frame or part of a fragmented message: pass through
+    sample = payload[:256]
+    if mask:
+        sample = unmask(sample, mask)
+    ftype = frame_type(sample)
+    if not ftype and len(payload) > 256:
+        ftype = frame_type(unmask(payload, mask) if mask else payload)
+    return raw, ftype
+
+
+def damage(raw, rng):
+    """Change one base64 character of the frame's "payload"; None if it has none to change."""
+    start = raw.find(b'"payload":"')
+    if start < 0:
+        return None
+    start += len(b'"payload":"')
+    end = raw.find(b'"', start)
+    if end - start < 8:
+        return None
+    i = rng.randrange(start, end - 4)   # clear of the '=' padding
+    c = b'B' if raw[i] == ord('A') else b'A'
+    return raw[:i] + c + raw[i + 1:]
+
+
+class Pipe:
+    """One direction of one connection: frames are scheduled for delivery at their
+    impaired arrival time with loop.call_at, in arrival order."""
+    def __init__(self, side, writer, script, rng, stats, spare):
+        self.side = side
+        self.writer = writer
+        self.script = script
+        self.rng = rng
+        self.stats = stats
+        self.spare = spare
+        self.loop = asyncio.get_running_loop()
+        self.busy_until = 0.0
+        self.backlog = deque()     # (serialization done time, bytes) for the queue limit
+        self.queued = 0
+        self.last_arrival = 0.0
+        self.last_scheduled = 0.0
+        self.imp = None
+        self.model = None
+
+    def _count(self, key, n=1):
+        self.stats[key] = self.stats.get(key, 0) + n
+
+    def push(self, raw, ftype):
+        imp = self.script.current()[self.side]
+        if imp is not self.imp:
+            # new phase: fresh loss state (a Gilbert-Elliott burst does not carry over)
+            self.imp, self.model = imp, imp.loss_model(self.rng)
+        now = self.loop.time()
+        size = len(raw)
+        self._count('frames')
+        self._count('bytes', size)
+        exempt = ftype is None or ftype in self.spare
+        if not exempt and self.model is not None and self.model.lost():
+            self._count('dropped_loss')
+            return
+        if not exempt and imp.corrupt and self.rng.random() < imp.corrupt:
+            damaged = damage(raw, self.rng)
+            if damaged is not None:
+                raw = damaged
+                self._count('corrupted')
+        q = self.backlog
+        while q and q[0][0] <= now:
+            self.queued -= q.popleft()[1]
+        if imp.rate:
+            if not exempt and self.queued + size > imp.queue:
+                self._count('dropped_queue')
+                return
+            done = max(now, self.busy_until) + size / imp.rate
+            self.busy_until = done
+            q.append((done, size))
+            self.queued += size
+        else:
+            done = now
+        arrive = done + imp.delay
+        if imp.jitter:
+            arrive += self.rng.uniform(0, imp.jitter)
+        if not exempt and imp.reorder and self.rng.random() < imp.reorder:
+            # held back so frames sent after it overtake it
+            arrive = max(arrive, self.last_arrival) + imp.reorder_gap
+            self._count('reordered')
+        else:
+            arrive = max(arrive, self.last_arrival)
+            self.last_arrival = arrive
+        self.loop.call_at(arrive, self._deliver, raw)
+        if not exempt and imp.duplicate and self.rng.random() < imp.duplicate:
+            self.loop.call_at(arrive + 0.0001, self._deliver, raw)
+            self._count('duplicated')
+        self.last_scheduled = max(self.last_scheduled, arrive + 0.0001)
+
+    def _deliver(self, raw):
+        if not self.writer.is_closing():
+            self.writer.write(raw)
+            self._count('delivered')
+
+    async def drain(self):
+        # wait out everything still scheduled, then half-close towards the peer
+        delay = self.last_scheduled - self.loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if not self.writer.is_closing():
+            try:
+                self.writer.write_eof()
+            except (OSError, RuntimeError):
+                self.writer.close()
+
+
+class ImpairProxy:
+    def __init__(self, upstream, script, mode='frames', seed=None, spare=SPARE):
+        self.upstream = upstream
+        self.script = script
+        self.mode = mode
+        self.rng = random.Random(seed)
+        self.spare = set(spare)
+        self.stats = {'up': {}, 'down': {}}
+        self.connections = 0
+
+    async def _pump(self, reader, pipe, handshake):
+        read = read_ws if self.mode == 'ws' else read_length_prefixed
+        try:
+            if handshake:
+                # HTTP upgrade request / 101 response
+                pipe.writer.write(await reader.readuntil(b'\r\n\r\n'))
+            while True:
+                raw, ftype = await read(reader)
+                pipe.push(raw, ftype)
+                transport = pipe.writer.transport
+                if transport.get_write_buffer_size() > HIGH_WATER:
+                    await pipe.writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        await pipe.drain()
+
+    async def handle(self, c_reader, c_writer):
+        try:
+            u_reader, u_writer = await asyncio.open_connection(*self.upstream)
+        except OSError as e:
+            print(f'[PROXY] upstream {self.upstream[0]}:{self.upstream[1]} unreachable: {e}')
+            c_writer.close()
+            return
+        self.connections += 1
+        up = Pipe('up', u_writer, self.script, self.rng, self.stats['up'], self.spare)
+        down = Pipe('down', c_writer, self.script, self.rng, self.stats['down'], self.spare)
+        ws = self.mode == 'ws'
+        await asyncio.gather(self._pump(c_reader, up, ws), self._pump(u_reader, down, ws))
+        for w in (u_writer, c_writer):
+            w.close()
+
+    async def serve(self, host, port):
+        return await asyncio.start_server(self.handle, host, port, limit=2 ** 24)
+
+    def report(self):
+        keys = ('frames', 'bytes', 'delivered', 'dropped_loss', 'dropped_queue', 'reordered', 'duplicated', 'corrupted')
+        return '  '.join(f"{side}: " + ' '.join(f'{k}={self.stats[side].get(k, 0)}' for k in keys)
+                         for side in ('up', 'down'))
+
+
+def hostport(s):
+    host, _, port = s.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+async def main(args):
+    overrides = {k: getattr(args, k) for k in ('delay', 'jitter', 'loss', 'ge', 'reorder', 'reorder_ms',
+                                               'duplicate', 'corrupt', 'rate', 'queue') if getattr(args, k) is not None}
+    if args.script:
+        with open(args.script) as f:
+            spec = json.load(f)
+    else:
+        spec = {}
+    script = Script(spec, args.profile, overrides)
+    spare = [t for t in args.spare.split(',') if t] if args.spare is not None else SPARE
+    proxy = ImpairProxy(hostport(args.upstream), script, args.mode, args.seed, spare)
+    host, port = hostport(args.listen)
+    server = await proxy.serve(host, port)
+    print(f'[PROXY] {args.mode} {host}:{port} -> {args.upstream} profile={args.profile} '
+          f'{"script=" + args.script if args.script else ""}')
+    async with server:
+        while True:
+            await asyncio.sleep(args.stats)
+            print(f'[PROXY] {proxy.report()}')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--listen', default='127.0.0.1:9010')
+    parser.add_argument('--upstream', default='127.0.0.1:9009')
+    parser.add_argument('--mode', choices=('frames', 'ws'), default='frames')
+    parser.add_argument('--profile', default='clean', choices=sorted(PROFILES))
+    parser.add_argument('--script', metavar='JSON', help='profile dict or timeline of phases')
+    parser.add_argument('--delay', type=float, help='one-way delay, ms')
+    parser.add_argument('--jitter', type=float, help='extra delay, uniform 0..N ms')
+    parser.add_argument('--loss', type=float)
+    parser.add_argument('--ge', type=lambda s: [float(v) for v in s.split(',')], metavar='P,R[,LG,LB]')
+    parser.add_argument('--reorder', type=float, help='probability a frame is held back')
+    parser.add_argument('--reorder-ms', dest='reorder_ms', type=float, help='how long it is held')
+    parser.add_argument('--duplicate', type=float)
+    parser.add_argument('--corrupt', type=float, help="probability a frame's payload is damaged")
+    parser.add_argument('--rate', type=float, help='bandwidth cap, Mbit/s')
+    parser.add_argument('--queue', type=int, help='bytes queued behind the cap before drops')
+    parser.add_argument('--spare', help=f"frame types never dropped (default {','.join(SPARE)})")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--stats', type=float, default=10.0, help='seconds between stats lines')
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args))
+    except KeyboardInterrupt:
+        pass
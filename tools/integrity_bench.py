@@ -0,0 +1,105 @@
+# integrity_bench.py
+# What chunk checksums and the Merkle digest (backend/integrity.py) cost, as a share of
+# the CPU a transfer spends anyway.
+#   frame path: per chunk, the sender's base64 + JSON encode and the server's (or
+#     receiver's) JSON decode + base64 decode, with and without checksum + leaf hash,
+#     for each checksum available here (crc32c only with the crc32c package installed).
+#     A floor, not a transfer: no socket, scheduling or storage work is counted, so the
+#     share shown is the most the checksums could ever take.
+#   end to end: process CPU of a real client_tcp.py transfer through tools/impair_bench.py's
+#     relay (best of --runs), against the integrity work that transfer does: a checksum per
+#     segment on each side plus the digest over the file on each side, timed on its own.
+#     Timer and thread scheduling move a whole transfer's CPU by 10% or more between runs,
+#     far more than the checksums cost, so an on/off difference would measure noise.
+#
+#   python tools/integrity_bench.py --sizes 2048,16384,65536 --e2e-size 1048576
+import argparse
+import base64
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.integrity import CHECKSUMS, StreamDigest, checksum, checksum_ok, leaf
+
+BUDGET = 0.05   # share of a real transfer's CPU (the end-to-end figure) the checksums may take;
+                # the frame-path share is an upper bound at each chunk size, not held to it
+
+
+def per_call(stmt, ns, number):
+    return min(timeit.repeat(stmt, number=number, repeat=5, globals=ns)) / number
+
+
+def frame_path(size, alg, number):
+    data = os.urandom(size)
+    crc = checksum(data, alg)
+    frame = json.dumps({'type': 'FILE_CHUNK', 'from': 'alice', 'to': 'bob', 'transfer_id': 'x' * 36,
+                        'chunk_index': 7, 'total_chunks': 100, 'payload': base64.b64encode(data).decode('ascii'),
+                        'crc': crc})
+    # the timed statements see only these names, so every import they use is listed here
+    ns = dict(json=json, base64=base64, checksum=checksum, checksum_ok=checksum_ok, leaf=leaf,
+              data=data, crc=crc, frame=frame, alg=alg)
+    send = per_call("json.dumps({'type': 'FILE_CHUNK', 'payload': base64.b64encode(data).decode('ascii')})", ns, number)
+    recv = per_call("base64.b64decode(json.loads(frame)['payload'])", ns, number)
+    send_extra = per_call('leaf(len(data), checksum(data, alg))', ns, number)
+    recv_extra = per_call('checksum_ok(data, crc, alg); leaf(len(data), crc)', ns, number)
+    return send, send_extra, recv, recv_extra
+
+
+def integrity_work(data, alg, mss, chunk_size):
+    # what client_tcp does for one file: sender and receiver each checksum every segment
+    # and build the digest over every chunk
+    t0 = time.process_time()
+    for i in range(0, len(data), mss):
+        seg = data[i:i + mss]
+        checksum_ok(seg, checksum(seg, alg), alg)
+    for _ in range(2):
+        d = StreamDigest(chunk_size, alg)
+        d.update(data)
+        d.digest()
+    return time.process_time() - t0
+
+
+def end_to_end(size, runs):
+    import client_tcp
+    import impair_bench
+    sys.stdin = io.StringIO()   # keep the clients' command loop out of the way
+    transfer = None
+    for seed in range(runs):
+        t0 = time.process_time()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            r = impair_bench.run('clean', client_tcp.CC_ALGORITHM, size, 120.0, seed)
+        cpu = time.process_time() - t0
+        if r['status'] != 'ok':
+            raise SystemExit(f'transfer: {r["status"]}')
+        transfer = cpu if transfer is None else min(transfer, cpu)
+    data = os.urandom(size)
+    work = min(integrity_work(data, client_tcp.CHECKSUM, client_tcp.MSS, client_tcp.FILE_CHUNK_SIZE)
+               for _ in range(runs))
+    return transfer, work
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='2048,16384,65536', help='chunk sizes in bytes')
+    parser.add_argument('--number', type=int, default=500, help='calls per timing')
+    parser.add_argument('--e2e-size', type=int, default=512 * 1024, help='file bytes for the end-to-end run (0 skips it)')
+    parser.add_argument('--runs', type=int, default=3, help='end-to-end runs per setting (best is kept)')
+    args = parser.parse_args()
+    print(f"{'chunk':>7} {'alg':<7} {'send us':>8} {'+check':>7} {'share':>6}   {'recv us':>8} {'+check':>7} {'share':>6}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        for alg in CHECKSUMS:
+            send, send_extra, recv, recv_extra = frame_path(size, alg, args.number)
+            s_share = send_extra / (send + send_extra)
+            r_share = recv_extra / (recv + recv_extra)
+            print(f"{size:>7} {alg:<7} {send * 1e6:>8.1f} {send_extra * 1e6:>7.1f} {s_share:>6.1%}   "
+                  f"{recv * 1e6:>8.1f} {recv_extra * 1e6:>7.1f} {r_share:>6.1%}")
+    if args.e2e_size:
+        transfer, work = end_to_end(args.e2e_size, args.runs)
+        print(f"\nclient_tcp transfer of {args.e2e_size} bytes: {transfer * 1e3:.1f} ms cpu, "
+              f"of which integrity {work * 1e3:.2f} ms ({work / transfer:.1%}, "
+              f"{'within' if work / transfer <= BUDGET else 'over'} the {BUDGET:.0%} budget)")
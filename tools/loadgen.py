@@ -0,0 +1,452 @@
+# loadgen.py
+# Load generator for backend/app.py. --procs worker processes each run their share of
+# --clients WebSocket clients on one event loop; clients connect over --ramp seconds, join
+# a room, then each does --rate actions per second for --duration seconds, drawn from
+# --mix: DMs to a random peer, room broadcasts, presence churn (disconnect + reconnect)
+# and chunked file uploads. Every frame carries its send time, so receivers record
+# end-to-end latency per kind (into log-bucket histograms the parent merges). The parent
+# samples the server's CPU and RSS from /proc while the run is on.
+#
+#   python tools/loadgen.py --spawn --clients 2000 --procs 4 --duration 30
+#   python tools/loadgen.py --server-pid $(pgrep -f 'uvicorn app:app') --mix dm=50,room=50 --rate 2
+# --spawn starts `uvicorn backend.app:app` itself with MONGODB_URI=memory:// (the in-memory
+# backend of backend/storage.py), so the numbers are the server's, not Mongo's.
+#
+# Baselines: --save-baseline stores this run's summary in --baseline under a key made of
+# the scenario parameters; any later run with the same parameters is compared against it,
+# and a metric that got more than --tolerance worse is flagged (exit status 1 with
+# --fail-on-regression).
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+KINDS = ('dm', 'room', 'churn', 'file')
+BUCKET = 1.02        # histogram resolution: buckets 2% wide
+CHUNK = 16 * 1024    # file chunk bytes (before base64)
+
+
+# ---- latency histograms (mergeable across processes) ----
+
+def hist_add(h, seconds):
+    b = int(math.log(max(seconds, 1e-6) * 1e6, BUCKET))   # microseconds, log-spaced
+    h[b] = h.get(b, 0) + 1
+
+
+def hist_merge(into, h):
+    for b, n in h.items():
+        into[b] = into.get(b, 0) + n
+
+
+def hist_percentile(h, p):
+    total = sum(h.values())
+    if not total:
+        return None
+    rank = p / 100 * total
+    seen = 0
+    for b in sorted(h):
+        seen += h[b]
+        if seen >= rank:
+            return BUCKET ** (b + 0.5) / 1e6   # bucket midpoint, seconds
+    return None
+
+
+# ---- one client ----
+
+class Client:
+    def __init__(self, w, name):
+        self.w = w
+        self.name = name
+        self.ws = None
+        self.room = None
+        self.reader = None
+
+    async def connect(self):
+        w = self.w
+        t0 = time.time()
+        try:
+            self.ws = await websockets.connect(f'{w.url}?name={self.name}', max_size=None, ping_interval=None,
+                                               open_timeout=30, close_timeout=2)
+            while True:
+                mtype = json.loads(await self.ws.recv()).get('type')
+                if mtype == 'CONNECTED':
+                    break
+                if mtype == 'ERROR':   # name taken: the server hasn't seen our last hangup yet
+                    raise ConnectionError(mtype)
+        except Exception:
+            w.count('connect_failed')
+            if self.ws is not None:
+                await self.ws.close()
+            self.ws = None
+            return False
+        hist_add(w.hist['connect'], time.time() - t0)
+        w.count('connected')
+        self.room = f'room-{random.randrange(w.rooms)}'
+        await self.ws.send(json.dumps({'type': 'JOIN', 'room': self.room}))
+        self.reader = asyncio.ensure_future(self.read_loop(self.ws))
+        return True
+
+    async def disconnect(self):
+        ws, self.ws = self.ws, None
+        if ws is not None:
+            await ws.close()
+        if self.reader is not None:
+            await self.reader
+            self.reader = None
+
+    async def read_loop(self, ws):
+        w = self.w
+        try:
+            async for raw in ws:
+                now = time.time()
+                msg = json.loads(raw)
+                mtype = msg.get('type')
+                if mtype in ('MSG', 'FILE_CHUNK'):
+                    kind = 'file' if mtype == 'FILE_CHUNK' else ('room' if msg.get('room') else 'dm')
+                    w.count('recv_' + kind)
+                    w.count('recv_bytes', len(raw))
+                    ts = msg.get('lg_ts')
+                    if ts and w.measuring(ts):
+                        hist_add(w.hist[kind], now - ts)
+                elif mtype == 'MAILBOX':
+                    # DMs held while we were churned out: count them, but their wait is not latency
+                    w.count('mailbox', len(msg.get('frames') or ()))
+                    await ws.send(json.dumps({'type': 'MAILBOX_ACK', 'seq': msg.get('last', 0)}))
+                elif mtype in ('THROTTLE', 'QUEUED', 'ERROR'):
+                    w.count(mtype.lower())
+        except websockets.ConnectionClosed:
+            pass
+        except Exception:
+            w.count('reader_error')
+
+    async def send(self, obj):
+        try:
+            await self.ws.send(json.dumps(obj))
+            return True
+        except Exception:
+            self.w.count('send_error')
+            return False
+
+    async def act(self, kind):
+        w = self.w
+        if self.ws is None:
+            return
+        if kind == 'dm':
+            peers = w.peers(self.name)
+            if peers:
+                await self.send({'type': 'MSG', 'from': self.name, 'to': random.choice(peers),
+                                 'payload': w.text, 'lg_ts': time.time()})
+        elif kind == 'room':
+            await self.send({'type': 'MSG', 'from': self.name, 'room': self.room, 'payload': w.text,
+                             'lg_ts': time.time()})
+        elif kind == 'churn':
+            await self.disconnect()
+            await asyncio.sleep(random.uniform(0, w.churn_pause))
+            for _ in range(3):
+                if w.stopping or await self.connect():
+                    break
+                await asyncio.sleep(0.5)
+        elif kind == 'file':
+            peers = w.peers(self.name)
+            if not peers:
+                return
+            peer = random.choice(peers)
+            tid = uuid.uuid4().hex
+            total = max(1, -(-w.file_size // CHUNK))
+            await self.send({'type': 'FILE_META', 'from': self.name, 'to': peer,
+                             'meta': {'transfer_id': tid, 'fname': 'loadgen.bin', 'size': w.file_size,
+                                      'total_chunks': total}})
+            for i in range(total):
+                if self.ws is None or not await self.send(
+                        {'type': 'FILE_CHUNK', 'from': self.name, 'to': peer, 'transfer_id': tid,
+                         'chunk_index': i, 'total_chunks': total, 'payload': w.chunk, 'lg_ts': time.time()}):
+                    return
+        w.count('sent_' + kind)
+
+    async def run(self, start_at):
+        w = self.w
+        await asyncio.sleep(max(0.0, start_at - time.time()))
+        if not await self.connect():
+            return
+        # actions are a Poisson process per client, so clients don't move in lockstep
+        while not w.stopping:
+            await asyncio.sleep(random.expovariate(w.rate))
+            if not w.stopping:
+                await self.act(random.choices(w.kinds, w.weights)[0])
+
+
+# ---- one worker process ----
+
+class Worker:
+    def __init__(self, cfg, proc):
+        self.url = cfg['url']
+        self.rooms = cfg['rooms']
+        self.rate = cfg['rate']
+        self.kinds = list(cfg['mix'])
+        self.weights = list(cfg['mix'].values())
+        self.churn_pause = cfg['churn_pause']
+        self.file_size = cfg['file_size']
+        self.text = 'x' * cfg['msg_bytes']
+        self.chunk = base64.b64encode(os.urandom(min(CHUNK, cfg['file_size']))).decode()
+        self.window = (cfg['t0'] + cfg['ramp'], cfg['t0'] + cfg['ramp'] + cfg['duration'])
+        self.all_names = [f'lg-{p}-{i}' for p in range(cfg['procs']) for i in range(cfg['per_proc'][p])]
+        self.names = [f'lg-{proc}-{i}' for i in range(cfg['per_proc'][proc])]
+        self.counts = {}
+        self.hist = {k: {} for k in ('dm', 'room', 'file', 'connect')}
+        self.stopping = False
+        random.seed(cfg['seed'] * 1000 + proc)
+
+    def count(self, what, n=1):
+        self.counts[what] = self.counts.get(what, 0) + n
+
+    def measuring(self, ts):
+        return self.window[0] <= ts < self.window[1]
+
+    def peers(self, me):
+        # peers in other processes are assumed online; offline ones land in their mailbox
+        return [n for n in random.sample(self.all_names, min(4, len(self.all_names))) if n != me]
+
+    async def run(self, t0, ramp):
+        clients = [Client(self, n) for n in self.names]
+        step = ramp / max(1, len(clients))
+        tasks = [asyncio.ensure_future(c.run(t0 + i * step)) for i, c in enumerate(clients)]
+        await asyncio.sleep(max(0.0, self.window[1] - time.time()))
+        self.stopping = True
+        await asyncio.sleep(1.0)   # let in-flight frames land before hanging up
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.gather(*(c.disconnect() for c in clients), return_exceptions=True)
+
+
+def run_worker(cfg, proc):
+    # thousands of sockets per process
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    w = Worker(cfg, proc)
+    asyncio.run(w.run(cfg['t0'], cfg['ramp']))
+    return {'counts': w.counts, 'hist': w.hist}
+
+
+# ---- server process sampling ----
+
+CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def proc_sample(pid):
+    """(cpu seconds, rss bytes) of pid, all threads included, or None once it is gone."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/status') as f:
+            rss = next(int(l.split()[1]) * 1024 for l in f if l.startswith('VmRSS:'))
+    except (OSError, StopIteration):
+        return None
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK, rss   # utime + stime
+
+
+def sample_server(pid, until, interval=1.0):
+    samples = []
+    while time.time() < until:
+        s = proc_sample(pid)
+        if s is None:
+            break
+        samples.append((time.time(),) + s)
+        time.sleep(interval)
+    if len(samples) < 2:
+        return {}
+    (t_a, cpu_a, _), (t_b, cpu_b, _) = samples[0], samples[-1]
+    return {'cpu_pct': 100 * (cpu_b - cpu_a) / (t_b - t_a), 'rss_peak_mb': max(s[2] for s in samples) / 2 ** 20}
+
+
+def spawn_server(port):
+    env = dict(os.environ, MONGODB_URI='memory://', CHATCHAT_LOG_LEVEL=os.environ.get('CHATCHAT_LOG_LEVEL', 'WARNING'))
+    proc = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'backend.app:app', '--port', str(port),
+                             '--log-level', 'warning'], cwd=ROOT, env=env)
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            sys.exit(f'server exited with status {proc.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    sys.exit('server did not start listening within 20s')
+
+
+# ---- summary, baselines ----
+
+# metric -> True when higher is better
+METRICS = {
+    'msgs_per_s': True, 'file_mb_per_s': True,
+    'dm_p50': False, 'dm_p99': False, 'dm_p999': False,
+    'room_p50': False, 'room_p99': False, 'room_p999': False,
+    'file_p50': False, 'file_p99': False, 'file_p999': False,
+    'connect_p99': False, 'cpu_pct': False, 'rss_peak_mb': False,
+}
+LATENCY_NOISE = 0.0005   # latency changes smaller than this (seconds) are never flagged
+
+
+def summarize(results, duration, server):
+    counts, hist = {}, {k: {} for k in ('dm', 'room', 'file', 'connect')}
+    for r in results:
+        for k, n in r['counts'].items():
+            counts[k] = counts.get(k, 0) + n
+        for k, h in r['hist'].items():
+            hist_merge(hist[k], {int(b): n for b, n in h.items()})
+    s = {'msgs_per_s': sum(sum(hist[k].values()) for k in ('dm', 'room')) / duration,
+         'file_mb_per_s': sum(hist['file'].values()) * CHUNK / duration / 2 ** 20}
+    for k in ('dm', 'room', 'file'):
+        for label, p in (('p50', 50), ('p99', 99), ('p999', 99.9)):
+            s[f'{k}_{label}'] = hist_percentile(hist[k], p)
+    s['connect_p99'] = hist_percentile(hist['connect'], 99)
+    s.update(server)
+    s['counts'] = dict(sorted(counts.items()))
+    return s
+
+
+def scenario_key(args):
+    return (f'clients={args.clients} procs={args.procs} rate={args.rate} mix={args.mix} rooms={args.rooms} '
+            f'duration={args.duration} msg={args.msg_bytes} file={args.file_size}')
+
+
+def fmt(metric, v):
+    if v is None:
+        return '-'
+    if metric.endswith(('_p50', '_p99', '_p999')):
+        return f'{v * 1000:.2f} ms'
+    return f'{v:.1f}'
+
+
+def compare(current, baseline, tolerance):
+    """Print current vs baseline per metric; return the names of the ones that regressed."""
+    regressed = []
+    print(f"{'metric':<14} {'baseline':>12} {'current':>12} {'change':>8}")
+    for m, higher_better in METRICS.items():
+        cur, base = current.get(m), baseline.get(m)
+        if cur is None or not base:
+            print(f'{m:<14} {fmt(m, base):>12} {fmt(m, cur):>12}')
+            continue
+        change = (cur - base) / base
+        worse = -change if higher_better else change
+        noise = m.endswith(('_p50', '_p99', '_p999')) and abs(cur - base) < LATENCY_NOISE
+        flag = '  REGRESSION' if worse > tolerance and not noise else ''
+        if flag:
+            regressed.append(m)
+        print(f'{m:<14} {fmt(m, base):>12} {fmt(m, cur):>12} {change * 100:>+7.1f}%{flag}')
+    return regressed
+
+
+def print_summary(s):
+    for m in METRICS:
+        if m in s:
+            print(f'{m:<14} {fmt(m, s[m]):>12}')
+    print('counts', ' '.join(f'{k}={v}' for k, v in s['counts'].items()))
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in KINDS:
+            raise ValueError(f'unknown action {kind!r} (choose from {", ".join(KINDS)})')
+        mix[kind] = float(weight or 1)
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='ws://127.0.0.1:9009/ws')
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--procs', type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument('--duration', type=float, default=30.0, help='measured seconds, after the ramp')
+    parser.add_argument('--ramp', type=float, default=10.0, help='seconds over which clients connect')
+    parser.add_argument('--rate', type=float, default=1.0, help='actions per client per second')
+    parser.add_argument('--mix', default='dm=70,room=20,churn=5,file=5')
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--msg-bytes', type=int, default=100)
+    parser.add_argument('--file-size', type=int, default=128 * 1024)
+    parser.add_argument('--churn-pause', type=float, default=2.0, help='max seconds offline per churn')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--server-pid', type=int, help='sample CPU/RSS of this process')
+    parser.add_argument('--spawn', action='store_true', help='start the server (in-memory storage) on the --url port')
+    parser.add_argument('--baseline', default='loadgen-baseline.json')
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.10, help='relative change that counts as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--json', metavar='PATH', help='also write the summary here')
+    args = parser.parse_args()
+    if websockets is None:
+        sys.exit('loadgen needs the websockets package (pip install -r backend/requirements.txt)')
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    server = None
+    pid = args.server_pid
+    if args.spawn:
+        server = spawn_server(urlsplit(args.url).port or 80)
+        pid = server.pid
+    try:
+        procs = max(1, min(args.procs, args.clients))
+        per_proc = [args.clients // procs + (i < args.clients % procs) for i in range(procs)]
+        t0 = time.time() + 1.0   # workers start together once they are all up
+        cfg = dict(url=args.url, rooms=args.rooms, rate=args.rate, mix=mix, churn_pause=args.churn_pause,
+                   file_size=args.file_size, msg_bytes=args.msg_bytes, t0=t0, ramp=args.ramp,
+                   duration=args.duration, procs=procs, per_proc=per_proc, seed=args.seed)
+        print(f'{args.clients} clients on {procs} processes, ramp {args.ramp}s, measuring {args.duration}s',
+              file=sys.stderr)
+        with ProcessPoolExecutor(max_workers=procs) as pool:
+            futures = [pool.submit(run_worker, cfg, p) for p in range(procs)]
+            usage = {}
+            if pid:
+                time.sleep(max(0.0, t0 + args.ramp - time.time()))
+                usage = sample_server(pid, t0 + args.ramp + args.duration)
+            results = [f.result() for f in futures]
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    summary = summarize(results, args.duration, usage)
+    key = scenario_key(args)
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+    regressed = []
+    if key in baselines and not args.save_baseline:
+        print(f'against baseline in {args.baseline}')
+        regressed = compare(summary, baselines[key], args.tolerance)
+        print('counts', ' '.join(f'{k}={v}' for k, v in summary['counts'].items()))
+    else:
+        print_summary(summary)
+    if args.save_baseline:
+        baselines[key] = summary
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=1, sort_keys=True)
+        print(f'baseline saved to {args.baseline}', file=sys.stderr)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=1)
+    if regressed and args.fail_on_regression:
+        sys.exit(1)
@@ -0,0 +1,112 @@
+# log_bench.py
+# Frames/sec through the server's per-frame hot path (parse + the recv/forward log lines)
+# under different logging setups: the old print() calls, logging disabled, a synchronous
+# StreamHandler, and the background-writer pipeline from backend/logs.py with and without
+# sampling. Output goes to a real file so write cost is not hidden by /dev/null;
+# --write-latency adds a blocking delay per write() call to model a slow consumer on the
+# other end of stdout (a terminal, docker's log pipe, a busy journald).
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.logs import setup_logging, LOGS_DROPPED
+
+FRAME = json.dumps({'type': 'FILE_CHUNK', 'from': 'alice', 'to': 'bob', 'transfer_id': 'b2f1c0de',
+                    'chunk_index': 17, 'payload': 'A' * 512})
+
+
+def hot_path_print(n, out):
+    with redirect_stdout(out):
+        for _ in range(n):
+            msg = json.loads(FRAME)
+            mlog = {'from': msg.get('from'), 'type': msg.get('type'), 'to': msg.get('to'), 'room': msg.get('room'),
+                    'transfer_id': msg.get('transfer_id'), 'chunk_index': msg.get('chunk_index')}
+            print('[SERVER LOG] recv', mlog)
+            print(f"[SERVER LOG] forward to user {msg.get('to')} (from alice) type={msg.get('type')}")
+
+
+def hot_path_log(n, log):
+    for _ in range(n):
+        msg = json.loads(FRAME)
+        mtype = msg.get('type')
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('recv type=%s from=%s to=%s room=%s transfer_id=%s chunk_index=%s', mtype, 'alice',
+                      msg.get('to'), msg.get('room'), msg.get('transfer_id'), msg.get('chunk_index'))
+        log.debug('forward type=%s from=%s to=%s', mtype, 'alice', msg.get('to'))
+
+
+def sync_logger(out):
+    log = logging.getLogger('bench.sync')
+    h = logging.StreamHandler(out)
+    h.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+    log.handlers = [h]
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+    return log
+
+
+class SlowStream:
+    def __init__(self, stream, latency):
+        self.stream, self.latency = stream, latency
+
+    def write(self, text):
+        time.sleep(self.latency)   # like a blocking write(2): releases the GIL
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+def dropped():
+    return sum(LOGS_DROPPED.values.values())
+
+
+def run(mode, n, out):
+    listener = None
+    before = dropped()
+    t0 = time.perf_counter()
+    if mode == 'print':
+        hot_path_print(n, out)
+    else:
+        if mode == 'off':
+            log, listener = setup_logging('bench.off', level='INFO', stream=out)
+        elif mode == 'sync':
+            log = sync_logger(out)
+        elif mode == 'async':
+            log, listener = setup_logging('bench.async', level='DEBUG', stream=out, sample={})
+        elif mode == 'async-json':
+            log, listener = setup_logging('bench.json', level='DEBUG', fmt='json', stream=out, sample={})
+        else:  # async-sampled
+            log, listener = setup_logging('bench.sampled', level='DEBUG', stream=out,
+                                          sample={'recv': 0.01, 'forward': 0.01})
+        t0 = time.perf_counter()
+        hot_path_log(n, log)
+    # time seen by the event loop: the background writer may still be draining
+    loop_time = time.perf_counter() - t0
+    if listener is not None:
+        listener.stop()
+    total_time = time.perf_counter() - t0
+    return n / loop_time, n / total_time, dropped() - before
+
+
+MODES = ('print', 'off', 'sync', 'async', 'async-json', 'async-sampled')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=50000)
+    parser.add_argument('--modes', default=','.join(MODES))
+    parser.add_argument('--write-latency', type=float, default=0.0, help='seconds each write() blocks')
+    args = parser.parse_args()
+    print(f"{'mode':<14} {'loop frames/s':>14} {'incl. drain':>12} {'dropped':>8}")
+    for mode in args.modes.split(','):
+        # line buffered, like stdout on a terminal or under a process supervisor
+        with tempfile.TemporaryFile('w+', buffering=1) as f:
+            out = SlowStream(f, args.write_latency) if args.write_latency else f
+            loop_fps, total_fps, lost = run(mode, args.frames, out)
+        print(f"{mode:<14} {loop_fps:>14,.0f} {total_fps:>12,.0f} {lost:>8}")
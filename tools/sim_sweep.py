@@ -0,0 +1,175 @@
+# sim_sweep.py
+# Parameter sweeps over tools/tcp_simulator.py. Every combination of the comma-separated
+# values below is run for --seeds seeds on a process pool; each finished run is appended
+# to --out straight away, so an interrupted sweep picks up where it stopped when started
+# again with the same --out (runs already in the file are skipped). The per-configuration
+# summary averages over seeds: total goodput (with its spread), pooled RTT percentiles,
+# Jain's fairness across the competing flows and the retransmit ratio.
+#
+#   python tools/sim_sweep.py --cc reno,cubic,bbr --loss 0,0.001,0.01 --rtt 20,100 --seeds 5
+#   python tools/sim_sweep.py --mss 512,1000,1400 --init-cwnd 1,4,10 --rwnd 32,128,512 --summary mss.csv
+#   python tools/sim_sweep.py --cc reno+cubic,cubic+bbr --flows 2 --bw 20 --queue 50
+# A '+' inside --cc runs mixed algorithms against each other (assigned to flows round robin).
+import argparse
+import csv
+import itertools
+import os
+import statistics
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tcp_simulator import INIT_CWND, INIT_SSTHRESH, SIM_MSS, simulate
+
+# sweep axis -> (parser for one value, default values)
+AXES = {
+    'cc': (str, 'reno'),
+    'flows': (int, '1'),
+    'bw': (float, '10'),            # Mbit/s
+    'rtt': (float, '40'),           # ms, base round trip (twice the one-way delay)
+    'loss': (float, '0'),
+    'queue': (int, '100'),          # packets
+    'mss': (int, str(SIM_MSS)),
+    'init_cwnd': (float, str(INIT_CWND)),        # segments
+    'init_ssthresh': (float, str(INIT_SSTHRESH)),
+    'rwnd': (int, '0'),             # segments, 0 = unlimited
+}
+RESULTS = ('goodput', 'rtt_p50', 'rtt_p95', 'rtt_p99', 'jain', 'retx_ratio', 'timeouts', 'fct', 'events', 'wall')
+FIELDS = tuple(AXES) + ('duration', 'pacing', 'seed') + RESULTS
+
+
+def run_one(cfg):
+    res = simulate(cc=cfg['cc'].replace('+', ','), flows=int(cfg['flows']), bandwidth=float(cfg['bw']) * 1e6 / 8,
+                   delay=float(cfg['rtt']) / 2000, queue=int(cfg['queue']), loss=float(cfg['loss']),
+                   duration=float(cfg['duration']), seed=int(cfg['seed']), mss=int(cfg['mss']),
+                   init_cwnd=float(cfg['init_cwnd']), init_ssthresh=float(cfg['init_ssthresh']),
+                   rwnd=int(cfg['rwnd']) * int(cfg['mss']) or None, pacing=cfg['pacing'] == '1')
+    flows = res['flows']
+    sent = sum(f['sent'] for f in flows)
+    fcts = [f['fct'] for f in flows if f['fct'] is not None]
+    return dict(cfg,
+                goodput=round(res['goodput'], 1),
+                **{k: round(res[k], 6) if res[k] is not None else None for k in ('rtt_p50', 'rtt_p95', 'rtt_p99')},
+                jain=round(res['jain'], 4),
+                retx_ratio=round(sum(f['retx'] for f in flows) / sent, 5) if sent else 0.0,
+                timeouts=sum(f['timeouts'] for f in flows),
+                fct=round(statistics.mean(fcts), 4) if fcts else '',
+                events=res['events'], wall=round(res['wall'], 3))
+
+
+def key_of(row):
+    return tuple(str(row[k]) for k in tuple(AXES) + ('duration', 'pacing', 'seed'))
+
+
+def load_done(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def configs(args):
+    grid = []
+    for axis, (conv, _) in AXES.items():
+        vals = getattr(args, axis).split(',')
+        grid.append([str(conv(v)) if conv is not str else v for v in vals])
+    for combo in itertools.product(*grid):
+        for seed in range(args.seed, args.seed + args.seeds):
+            cfg = dict(zip(AXES, combo))
+            cfg.update(duration=str(args.duration), pacing='1' if args.pacing else '0', seed=str(seed))
+            yield cfg
+
+
+def _num(v):
+    return float(v) if v not in ('', None) else None
+
+
+def summarize(rows):
+    groups = {}
+    for r in rows:
+        groups.setdefault(key_of(r)[:-1], []).append(r)
+    out = []
+    for key, rs in groups.items():
+        s = dict(zip(tuple(AXES) + ('duration', 'pacing'), key), runs=len(rs))
+        goodputs = [float(r['goodput']) for r in rs]
+        s['goodput'] = statistics.mean(goodputs)
+        s['goodput_sd'] = statistics.stdev(goodputs) if len(goodputs) > 1 else 0.0
+        for k in ('rtt_p50', 'rtt_p95', 'rtt_p99', 'jain', 'retx_ratio', 'timeouts', 'fct'):
+            vals = [v for v in (_num(r[k]) for r in rs) if v is not None]
+            s[k] = statistics.mean(vals) if vals else None
+        out.append(s)
+    return out
+
+
+def fmt(v, scale=1.0, spec='.1f'):
+    return '-' if v is None else format(v * scale, spec)
+
+
+def print_table(summary):
+    varying = [a for a in AXES if len({s[a] for s in summary}) > 1] or ['cc']
+    head = ' '.join(f'{a:>10}' for a in varying)
+    print(f"{head} {'runs':>4} {'Mbit/s':>8} {'±sd':>6} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} "
+          f"{'jain':>5} {'retx %':>6} {'rto':>5}")
+    for s in summary:
+        cols = ' '.join(f'{s[a]:>10}' for a in varying)
+        print(f"{cols} {s['runs']:>4} {fmt(s['goodput'], 8e-6, '.3f'):>8} {fmt(s['goodput_sd'], 8e-6, '.3f'):>6} "
+              f"{fmt(s['rtt_p50'], 1000):>7} {fmt(s['rtt_p95'], 1000):>7} {fmt(s['rtt_p99'], 1000):>7} "
+              f"{fmt(s['jain'], 1, '.3f'):>5} {fmt(s['retx_ratio'], 100, '.2f'):>6} {fmt(s['timeouts']):>5}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    for axis, (_, default) in AXES.items():
+        parser.add_argument('--' + axis.replace('_', '-'), dest=axis, default=default)
+    parser.add_argument('--duration', type=float, default=60.0, help='simulated seconds per run')
+    parser.add_argument('--pacing', action='store_true')
+    parser.add_argument('--seeds', type=int, default=3, help='runs per configuration')
+    parser.add_argument('--seed', type=int, default=1, help='first seed')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count())
+    parser.add_argument('--out', default='sweep.csv', help='per-run results; also the resume checkpoint')
+    parser.add_argument('--summary', metavar='CSV', help='write the per-configuration summary')
+    parser.add_argument('--fresh', action='store_true', help='ignore and overwrite an existing --out')
+    args = parser.parse_args()
+
+    done = [] if args.fresh else load_done(args.out)
+    if done and tuple(done[0]) != FIELDS:
+        sys.exit(f'{args.out} has different columns; use --fresh or another --out')
+    seen = {key_of(r) for r in done}
+    wanted = list(configs(args))
+    todo = [c for c in wanted if key_of(c) not in seen]
+    print(f'{len(wanted)} runs, {len(wanted) - len(todo)} already in {args.out}, {len(todo)} to go '
+          f'on {args.jobs} workers', file=sys.stderr)
+
+    wanted_keys = {key_of(c) for c in wanted}
+    rows = [r for r in done if key_of(r) in wanted_keys]
+    new_file = args.fresh or not os.path.exists(args.out)
+    with open(args.out, 'w' if new_file else 'a', newline='') as f:
+        w = csv.DictWriter(f, fieldnames=FIELDS)
+        if new_file:
+            w.writeheader()
+        pool = ProcessPoolExecutor(max_workers=args.jobs)
+        futures = [pool.submit(run_one, c) for c in todo]
+        try:
+            for i, fut in enumerate(as_completed(futures), 1):
+                row = fut.result()
+                w.writerow(row)
+                f.flush()   # the checkpoint: a killed sweep loses at most the runs in flight
+                rows.append({k: str(v) if v is not None else '' for k, v in row.items()})
+                print(f'\r{i}/{len(todo)}', end='', file=sys.stderr)
+        except KeyboardInterrupt:
+            print(f'\ninterrupted; rerun the same command to resume', file=sys.stderr)
+            pool.shutdown(wait=False, cancel_futures=True)
+            sys.exit(130)
+        pool.shutdown()
+    if todo:
+        print(file=sys.stderr)
+
+    summary = summarize(rows)
+    print_table(summary)
+    if args.summary:
+        with open(args.summary, 'w', newline='') as f:
+            fields = tuple(AXES) + ('duration', 'pacing', 'runs', 'goodput', 'goodput_sd', 'rtt_p50', 'rtt_p95',
+                                    'rtt_p99', 'jain', 'retx_ratio', 'timeouts', 'fct')
+            w = csv.DictWriter(f, fieldnames=fields)
+            w.writeheader()
+            w.writerows(summary)
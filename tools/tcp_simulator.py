@@ -1,64 +1,484 @@
 # tcp_simulator.py
-import time
+# Discrete-event simulation of TCP-like flows over a bottleneck link, driving the real
+# congestion control classes from backend/flow_control.py through their `clock` field.
+# Time is virtual: events sit on a heap and the clock jumps from one to the next, so a
+# minute of simulated transfer takes well under a second and a run is reproducible from
+# its --seed.
+#
+# Topology: every flow shares one forward link (bandwidth, one-way delay, jitter, drop-tail
+# queue, Bernoulli or Gilbert-Elliott loss); ACKs return over an uncongested, lossless
+# link with the same delay. Senders do cumulative ACKs with dup-ACK fast retransmit,
+# NewReno-style partial-ACK repair, RFC 6298 RTO with Karn's rule and exponential
+# backoff, and optional pacing (flow_control.Pacer).
+#
+#   python tools/tcp_simulator.py --cc cubic --bw 20 --delay 25 --queue 50 --duration 120
+#   python tools/tcp_simulator.py --cc reno,cubic,bbr --flows 3 --stagger 5 --ge 0.01,0.3
+import argparse
+import heapq
+import os
 import random
+import sys
+import time
 from collections import deque
 
-class TCPSim:
-    def __init__(self, loss_prob=0.15):
-        self.cwnd = 1
-        self.ssthresh = 16
-        self.mss = 1
-        self.unacked = deque()   # packets sent but not acked
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backend.flow_control import ALGORITHMS, Pacer, make_congestion_control
+from common.telemetry import RING_SIZE, Trace
+
+SIM_MSS = 1000          # payload bytes per segment; congestion control runs in bytes
+HEADER = 40             # per-packet overhead on the wire
+ACK_BYTES = 40
+INIT_CWND = 1           # segments
+INIT_SSTHRESH = 64      # segments
+MIN_RTO = 0.2           # seconds (Linux's floor rather than RFC 6298's 1s)
+MAX_RTO = 60.0
+INIT_RTO = 1.0
+TIMER_GRANULARITY = 1e-6  # shortest pacing wait; smaller ones would not advance a float clock
+
+
+class Simulator:
+    """Event heap plus virtual clock. Ties are broken by insertion order."""
+    def __init__(self, seed=1):
+        self.now = 0.0
+        self.heap = []
+        self.n = 0
+        self.events = 0
+        self.rng = random.Random(seed)
+
+    def clock(self):
+        return self.now
+
+    def at(self, t, fn, *args):
+        self.n += 1
+        heapq.heappush(self.heap, (t, self.n, fn, args))
+
+    def after(self, delay, fn, *args):
+        self.at(self.now + delay, fn, *args)
+
+    def run(self, until):
+        heap, pop = self.heap, heapq.heappop
+        while heap and heap[0][0] <= until:
+            t, _, fn, args = pop(heap)
+            self.now = t
+            fn(*args)
+            self.events += 1
+        if heap:
+            self.now = until
+
+
+class Bernoulli:
+    def __init__(self, p, rng):
+        self.p, self.rng = p, rng
+
+    def lost(self):
+        return self.rng.random() < self.p
+
+
+class GilbertElliott:
+    """Two-state bursty loss: good->bad with probability p and bad->good with r per
+    packet; each state has its own loss rate (Gilbert's model is 0 and 1)."""
+    def __init__(self, p, r, loss_good=0.0, loss_bad=1.0, rng=None):
+        self.p, self.r, self.loss_good, self.loss_bad = p, r, loss_good, loss_bad
+        self.rng = rng or random.Random()
+        self.bad = False
+
+    def lost(self):
+        rnd = self.rng.random
+        if self.bad:
+            if rnd() < self.r:
+                self.bad = False
+        elif rnd() < self.p:
+            self.bad = True
+        return rnd() < (self.loss_bad if self.bad else self.loss_good)
+
+
+class Link:
+    """FIFO link: packets serialize at `bandwidth` bytes/s behind a drop-tail queue of
+    `queue` packets, then take `delay` (+ up to `jitter`) seconds to arrive. Jitter never
+    reorders packets. bandwidth=None means no serialization delay and no queue."""
+    def __init__(self, sim, bandwidth=None, delay=0.0, jitter=0.0, queue=None, loss=None):
+        self.sim = sim
+        self.bandwidth = bandwidth
+        self.delay = delay
+        self.jitter = jitter
+        self.queue = queue
+        self.loss = loss
+        self.busy_until = 0.0
+        self.backlog = deque()      # departure times of packets queued or on the wire
+        self.last_arrival = 0.0
+        self.sent = 0
+        self.bytes = 0
+        self.dropped_queue = 0
+        self.dropped_loss = 0
+        self.max_backlog = 0
+
+    def send(self, size, deliver, *args):
+        sim = self.sim
+        now = sim.now
+        q = self.backlog
+        while q and q[0] <= now:
+            q.popleft()
+        if self.queue is not None and len(q) >= self.queue:
+            self.dropped_queue += 1
+            return False
+        if self.bandwidth:
+            done = max(now, self.busy_until) + size / self.bandwidth
+            self.busy_until = done
+            q.append(done)
+            if len(q) > self.max_backlog:
+                self.max_backlog = len(q)
+        else:
+            done = now
+        self.sent += 1
+        self.bytes += size
+        if self.loss is not None and self.loss.lost():
+            # lost on the wire: it still used its slot in the queue
+            self.dropped_loss += 1
+            return True
+        arrive = done + self.delay
+        if self.jitter:
+            arrive = max(arrive + sim.rng.uniform(0, self.jitter), self.last_arrival)
+        self.last_arrival = arrive
+        sim.at(arrive, deliver, *args)
+        return True
+
+    def stats(self):
+        return {'sent': self.sent, 'bytes': self.bytes, 'dropped_queue': self.dropped_queue,
+                'dropped_loss': self.dropped_loss, 'max_backlog': self.max_backlog}
+
+
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return None
+    return sorted_vals[min(len(sorted_vals) - 1, int(p / 100 * len(sorted_vals)))]
+
+
+def jain(xs):
+    """Jain's fairness index: 1 when all flows get the same share, 1/n when one gets it all."""
+    xs = list(xs)
+    sq = sum(x * x for x in xs)
+    return sum(xs) ** 2 / (len(xs) * sq) if sq else 1.0
+
+
+class Flow:
+    """One sender/receiver pair. Sequence numbers are byte offsets starting at 1 and every
+    segment is exactly mss bytes (a sized flow is rounded up to whole segments)."""
+    def __init__(self, sim, fid, link, ack_link, cc='reno', mss=SIM_MSS, size=None, start=0.0, pacing=False, trace=None,
+                 init_cwnd=INIT_CWND, init_ssthresh=INIT_SSTHRESH, rwnd=None):
+        self.sim = sim
+        self.fid = fid
+        self.link = link
+        self.ack_link = ack_link
+        self.mss = mss
+        self.cc = make_congestion_control(cc, cwnd=init_cwnd * mss, ssthresh=init_ssthresh * mss, mss=mss,
+                                          clock=sim.clock)
+        self.rwnd = rwnd            # receive window in bytes (fixed), None for unlimited
+        self.pacer = Pacer(mss, 4 * mss, clock=sim.clock) if pacing else None
+        self.pace_pending = False
+        self.end_seq = 1 + -(-size // mss) * mss if size else None
+        self.start = start
+        # sender
+        self.una = 1
         self.next_seq = 1
-        self.rto = 2.0
-        self.loss_prob = loss_prob
-
-    def send(self):
-        allowed = int(self.cwnd - len(self.unacked))
-        for _ in range(max(0, allowed)):
-            pkt = {"seq": self.next_seq, "sent": time.time(), "retries": 0}
-            self.unacked.append(pkt)
-            print(f"Sent pkt {pkt['seq']} (cwnd={self.cwnd:.1f})")
-            self.next_seq += 1
-
-    def receive_acks(self):
-        # simulate ack for first unacked packet with probability (1-loss)
-        if not self.unacked:
+        self.segs = {}              # seq -> [last sent time, transmissions]
+        self.dup = 0
+        self.recovery_point = None
+        self.rttvar = None
+        self.rto = INIT_RTO
+        self.deadline = None        # RTO expiry; one timer event is kept on the heap
+        self.timer_pending = False
+        # receiver
+        self.rcv_next = 1
+        self.ooo = set()
+        # results
+        self.done = None
+        self.delivered = 0
+        self.sent = 0
+        self.retx = 0
+        self.timeouts = 0
+        self.fast = 0
+        self.rtts = []
+        self.trace = Trace(trace, {'who': f'sim{fid}', 'cc': self.cc.name, 'mss': mss}, clock=sim.clock) if trace else None
+        sim.at(start, self.try_send)
+
+    def _trace(self, event, seq=None, nbytes=None, rtt=None):
+        tr = self.trace
+        if tr is not None:
+            tr.record(event, seq, nbytes, int(self.cc.cwnd), int(self.cc.ssthresh), self.cc.srtt, rtt,
+                      self.next_seq - self.una, self.cc.phase())
+            if len(tr.ring) >= RING_SIZE - 1:
+                tr.flush()   # single-threaded: drain before the ring overwrites anything
+
+    # --- sender ---
+
+    def _pace_wake(self):
+        self.pace_pending = False
+        self.try_send()
+
+    def try_send(self):
+        if self.done is not None:
+            return
+        mss, cc, rwnd = self.mss, self.cc, self.rwnd
+        if self.pacer is not None:
+            self.pacer.update(cc)
+        while self.next_seq - self.una + mss <= (cc.cwnd if rwnd is None else min(cc.cwnd, rwnd)) and (self.end_seq is None or self.next_seq < self.end_seq):
+            if self.pacer is not None:
+                wait = self.pacer.admit(mss)
+                if wait > 0:
+                    if not self.pace_pending:
+                        self.pace_pending = True
+                        self.sim.after(max(wait, TIMER_GRANULARITY), self._pace_wake)
+                    return
+            seq = self.next_seq
+            self.next_seq += mss
+            self._xmit(seq)
+
+    def _xmit(self, seq):
+        now = self.sim.now
+        info = self.segs.get(seq)
+        if info is None:
+            self.segs[seq] = [now, 1]
+            event = 'send'
+        else:
+            info[0] = now
+            info[1] += 1
+            self.retx += 1
+            event = 'retx'
+        self.sent += 1
+        self.link.send(self.mss + HEADER, self.on_data, seq)
+        self._trace(event, seq, self.mss)
+        if self.deadline is None:
+            self._arm()
+
+    def _arm(self):
+        self.deadline = self.sim.now + self.rto
+        if not self.timer_pending:
+            self.timer_pending = True
+            self.sim.at(self.deadline, self.on_timer)
+
+    def on_timer(self):
+        self.timer_pending = False
+        if self.deadline is None or self.done is not None:
+            return
+        if self.sim.now < self.deadline:
+            # restarted by ACKs since this event was scheduled
+            self.timer_pending = True
+            self.sim.at(self.deadline, self.on_timer)
             return
-        first = self.unacked[0]
-        if random.random() > self.loss_prob:
-            acked = self.unacked.popleft()
-            print(f"ACK {acked['seq']}")
-            # update cwnd: slow start or additive increase
-            if self.cwnd < self.ssthresh:
-                self.cwnd += 1  # linear for demo (or multiply)
-            else:
-                self.cwnd += 1/self.cwnd  # small additive
-            if self.cwnd > 64:
-                self.cwnd = 64
+        self.timeouts += 1
+        self.cc.on_loss('timeout')
+        self._trace('timeout', self.una)
+        self.rto = min(self.rto * 2, MAX_RTO)
+        self.recovery_point = None
+        self.dup = 0
+        # go back N: resend from the first unacked segment as the window reopens
+        self.next_seq = self.una
+        self.deadline = None
+        self.try_send()
+
+    def _rtt_sample(self, rtt):
+        # RFC 6298
+        self.rtts.append(rtt)
+        self.cc.on_rtt_sample(rtt)
+        srtt = self.cc.srtt
+        if self.rttvar is None:
+            self.rttvar = rtt / 2
         else:
-            print(f"Packet {first['seq']} lost (no ACK)")
-
-    def timeout_check(self):
-        if self.unacked:
-            pkt = self.unacked[0]
-            if time.time() - pkt["sent"] > self.rto:
-                # timeout -> retransmit and reduce cwnd
-                print(f"Timeout on pkt {pkt['seq']}, retransmit, reduce cwnd")
-                self.ssthresh = max(2, int(self.cwnd/2))
-                self.cwnd = 1
-                pkt["sent"] = time.time()
-                pkt["retries"] += 1
-
-    def step(self):
-        self.send()
-        self.receive_acks()
-        self.timeout_check()
-        print(f"STATE: cwnd={self.cwnd:.2f}, ssthresh={self.ssthresh}, unacked={len(self.unacked)}")
-        print("-"*40)
-        time.sleep(1)
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(srtt - rtt)
+        self.rto = min(max(srtt + 4 * self.rttvar, MIN_RTO), MAX_RTO)
+
+    def on_ack(self, ack):
+        if self.done is not None:
+            return
+        now = self.sim.now
+        if ack > self.una:
+            acked = ack - self.una
+            rtt = None
+            seq, segs, mss = self.una, self.segs, self.mss
+            while seq < ack:
+                info = segs.pop(seq, None)
+                # Karn: only segments sent exactly once give a usable sample
+                if info is not None and info[1] == 1:
+                    rtt = now - info[0]
+                seq += mss
+            if rtt is not None:
+                self._rtt_sample(rtt)
+            self.una = ack
+            if self.next_seq < ack:
+                # after a go-back-N the receiver may already hold what we were about to resend
+                self.next_seq = ack
+            self.dup = 0
+            self.delivered += acked
+            self.cc.on_ack(acked, ack=ack)
+            self._trace('ack', ack, acked, rtt)
+            if self.recovery_point is not None:
+                if ack >= self.recovery_point:
+                    self.recovery_point = None
+                else:
+                    # partial ACK: the next hole was lost too, repair it without waiting for RTO
+                    self._xmit(ack)
+            if self.end_seq is not None and ack >= self.end_seq:
+                self.done = now
+                self.deadline = None
+                return
+            self.deadline = None
+            if self.next_seq > self.una:
+                self._arm()
+        elif ack == self.una and self.next_seq > self.una:
+            self.dup += 1
+            self._trace('dupack', ack)
+            if self.recovery_point is not None:
+                self.cc.on_dup_ack(self.dup, self.recovery_point)
+            elif self.cc.on_dup_ack(self.dup, self.next_seq):
+                self.recovery_point = self.next_seq
+                self.fast += 1
+                self._trace('fast', ack)
+                self._xmit(ack)
+        self.try_send()
+
+    # --- receiver ---
+
+    def on_data(self, seq):
+        if seq == self.rcv_next:
+            mss, ooo = self.mss, self.ooo
+            nxt = seq + mss
+            while nxt in ooo:
+                ooo.remove(nxt)
+                nxt += mss
+            self.rcv_next = nxt
+        elif seq > self.rcv_next:
+            self.ooo.add(seq)
+        self.ack_link.send(ACK_BYTES, self.on_ack, self.rcv_next)
+
+    def close(self):
+        if self.trace is not None:
+            self.trace.close()
+
+    def stats(self):
+        end = self.done if self.done is not None else self.sim.now
+        active = max(end - self.start, 1e-9)
+        rtts = sorted(self.rtts)
+        return {
+            'flow': self.fid,
+            'cc': self.cc.name,
+            'delivered': self.delivered,
+            'goodput': self.delivered / active,
+            'fct': self.done - self.start if self.done is not None else None,
+            'sent': self.sent,
+            'retx': self.retx,
+            'retx_ratio': self.retx / self.sent if self.sent else 0.0,
+            'timeouts': self.timeouts,
+            'fast': self.fast,
+            'rtt_min': rtts[0] if rtts else None,
+            'rtt_p50': percentile(rtts, 50),
+            'rtt_p95': percentile(rtts, 95),
+            'rtt_p99': percentile(rtts, 99),
+        }
+
+
+def trace_path(trace, i, n):
+    if not trace or n == 1:
+        return trace
+    root, ext = os.path.splitext(trace)
+    return f'{root}-{i}{ext or ".csv"}'
+
+
+def simulate(cc='reno', flows=1, bandwidth=10e6 / 8, delay=0.02, jitter=0.0, queue=100, loss=0.0, ge=None,
+             duration=60.0, seed=1, mss=SIM_MSS, size=None, stagger=0.0, pacing=False, trace=None,
+             init_cwnd=INIT_CWND, init_ssthresh=INIT_SSTHRESH, rwnd=None):
+    """Run one scenario; bandwidth and rwnd in bytes(/s), times in seconds, initial windows in
+    segments. `cc` may be a list (or a comma-separated string) assigned to flows round robin.
+    Returns a dict of results."""
+    sim = Simulator(seed)
+    if ge:
+        model = GilbertElliott(*ge, rng=sim.rng)
+    elif loss:
+        model = Bernoulli(loss, sim.rng)
+    else:
+        model = None
+    fwd = Link(sim, bandwidth, delay, jitter, queue, model)
+    rev = Link(sim, None, delay, jitter)
+    ccs = cc.split(',') if isinstance(cc, str) else list(cc)
+    fl = [Flow(sim, i, fwd, rev, ccs[i % len(ccs)], mss, size, i * stagger, pacing, trace_path(trace, i, flows),
+               init_cwnd, init_ssthresh, rwnd)
+          for i in range(flows)]
+    t0 = time.perf_counter()
+    sim.run(duration)
+    wall = time.perf_counter() - t0
+    for f in fl:
+        f.close()
+    stats = [f.stats() for f in fl]
+    rtts = sorted(r for f in fl for r in f.rtts)
+    return {
+        'flows': stats,
+        'goodput': sum(s['goodput'] for s in stats),
+        'rtt_p50': percentile(rtts, 50),
+        'rtt_p95': percentile(rtts, 95),
+        'rtt_p99': percentile(rtts, 99),
+        'link': fwd.stats(),
+        'jain': jain(s['goodput'] for s in stats),
+        'sim_time': sim.now,
+        'wall': wall,
+        'events': sim.events,
+    }
+
+
+def fmt_ms(v):
+    return '-' if v is None else f'{v * 1000:.1f}'
+
+
+def print_result(res):
+    print(f"{'flow':>4} {'cc':<8} {'goodput Mbit/s':>14} {'retx %':>7} {'rto':>4} {'fast':>5} "
+          f"{'rtt ms min/p50/p95/p99':>24} {'fct s':>7}")
+    for s in res['flows']:
+        rtt = '/'.join(fmt_ms(s[k]) for k in ('rtt_min', 'rtt_p50', 'rtt_p95', 'rtt_p99'))
+        fct = '-' if s['fct'] is None else f"{s['fct']:.2f}"
+        print(f"{s['flow']:>4} {s['cc']:<8} {s['goodput'] * 8 / 1e6:>14.3f} {s['retx_ratio'] * 100:>7.2f} "
+              f"{s['timeouts']:>4} {s['fast']:>5} {rtt:>24} {fct:>7}")
+    ln = res['link']
+    print(f"link: {ln['sent']} packets, {ln['dropped_queue']} queue drops, {ln['dropped_loss']} lost, "
+          f"max queue {ln['max_backlog']} packets")
+    if len(res['flows']) > 1:
+        print(f"jain fairness {res['jain']:.3f}")
+    speed = res['sim_time'] / res['wall'] if res['wall'] else float('inf')
+    print(f"simulated {res['sim_time']:.1f}s in {res['wall']:.3f}s ({speed:,.0f}x), {res['events']} events")
+
+
+def parse_ge(spec):
+    vals = [float(v) for v in spec.split(',')]
+    if not 2 <= len(vals) <= 4:
+        raise argparse.ArgumentTypeError('expected p,r[,loss_good[,loss_bad]]')
+    return vals
+
 
 if __name__ == "__main__":
-    sim = TCPSim(loss_prob=0.2)
-    for _ in range(60):
-        sim.step()
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cc', default='reno', help=f"algorithm or comma-separated list ({', '.join(sorted(ALGORITHMS))})")
+    parser.add_argument('--flows', type=int, default=1)
+    parser.add_argument('--bw', type=float, default=10.0, help='bottleneck bandwidth, Mbit/s')
+    parser.add_argument('--delay', type=float, default=20.0, help='one-way delay, ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra one-way delay, uniform 0..N ms')
+    parser.add_argument('--queue', type=int, default=100, help='bottleneck queue, packets')
+    parser.add_argument('--loss', type=float, default=0.0, help='Bernoulli loss probability')
+    parser.add_argument('--ge', type=parse_ge, metavar='P,R[,LG,LB]', help='Gilbert-Elliott loss instead of --loss')
+    parser.add_argument('--duration', type=float, default=60.0, help='simulated seconds')
+    parser.add_argument('--size', type=int, help='bytes per flow (default: unlimited)')
+    parser.add_argument('--stagger', type=float, default=0.0, help='seconds between flow starts')
+    parser.add_argument('--mss', type=int, default=SIM_MSS)
+    parser.add_argument('--init-cwnd', type=float, default=INIT_CWND, help='segments')
+    parser.add_argument('--init-ssthresh', type=float, default=INIT_SSTHRESH, help='segments')
+    parser.add_argument('--rwnd', type=int, help='receive window, segments (default: unlimited)')
+    parser.add_argument('--pacing', action='store_true', help='pace segments at the cc pacing rate')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--trace', metavar='CSV', help='write a congestion trace (see tools/trace_summary.py); '
+                                                       'one file per flow with -N appended')
+    args = parser.parse_args()
+    for name in args.cc.split(','):
+        if name.lower() not in ALGORITHMS:
+            parser.error(f'unknown congestion control {name!r}')
+    res = simulate(cc=args.cc, flows=args.flows, bandwidth=args.bw * 1e6 / 8, delay=args.delay / 1000,
+                   jitter=args.jitter / 1000, queue=args.queue, loss=args.loss, ge=args.ge,
+                   duration=args.duration, seed=args.seed, mss=args.mss, size=args.size,
+                   stagger=args.stagger, pacing=args.pacing, trace=args.trace, init_cwnd=args.init_cwnd,
+                   init_ssthresh=args.init_ssthresh, rwnd=args.rwnd * args.mss if args.rwnd else None)
+    print_result(res)
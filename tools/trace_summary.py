@@ -0,0 +1,185 @@
+# trace_summary.py
+# Summarize congestion traces written by common/telemetry.py (client_tcp.py --trace DIR,
+# tcp_simulator.py --trace FILE, or the CSV the React client downloads): goodput,
+# retransmit ratio, loss events, RTT percentiles and time spent in each congestion state.
+# --plot draws cwnd/ssthresh over time (matplotlib if installed, ASCII sparkline otherwise);
+# --csv writes one summary row per trace for comparing parameter sweeps.
+import argparse
+import csv
+import os
+import sys
+
+SPARK = ' ▁▂▃▄▅▆▇█'
+
+
+def load(path):
+    meta, rows = {}, []
+    with open(path, newline='') as f:
+        lines = []
+        for line in f:
+            if line.startswith('#'):
+                for tok in line[1:].split():
+                    k, eq, v = tok.partition('=')
+                    if eq:
+                        meta[k] = v
+            elif line.strip():
+                lines.append(line)
+    for r in csv.DictReader(lines):
+        rows.append({
+            't': float(r['t']), 'event': r['event'],
+            'seq': int(r['seq']) if r['seq'] else None,
+            'bytes': int(r['bytes']) if r['bytes'] else 0,
+            'cwnd': float(r['cwnd']) if r['cwnd'] else None,
+            'ssthresh': float(r['ssthresh']) if r['ssthresh'] else None,
+            'srtt': float(r['srtt']) if r['srtt'] else None,
+            'rtt': float(r['rtt']) if r['rtt'] else None,
+            'state': r['state'] or 'unknown',
+        })
+    return meta, rows
+
+
+def percentile(sorted_vals, p):
+    if not sorted_vals:
+        return None
+    k = min(len(sorted_vals) - 1, max(0, int(round(p / 100 * (len(sorted_vals) - 1)))))
+    return sorted_vals[k]
+
+
+def summarize(rows):
+    s = {'events': len(rows)}
+    if not rows:
+        return s
+    t0, t1 = rows[0]['t'], rows[-1]['t']
+    duration = max(t1 - t0, 1e-9)
+    count = {}
+    for r in rows:
+        count[r['event']] = count.get(r['event'], 0) + 1
+    acked = sum(r['bytes'] for r in rows if r['event'] == 'ack')
+    sent_bytes = sum(r['bytes'] for r in rows if r['event'] in ('send', 'retx'))
+    retx_bytes = sum(r['bytes'] for r in rows if r['event'] == 'retx')
+    # time-weighted: each interval is charged to the state/cwnd in force at its start
+    states, cwnd_area = {}, 0.0
+    for a, b in zip(rows, rows[1:]):
+        dt = b['t'] - a['t']
+        states[a['state']] = states.get(a['state'], 0.0) + dt
+        cwnd_area += (a['cwnd'] or 0) * dt
+    rtts = sorted(r['rtt'] for r in rows if r['rtt'] is not None)
+    s.update({
+        'duration': duration,
+        'acked_bytes': acked,
+        'goodput': acked / duration,
+        'sent': count.get('send', 0),
+        'retx': count.get('retx', 0),
+        'retx_ratio': retx_bytes / sent_bytes if sent_bytes else 0.0,
+        'timeouts': count.get('timeout', 0),
+        'fast': count.get('fast', 0),
+        'dupacks': count.get('dupack', 0),
+        'throttles': count.get('throttle', 0),
+        'cwnd_max': max((r['cwnd'] or 0) for r in rows),
+        'cwnd_mean': cwnd_area / duration,
+        'rtt_min': rtts[0] if rtts else None,
+        'rtt_p50': percentile(rtts, 50),
+        'rtt_p95': percentile(rtts, 95),
+        'states': {k: v / duration for k, v in sorted(states.items(), key=lambda kv: -kv[1])},
+    })
+    return s
+
+
+def fmt_s(v):
+    return '-' if v is None else f'{v * 1000:.1f}ms'
+
+
+def print_summary(name, meta, s):
+    print(f"== {name} " + ' '.join(f'{k}={v}' for k, v in meta.items() if k not in ('events', 'overwritten')))
+    if s['events'] < 2:
+        print('   (no events)')
+        return
+    print(f"   duration {s['duration']:.2f}s  acked {s['acked_bytes']} B  goodput {s['goodput'] / 1024:.1f} KiB/s")
+    print(f"   segments sent {s['sent']}  retransmitted {s['retx']}  retransmit ratio {s['retx_ratio'] * 100:.2f}%")
+    print(f"   timeouts {s['timeouts']}  fast retransmits {s['fast']}  dup acks {s['dupacks']}  throttles {s['throttles']}")
+    print(f"   cwnd max {s['cwnd_max']:.0f} B  time-weighted mean {s['cwnd_mean']:.0f} B")
+    print(f"   rtt min {fmt_s(s['rtt_min'])}  p50 {fmt_s(s['rtt_p50'])}  p95 {fmt_s(s['rtt_p95'])}")
+    print('   time in state: ' + '  '.join(f'{k} {v * 100:.1f}%' for k, v in s['states'].items()))
+    if meta.get('overwritten', '0') != '0':
+        print(f"   warning: {meta['overwritten']} events were overwritten in the ring buffer")
+
+
+def sparkline(rows, width=72):
+    pts = [(r['t'], r['cwnd']) for r in rows if r['cwnd'] is not None]
+    if len(pts) < 2:
+        return ''
+    t0, t1 = pts[0][0], pts[-1][0]
+    top = max(c for _, c in pts) or 1
+    cols, i = [], 0
+    for c in range(width):
+        edge = t0 + (t1 - t0) * (c + 1) / width
+        vals = []
+        while i < len(pts) and pts[i][0] <= edge:
+            vals.append(pts[i][1])
+            i += 1
+        v = max(vals) if vals else (cols[-1] if cols else 0)
+        cols.append(v)
+    return ''.join(SPARK[int(v / top * (len(SPARK) - 1))] for v in cols) + f'  (max {top:.0f} B)'
+
+
+def plot(traces, out):
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print('matplotlib not installed; cwnd over time:')
+        for name, _, rows in traces:
+            print(f'  {name}: {sparkline(rows)}')
+        return
+    fig, ax = plt.subplots(figsize=(10, 4))
+    for name, _, rows in traces:
+        t = [r['t'] for r in rows if r['cwnd'] is not None]
+        line, = ax.step(t, [r['cwnd'] for r in rows if r['cwnd'] is not None], where='post', label=f'{name} cwnd')
+        ss = [(r['t'], r['ssthresh']) for r in rows if r['ssthresh'] is not None and r['ssthresh'] < 1e9]
+        if ss:
+            ax.step(*zip(*ss), where='post', linestyle=':', color=line.get_color(), label=f'{name} ssthresh')
+        for ev, marker in (('timeout', 'x'), ('fast', 'v')):
+            pts = [(r['t'], r['cwnd']) for r in rows if r['event'] == ev and r['cwnd'] is not None]
+            if pts:
+                ax.plot(*zip(*pts), marker, color=line.get_color(), label=f'{name} {ev}')
+    ax.set_xlabel('time (s)')
+    ax.set_ylabel('bytes')
+    ax.legend(fontsize='small')
+    fig.tight_layout()
+    fig.savefig(out)
+    print(f'wrote {out}')
+
+
+SUMMARY_FIELDS = ('trace', 'cc', 'duration', 'acked_bytes', 'goodput', 'sent', 'retx', 'retx_ratio', 'timeouts',
+                  'fast', 'dupacks', 'throttles', 'cwnd_max', 'cwnd_mean', 'rtt_min', 'rtt_p50', 'rtt_p95')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('traces', nargs='+', help='trace CSV files or directories of trace-*.csv')
+    parser.add_argument('--plot', metavar='PNG', help='plot cwnd over time')
+    parser.add_argument('--csv', metavar='OUT', help='write one summary row per trace')
+    args = parser.parse_args()
+    paths = []
+    for p in args.traces:
+        if os.path.isdir(p):
+            paths += sorted(os.path.join(p, f) for f in os.listdir(p) if f.startswith('trace-') and f.endswith('.csv'))
+        else:
+            paths.append(p)
+    if not paths:
+        sys.exit('no traces found')
+    traces, summaries = [], []
+    for p in paths:
+        meta, rows = load(p)
+        name = meta.get('id') or os.path.basename(p)
+        s = summarize(rows)
+        print_summary(name, meta, s)
+        traces.append((name, meta, rows))
+        summaries.append(dict(s, trace=name, cc=meta.get('cc', '')))
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            w = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS, extrasaction='ignore')
+            w.writeheader()
+            w.writerows(summaries)
+    if args.plot:
+        plot(traces, args.plot)